@@ -1,10 +1,24 @@
 # --- From script: 11_dashboard_streamlit.py ---
+import time
+_script_start = time.perf_counter()
+
 import streamlit as st
 import pandas as pd
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from storage import read_table, table_columns
+from emotion_sets import EMOTION_LABELS, has_all
+from dashboard_cubes import SAMPLE_COLUMNS, SAMPLE_POSTS, load_dashboard_cubes
+from post_store import POST_STORE_PATH, PostStore
+from profiling import resident_bytes
+from search_index import PAGE_SIZE, SEARCH_INDEX_PATH, SearchIndex
+from trends import LEGISLATION_SPIKES_PATH, TREND_DIR, TrendCube
+
+# Only ids and labels are kept in memory; post bodies are read from the post store on demand.
+# Plotting libraries are imported by src/dashboard_cubes.py only if the cubes need rebuilding.
+DATA_COLUMNS = ['id', 'subreddit', 'Final_Topic_Label', 'emotion_label']
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -17,16 +31,22 @@ st.set_page_config(
 @st.cache_data
 def load_data():
     """
-    Loads the dashboard data from CSV files. Uses caching for performance.
+    Loads the id and label columns of the dashboard data, and the laws CSV. Uses caching for performance.
     """
-    reddit_data_path = 'data/processed/reddit_dashboard_data.csv'
+    reddit_data_path = 'data/processed/reddit_dashboard_data.parquet'
     laws_data_path = 'data/processed/laws_dashboard_data.csv'
 
     if not os.path.exists(reddit_data_path):
         st.error(f"Data file not found at {reddit_data_path}. Please run the full data processing pipeline first.")
         return None, None
     
-    df_reddit = pd.read_csv(reddit_data_path)
+    # emotion_mask (every detected emotion, one bit each) is only present in newer pipeline outputs
+    available = table_columns(reddit_data_path)
+    columns = DATA_COLUMNS + [c for c in ['emotion_mask', 'duplicate_of'] if c in available]
+    df_reddit = read_table(reddit_data_path, columns=columns)
+    if 'duplicate_of' in df_reddit.columns:
+        # Count each cluster of near-duplicate posts once, as the cubes do
+        df_reddit = df_reddit[df_reddit['duplicate_of'].isna()].drop(columns='duplicate_of')
     
     df_laws = None
     if os.path.exists(laws_data_path):
@@ -34,6 +54,50 @@ def load_data():
     
     return df_reddit, df_laws
 
+
+@st.cache_resource
+def load_cubes():
+    """
+    Loads the precomputed per-topic aggregates and images once per server process.
+    """
+    return load_dashboard_cubes()
+
+
+@st.cache_resource
+def load_post_store():
+    """
+    Opens the post body store (only its id index is held in memory), or returns None if it is missing.
+    """
+    if not os.path.exists(POST_STORE_PATH):
+        return None
+    return PostStore(POST_STORE_PATH)
+
+
+@st.cache_resource
+def load_search_index():
+    """
+    Opens the full-text search index, or returns None if it is missing or outdated.
+    """
+    if not os.path.exists(SEARCH_INDEX_PATH):
+        return None
+    try:
+        return SearchIndex(SEARCH_INDEX_PATH)
+    except ValueError as e:
+        st.warning(str(e))
+        return None
+
+
+@st.cache_resource
+def load_trends():
+    """
+    Loads the topic x emotion x week trend cube and the spikes near legislation dates, if built.
+    """
+    if not os.path.exists(os.path.join(TREND_DIR, 'meta.json')):
+        return None, None
+    spikes = pd.read_csv(LEGISLATION_SPIKES_PATH) if os.path.exists(LEGISLATION_SPIKES_PATH) else None
+    return TrendCube.load(TREND_DIR), spikes
+
+
 # --- Main App ---
 def main():
     st.title("🇬🇧 Analysis of Digital Immigration Discourse on Reddit")
@@ -42,50 +106,79 @@ def main():
     df, df_laws = load_data()
 
     if df is not None:
+        # Everything per topic is looked up from the precomputed cubes (see src/dashboard_cubes.py)
+        cubes = load_cubes()
+
         # --- Sidebar for Filtering ---
         st.sidebar.header("Filter by Topic")
-        topic_list = sorted(df['Final_Topic_Label'].unique())
+        topic_list = cubes['topics']
         selected_topic = st.sidebar.selectbox("Select a topic to explore:", topic_list)
-        
-        # --- Filtered Data ---
-        df_filtered = df[df['Final_Topic_Label'] == selected_topic]
+        selected_emotions = []
+        if 'emotion_mask' in df.columns:
+            st.sidebar.header("Filter by Emotions")
+            selected_emotions = st.sidebar.multiselect("Posts expressing all of:", list(EMOTION_LABELS))
         
         # --- Main Panel ---
         st.header(f"Analysis for Topic: {selected_topic}")
-        st.markdown(f"**Total Posts:** {len(df_filtered)}")
+        st.markdown(f"**Total Posts:** {cubes['topic_counts'][selected_topic]}")
 
         col1, col2 = st.columns(2)
 
         # --- Word Cloud ---
         with col1:
             st.subheader("Key Terms Word Cloud")
-            try:
-                text = " ".join(review for review in df_filtered['text_cleaned'])
-                wordcloud = WordCloud(background_color="white", colormap="viridis", width=800, height=400).generate(text)
-                fig, ax = plt.subplots(figsize=(10, 5))
-                ax.imshow(wordcloud, interpolation='bilinear')
-                ax.axis("off")
-                st.pyplot(fig)
-            except ValueError:
+            word_cloud = cubes['word_clouds'].get(selected_topic)
+            if word_cloud is not None:
+                st.image(word_cloud, use_column_width=True)
+            else:
                 st.warning("Not enough text to generate a word cloud for this topic.")
 
         # --- Emotion Distribution ---
         with col2:
             st.subheader("Emotion Distribution")
-            emotion_counts = df_filtered['emotion_label'].value_counts().head(10)
-            st.bar_chart(emotion_counts)
+            st.bar_chart(cubes['emotion_counts'][selected_topic])
             
+        # --- Trends Over Time ---
+        trends, spikes = load_trends()
+        if trends is not None:
+            st.subheader("Weekly Posts by Emotion")
+            volumes = trends.query(topic=selected_topic, by='emotion')
+            active = volumes.index[volumes.sum(axis=1) > 0]
+            if len(active):
+                st.line_chart(volumes.loc[active[0]:])
+            if spikes is not None:
+                topic_spikes = spikes[spikes['topic'] == selected_topic]
+                if not topic_spikes.empty:
+                    st.markdown("**Volume spikes near linked legislation dates**")
+                    st.table(topic_spikes[['window', 'count', 'z_score', 'law_title', 'law_date']])
+
+        # --- Emotion Co-occurrence ---
+        cooccurrence = cubes.get('cooccurrence', {}).get(selected_topic)
+        if cooccurrence is not None and not cooccurrence.empty:
+            st.subheader("Emotion Co-occurrence")
+            st.caption("Posts in this topic expressing both emotions; the diagonal counts each emotion.")
+            st.dataframe(cooccurrence)
+
         # --- Global Heatmap ---
         st.header("Global View: Topic-Emotion Heatmap")
-        crosstab = pd.crosstab(df['Final_Topic_Label'], df['emotion_label'])
-        fig_heatmap, ax_heatmap = plt.subplots(figsize=(16, 10))
-        sns.heatmap(crosstab, cmap='YlGnBu', annot=False, ax=ax_heatmap)
-        ax_heatmap.set_title('Heatmap of Topic and Emotion Correlations', fontsize=16)
-        st.pyplot(fig_heatmap)
+        st.image(cubes['heatmap'], use_column_width=True)
 
         # --- Sample Posts ---
         st.header("Sample Posts from this Topic")
-        st.dataframe(df_filtered[['title', 'selftext', 'subreddit', 'emotion_label']].head(5))
+        samples = cubes['samples'][selected_topic]
+        if selected_emotions:
+            # Bitmask filter over the in-memory mask column; the model is never loaded
+            topic_posts = df[(df['Final_Topic_Label'].astype(str) == selected_topic).to_numpy()
+                             & has_all(df['emotion_mask'], selected_emotions)]
+            st.markdown(f"**Posts expressing {' and '.join(selected_emotions)}:** {len(topic_posts)}")
+            samples = topic_posts[SAMPLE_COLUMNS].head(SAMPLE_POSTS).reset_index(drop=True)
+        store = load_post_store()
+        if store is not None:
+            bodies = store.get(samples['id'])
+            if not bodies.empty:
+                samples = samples.merge(bodies[['id', 'title', 'selftext']], on='id', how='left')
+                samples = samples[['title', 'selftext', 'subreddit', 'emotion_label']]
+        st.dataframe(samples)
         
         # --- Legislation Links ---
         if df_laws is not None:
@@ -96,5 +189,45 @@ def main():
             else:
                 st.info("No specific legislation was strongly matched to this topic.")
 
+        # --- Post Search ---
+        index = load_search_index()
+        if index is not None:
+            st.header("Search Posts")
+            query = st.text_input('Words and "quoted phrases" that must all appear:')
+            any_option = "(any)"
+            facet_cols = st.columns(4)
+            topic = facet_cols[0].selectbox("Topic", [any_option] + topic_list)
+            emotion = facet_cols[1].selectbox("Emotion", [any_option] + list(EMOTION_LABELS))
+            subreddits = sorted(value for facet, value in index.facet_tokens if facet == 'subreddit')
+            subreddit = facet_cols[2].selectbox("Subreddit", [any_option] + subreddits)
+            page = facet_cols[3].number_input("Page", min_value=1, value=1, step=1)
+            if query:
+                facets = {name: None if value == any_option else value
+                          for name, value in [('topic', topic), ('emotion', emotion), ('subreddit', subreddit)]}
+                start = time.perf_counter()
+                results, total, exact = index.search(query, page=page, **facets)
+                elapsed_ms = (time.perf_counter() - start) * 1e3
+                pages = max((total + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+                # Broad queries only rank the newest candidates (see src/search_index.py)
+                matches = f"{total} matching posts" if exact else f"Over {total} matching posts, showing the best of the newest {total}"
+                st.caption(f"{matches} · page {page} of {pages} · {elapsed_ms:.0f} ms")
+                if not results.empty:
+                    store = load_post_store()
+                    if store is not None:
+                        bodies = store.get(results['id'])
+                        if not bodies.empty:
+                            results = results.merge(bodies[['id', 'title', 'selftext']], on='id', how='left')
+                    st.dataframe(results.drop(columns=['score']))
+                    # Facet counts are extra queries, so they only run when asked for
+                    if st.checkbox("Show matches by topic, emotion and subreddit"):
+                        count_cols = st.columns(3)
+                        for col, facet in zip(count_cols, ['topic', 'emotion', 'subreddit']):
+                            col.dataframe(index.facet_counts(query, facet, **facets))
+
+        # --- Startup Report ---
+        st.sidebar.caption(
+            f"Rendered in {time.perf_counter() - _script_start:.2f}s · {resident_bytes() / 1e6:.0f} MB resident"
+        )
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
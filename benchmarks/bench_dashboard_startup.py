@@ -0,0 +1,96 @@
+"""
+Benchmarks dashboard cold start: the original eager load against the slim load.
+
+Each mode runs in a fresh interpreter, so import cost is included. The eager mode imports
+matplotlib, seaborn and wordcloud and reads every column of the dashboard data; the slim
+mode reads id and label columns, the precomputed cubes and the post store index.
+
+Run from the repository root:
+    python benchmarks/bench_dashboard_startup.py --repeat 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+REFERENCE_CSV = 'final_datasets/reddit_dashboard_data.csv'
+
+EAGER = """
+import pandas as pd
+import matplotlib.pyplot as plt
+import seaborn as sns
+from wordcloud import WordCloud
+from storage import read_table
+df = read_table({data!r})
+"""
+
+SLIM = """
+from storage import read_table
+from dashboard_cubes import load_dashboard_cubes
+from post_store import PostStore
+df = read_table({data!r}, columns=['id', 'subreddit', 'Final_Topic_Label', 'emotion_label'])
+cubes = load_dashboard_cubes({cubes!r}, {data!r})
+store = PostStore({store!r})
+store.get(df['id'].head(5))
+"""
+
+MEASURE = """
+import time, json, sys
+sys.path.insert(0, {src!r})
+from profiling import peak_resident_bytes
+start = time.perf_counter()
+{body}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'max_rss_mb': peak_resident_bytes() / 1e6}}))
+"""
+
+
+def run_mode(body, **paths):
+    code = MEASURE.format(src=SRC_DIR, body=body.format(**paths))
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def prepare(data_path, work_dir):
+    """
+    Dashboard data, cubes and post store to benchmark against, built from the reference CSV if needed.
+    """
+    from dashboard_cubes import build_dashboard_cubes
+    from post_store import build_post_store
+    from storage import convert_csv_to_parquet
+
+    if data_path is None:
+        data_path = convert_csv_to_parquet(REFERENCE_CSV, os.path.join(work_dir, 'reddit_dashboard_data.parquet'))
+    cubes_path = os.path.join(work_dir, 'dashboard_cubes.pkl')
+    store_path = os.path.join(work_dir, 'post_bodies.jsonl')
+    build_dashboard_cubes(data_path, cubes_path)
+    build_post_store(data_path, store_path)
+    return {'data': data_path, 'cubes': cubes_path, 'store': store_path}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=None, help="Dashboard Parquet file (default: converted reference CSV)")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        paths = prepare(args.data, work_dir)
+        results = {}
+        for mode, body in [('eager', EAGER), ('slim', SLIM)]:
+            runs = [run_mode(body, **paths) for _ in range(args.repeat)]
+            results[mode] = {
+                'seconds': min(run['seconds'] for run in runs),
+                'max_rss_mb': min(run['max_rss_mb'] for run in runs),
+            }
+
+    print(f"{'mode':<8}{'cold start (s)':>16}{'peak RSS (MB)':>16}")
+    for mode, result in results.items():
+        print(f"{mode:<8}{result['seconds']:>16.3f}{result['max_rss_mb']:>16.1f}")
+    print(f"slim / eager: {results['slim']['seconds'] / results['eager']['seconds']:.2f}x time, "
+          f"{results['slim']['max_rss_mb'] / results['eager']['max_rss_mb']:.2f}x memory")
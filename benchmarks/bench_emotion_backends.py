@@ -0,0 +1,65 @@
+"""
+Compares the emotion inference backends on throughput and label agreement.
+
+Every backend scores the same sample of posts from the reference dataset. Labels are
+compared with the FP32 PyTorch run and with the emotion_label column of the dataset, and
+the fastest backend whose FP32 agreement meets --min-agreement is reported.
+
+Run from the repository root:
+    python benchmarks/bench_emotion_backends.py --posts 500 --backends pytorch quantized onnx onnx_int8
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from transformers import AutoTokenizer  # noqa: E402
+from emotion_backends import BACKENDS, MIN_LABEL_AGREEMENT, label_agreement, load_emotion_model  # noqa: E402
+from emotion_inference import GOEMOTIONS_MODEL, predict_emotion_probabilities, top_emotion_labels  # noqa: E402
+
+REFERENCE_CSV = 'final_datasets/reddit_dashboard_data.csv'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=500, help="Posts to score (0 for all)")
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument('--model', default=GOEMOTIONS_MODEL)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--min-agreement', type=float, default=MIN_LABEL_AGREEMENT)
+    args = parser.parse_args()
+
+    df = pd.read_csv(REFERENCE_CSV, usecols=['full_text', 'emotion_label'])
+    if args.posts:
+        df = df.sample(n=min(args.posts, len(df)), random_state=0)
+    texts = df['full_text'].fillna('').tolist()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    backends = ['pytorch'] + [b for b in args.backends if b != 'pytorch']
+    results = {}
+    for backend in backends:
+        model = load_emotion_model(args.model, tokenizer, backend=backend, num_threads=args.threads)
+        labels = model.config.id2label
+        start = time.perf_counter()
+        probabilities = predict_emotion_probabilities(texts, tokenizer, model, num_threads=args.threads)
+        seconds = time.perf_counter() - start
+        results[backend] = {'seconds': seconds, 'labels': top_emotion_labels(probabilities, labels)}
+
+    reference = results['pytorch']['labels']
+    print(f"{len(texts)} posts, {torch.get_num_threads()} threads")
+    print(f"{'backend':<12}{'posts/s':>10}{'speedup':>10}{'vs FP32':>10}{'vs dataset':>12}")
+    for backend, result in results.items():
+        result['agreement'] = label_agreement(result['labels'], reference)
+        print(f"{backend:<12}{len(texts) / result['seconds']:>10.1f}"
+              f"{results['pytorch']['seconds'] / result['seconds']:>9.2f}x"
+              f"{result['agreement']:>10.1%}{label_agreement(result['labels'], df['emotion_label']):>12.1%}")
+
+    passing = [b for b, r in results.items() if r['agreement'] >= args.min_agreement]
+    fastest = min(passing, key=lambda b: results[b]['seconds'])
+    print(f"Fastest backend with at least {args.min_agreement:.0%} FP32 label agreement: {fastest}")
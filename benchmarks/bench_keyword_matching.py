@@ -0,0 +1,98 @@
+"""
+Benchmarks the Aho-Corasick KeywordMatcher against the scraper's nested keyword scan.
+
+Run from the repository root:
+    python benchmarks/bench_keyword_matching.py --keywords 27 300 1000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from keyword_matcher import KeywordMatcher  # noqa: E402
+
+POSTS_PATH = 'data/raw/reddit_scraped_posts.json'
+
+SCRAPER_KEYWORDS = [
+    'share code', 'digital immigration', 'online immigration status', 'evisa',
+    'digital BRP', 'immigration app', 'BRP replacement', 'settled status',
+    'EUSS', 'UK visa', 'spouse visa', 'student visa', 'tier 2 visa',
+    'ILR', 'home office error', 'vfs delay', 'UKVI portal problem',
+    'biometric delay', 'email from UKVI', 'right to work UK',
+    'renting with share code', 'NHS and immigration', 'check immigration status',
+    'immigration bill', 'UK immigration law', 'european settlement scheme',
+    'rwanda policy'
+]
+
+
+def load_texts():
+    with open(POSTS_PATH) as f:
+        posts = json.load(f)
+    return [post['title'] + " " + (post['selftext'] or "") for post in posts]
+
+
+def make_keywords(texts, n, seed=0):
+    """
+    The scraper keywords padded with word bigrams sampled from the corpus.
+    """
+    rng = random.Random(seed)
+    keywords = list(SCRAPER_KEYWORDS)
+    seen = {kw.lower() for kw in keywords}
+    while len(keywords) < n:
+        words = rng.choice(texts).split()
+        if len(words) < 2:
+            continue
+        start = rng.randrange(len(words) - 1)
+        bigram = " ".join(words[start:start + 2])
+        if bigram.lower() not in seen:
+            seen.add(bigram.lower())
+            keywords.append(bigram)
+    return keywords[:n]
+
+
+def nested_scan(texts, keywords):
+    results = []
+    for post_text in texts:
+        if any(keyword.lower() in post_text.lower() for keyword in keywords):
+            results.append([kw for kw in keywords if kw.lower() in post_text.lower()])
+        else:
+            results.append([])
+    return results
+
+
+def automaton_scan(texts, matcher):
+    return [matcher.find_all(post_text) for post_text in texts]
+
+
+def best_time(fn, *args, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--keywords', type=int, nargs='+', default=[27, 100, 300, 1000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    texts = load_texts()
+    print(f"{len(texts)} posts, {sum(len(t) for t in texts) / 1e6:.1f}M characters")
+    for n in args.keywords:
+        keywords = make_keywords(texts, n)
+
+        nested_seconds = best_time(nested_scan, texts, keywords, repeat=args.repeat)
+        start = time.perf_counter()
+        matcher = KeywordMatcher(keywords)
+        build_seconds = time.perf_counter() - start
+        automaton_seconds = best_time(automaton_scan, texts, matcher, repeat=args.repeat)
+
+        same = nested_scan(texts, keywords) == automaton_scan(texts, matcher)
+        print(f"{n:>5} keywords: nested {nested_seconds:.3f}s, automaton {automaton_seconds:.3f}s "
+              f"(+{build_seconds:.3f}s build), speed-up {nested_seconds / automaton_seconds:.1f}x, identical={same}")
@@ -0,0 +1,92 @@
+"""
+Benchmarks the indexed legislation matcher against the original iterrows/partial_ratio loop.
+
+The default exhaustive match must reproduce the loop exactly; it is reported with the share of
+topic-law pairs its score bounds leave to partial_ratio. The approximate top_k block search is
+reported with its speed-up and recall.
+
+Run from the repository root:
+    python benchmarks/bench_legislation_matching.py --copies 3
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from fuzzywuzzy import fuzz
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from legislation_index import DEFAULT_TOP_K, LegislationIndex  # noqa: E402
+
+LAWS_PATH = 'final_datasets/laws_dashboard_data.csv'
+REDDIT_PATH = 'final_datasets/reddit_dashboard_data.csv'
+THRESHOLD = 75
+
+
+def load_inputs(copies):
+    laws = pd.read_csv(LAWS_PATH).rename(columns={'topic': 'keyword', 'law_title': 'title'})
+    laws = laws.drop_duplicates(subset=['title']).reset_index(drop=True)
+    # Repeat the corpus with numbered titles to simulate larger GOV.UK pulls
+    laws = pd.concat(
+        [laws.assign(title=laws['title'] + ('' if i == 0 else f' ({i})')) for i in range(copies)],
+        ignore_index=True
+    )
+    topics = sorted(set(pd.read_csv(REDDIT_PATH, usecols=['Final_Topic_Label'])['Final_Topic_Label'].dropna())
+                    | set(pd.read_csv(LAWS_PATH, usecols=['topic'])['topic'].dropna()))
+    return laws, topics
+
+
+def loop_matches(topics, texts):
+    matches = set()
+    for topic in topics:
+        query = topic.lower()
+        for i, text in enumerate(texts):
+            score = fuzz.partial_ratio(query, text)
+            if score >= THRESHOLD:
+                matches.add((topic, i, score))
+    return matches
+
+
+def index_matches(topics, index, top_k):
+    matches = set()
+    for topic in topics:
+        for i, score in index.match(topic.lower(), THRESHOLD, top_k=top_k):
+            matches.add((topic, i, score))
+    return matches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--copies', type=int, default=1, help="Times to repeat the law corpus")
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    args = parser.parse_args()
+
+    laws, topics = load_inputs(args.copies)
+    texts = [f"{keyword} {title}".lower().strip() for keyword, title in zip(laws['keyword'], laws['title'])]
+    print(f"{len(topics)} topics x {len(texts)} laws")
+
+    start = time.perf_counter()
+    expected = loop_matches(topics, texts)
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = LegislationIndex(texts)
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    exact = index_matches(topics, index, None)
+    exact_seconds = time.perf_counter() - start
+    assert exact == expected, "Exhaustive matching differs from the original loop"
+    scored = sum(index._may_reach(topic.lower(), i, THRESHOLD)
+                 for topic in topics for i in np.flatnonzero(index.max_scores(topic.lower()) >= THRESHOLD))
+    start = time.perf_counter()
+    found = index_matches(topics, index, args.top_k)
+    query_seconds = time.perf_counter() - start
+
+    recall = len(found & expected) / len(expected) if expected else 1.0
+    print(f"loop:  {loop_seconds:.2f}s, {len(expected)} matches >= {THRESHOLD}")
+    print(f"exact: {exact_seconds:.2f}s, {len(exact)} matches, partial_ratio on "
+          f"{scored / (len(topics) * len(texts)):.0%} of pairs, speed-up {loop_seconds / exact_seconds:.1f}x")
+    print(f"top_k={args.top_k}: build {build_seconds:.2f}s + query {query_seconds:.2f}s, {len(found)} matches, "
+          f"recall {recall:.3f}, speed-up {loop_seconds / (build_seconds + query_seconds):.1f}x")
@@ -0,0 +1,75 @@
+"""
+Benchmarks search latency on the dashboard's full-text index.
+
+Queries are drawn from the indexed posts themselves: single words, two-word AND queries
+and two-word phrases, each run once without facets and once restricted to the post's topic.
+Reports median and 95th percentile milliseconds per query type for the first result page,
+and how often the match count hit the candidate limit. As in run_benchmarks.py, scikit-learn's
+stopword list stands in for NLTK's when it has not been downloaded.
+
+Run from the repository root (after the pipeline, or run_benchmarks.py with --sizes 1m):
+    python benchmarks/bench_search.py --queries 200
+    python benchmarks/bench_search.py --data data/cache/benchmarks/1m/reddit_dashboard_data.parquet \
+        --index data/cache/benchmarks/1m/search_index.sqlite
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import text_cleaning  # noqa: E402
+from search_index import DASHBOARD_DATA_PATH, SEARCH_INDEX_PATH, SearchIndex  # noqa: E402
+from storage import read_table  # noqa: E402
+
+
+def sample_queries(df, n_queries, seed):
+    """
+    (query type, query, topic) triples taken from the words of randomly chosen posts.
+    """
+    rng = np.random.default_rng(seed)
+    queries = []
+    for _, post in df.sample(n=min(n_queries, len(df)), random_state=seed).iterrows():
+        words = str(post['text_cleaned']).split()
+        if len(words) < 2:
+            continue
+        i = rng.integers(len(words) - 1)
+        topic = str(post['Final_Topic_Label'])
+        queries += [('word', words[i], None), ('word+topic', words[i], topic),
+                    ('and', f"{words[i]} {words[rng.integers(len(words))]}", None),
+                    ('phrase', f'"{words[i]} {words[i + 1]}"', None),
+                    ('phrase+topic', f'"{words[i]} {words[i + 1]}"', topic)]
+    return queries
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=DASHBOARD_DATA_PATH)
+    parser.add_argument('--index', default=SEARCH_INDEX_PATH)
+    parser.add_argument('--queries', type=int, default=100, help="Posts to draw queries from")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        text_cleaning.stopwords.words('english')
+    except LookupError:
+        from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+        text_cleaning._stop_words = set(ENGLISH_STOP_WORDS)
+
+    df = read_table(args.data, columns=['text_cleaned', 'Final_Topic_Label'])
+    index = SearchIndex(args.index)
+    index.search('warm up')
+    timings, capped = {}, {}
+    for query_type, query, topic in sample_queries(df, args.queries, args.seed):
+        start = time.perf_counter()
+        _, _, exact = index.search(query, topic=topic)
+        timings.setdefault(query_type, []).append((time.perf_counter() - start) * 1e3)
+        capped.setdefault(query_type, []).append(not exact)
+
+    print(f"{len(index)} posts indexed, candidate limit {index.candidate_limit}")
+    print(f"{'query':<14}{'runs':>6}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'capped':>9}")
+    for query_type, ms in timings.items():
+        print(f"{query_type:<14}{len(ms):>6}{np.percentile(ms, 50):>10.1f}{np.percentile(ms, 95):>10.1f}"
+              f"{max(ms):>10.1f}{np.mean(capped[query_type]):>9.0%}")
@@ -0,0 +1,309 @@
+"""
+Times the CPU-bound pipeline stages on synthetic corpora of increasing size.
+
+For every size a corpus is generated once with synthetic_corpus.py (and reused on later
+runs), then these stages run on it in pipeline order:
+
+    clean_text_data, apply_topic_labels, link_legislation_to_topics (fuzzy),
+    create_dashboard_data, link_legislation_semantically, dashboard_cubes, trends, post_store,
+    search_index
+
+The transformer models are replaced by small stubs so the suite runs offline and only
+measures the pipeline's own work: topics and emotions are sampled from the distribution
+of the reference dataset, and embeddings are hashed bag-of-words vectors under a fixed
+random projection. When the NLTK stopword list has not been downloaded, scikit-learn's
+English stopword list stands in for it (the run records which one was used).
+
+Results are written to benchmarks/results/<commit>.json and can be compared between commits.
+
+Run from the repository root:
+    python benchmarks/run_benchmarks.py --sizes 1k 10k 100k 1m
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, '..', 'src'))
+import profiling  # noqa: E402
+import semantic_linker  # noqa: E402
+import text_cleaning  # noqa: E402
+from dashboard_cubes import build_dashboard_cubes  # noqa: E402
+from post_store import build_post_store  # noqa: E402
+from search_index import build_search_index  # noqa: E402
+from storage import read_table, write_table  # noqa: E402
+from synthetic_corpus import write_corpus  # noqa: E402
+from trends import update_trends  # noqa: E402
+
+processing = importlib.import_module('2_process_data')
+linker = importlib.import_module('4_link_legislation_to_topics')
+
+# --- Configuration ---
+SIZES = {'1k': 1000, '10k': 10000, '100k': 100000, '1m': 1000000}
+DEFAULT_SIZES = ['1k', '10k', '100k']
+WORK_DIR = 'data/cache/benchmarks'
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+REFERENCE_CSV = 'final_datasets/reddit_dashboard_data.csv'
+LAWS_CSV = 'final_datasets/laws_dashboard_data.csv'
+STUB_EMBEDDING_DIM = 64
+STUB_HASH_FEATURES = 2 ** 14
+
+
+def stub_embed(texts, model_name=None):
+    """
+    Stand-in for the sentence-transformers embeddings: hashed word counts under a fixed random projection.
+    """
+    from sklearn.feature_extraction.text import HashingVectorizer
+    counts = HashingVectorizer(n_features=STUB_HASH_FEATURES, alternate_sign=False).transform(
+        [str(text) for text in texts])
+    projection = np.random.default_rng(0).standard_normal((STUB_HASH_FEATURES, STUB_EMBEDDING_DIM))
+    return np.asarray(counts @ projection.astype(np.float32), dtype=np.float32)
+
+
+def use_stub_models():
+    """
+    Routes the semantic linker through stub_embed and makes sure a stopword list is available.
+    Returns the name of the stopword list in use.
+    """
+    linker.embed_texts = stub_embed
+    semantic_linker.embed_texts = stub_embed
+    try:
+        text_cleaning.stopwords.words('english')
+        return 'nltk'
+    except LookupError:
+        from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+        # Worker processes are forked, so they inherit the list
+        text_cleaning._stop_words = set(ENGLISH_STOP_WORDS)
+        return 'sklearn'
+
+
+def reference_labels():
+    reference = pd.read_csv(REFERENCE_CSV, usecols=['topic_id', 'topic_name', 'emotion_label'])
+    return reference.dropna()
+
+
+def legislation_table(paths):
+    """
+    The reference laws in the columns of data/processed/legislation_cleaned.csv.
+    """
+    laws = pd.read_csv(LAWS_CSV).rename(columns={'topic': 'keyword', 'law_title': 'title', 'law_url': 'link'})
+    laws = laws.drop_duplicates(subset=['title']).reset_index(drop=True)
+    laws.to_csv(paths['laws'], index=False)
+    return laws
+
+
+def stub_topic_model(paths, reference, seed=0):
+    """
+    Writes the topic model output: the cleaned posts with a (topic_id, topic_name) sampled per post.
+    """
+    df = read_table(paths['cleaned'])
+    sample = reference.sample(n=len(df), replace=True, random_state=seed).reset_index(drop=True)
+    df['topic_id'] = sample['topic_id'].to_numpy()
+    df['topic_name'] = sample['topic_name'].to_numpy()
+    write_table(df, paths['topics'])
+
+
+def stub_emotion_model(paths, reference, seed=0):
+    """
+    Writes the emotion model output with an emotion_label sampled per post.
+    """
+    df = read_table(paths['cleaned'], columns=['id'])
+    df['emotion_label'] = reference['emotion_label'].sample(n=len(df), replace=True, random_state=seed + 1).to_numpy()
+    write_table(df, paths['emotions'])
+
+
+def work_paths(size_dir):
+    names = {
+        'cleaned': 'reddit_cleaned.parquet',
+        'topics': 'reddit_with_topics.parquet',
+        'final_topics': 'reddit_with_final_topics.parquet',
+        'emotions': 'reddit_with_emotions.parquet',
+        'laws': 'legislation_cleaned.csv',
+        'mapping': 'topic_legislation_mapping.csv',
+        'semantic_topics': 'topic_legislation_semantic.csv',
+        'semantic_posts': 'post_legislation_semantic.csv',
+        'vector_index': 'legislation_vector_index',
+        'dashboard': 'reddit_dashboard_data.parquet',
+        'laws_dashboard': 'laws_dashboard_data.csv',
+        'clusters': 'duplicate_clusters.parquet',
+        'cubes': 'dashboard_cubes.pkl',
+        'trends': 'trends',
+        'spikes': 'legislation_spikes.csv',
+        'post_store': 'post_bodies.jsonl',
+        'search_index': 'search_index.sqlite',
+    }
+    return {key: os.path.join(size_dir, name) for key, name in names.items()}
+
+
+def run_fuzzy_linker(paths):
+    linker.REDDIT_DATA_PATH, linker.LEGISLATION_PATH = paths['final_topics'], paths['laws']
+    linker.OUTPUT_PATH = paths['mapping']
+    linker.link_legislation_to_topics()
+
+
+def run_semantic_linker(paths):
+    linker.REDDIT_DATA_PATH, linker.LEGISLATION_PATH = paths['dashboard'], paths['laws']
+    linker.SEMANTIC_TOPIC_OUTPUT_PATH = paths['semantic_topics']
+    linker.SEMANTIC_POST_OUTPUT_PATH = paths['semantic_posts']
+    # Build the stub index from scratch every time so it is part of the measurement
+    shutil.rmtree(paths['vector_index'], ignore_errors=True)
+    linker.link_legislation_semantically(index_dir=paths['vector_index'])
+
+
+def run_trends(paths):
+    # update_trends only counts posts it has not seen, so start from an empty cube
+    shutil.rmtree(paths['trends'], ignore_errors=True)
+    update_trends(paths['dashboard'], paths['trends'], paths['mapping'], paths['spikes'])
+
+
+def benchmark_stages(paths, corpus_path, workers):
+    """
+    (stage name, function) pairs in pipeline order; each function runs the stage on the files in paths.
+    """
+    return [
+        ('clean_text_data', lambda: processing.clean_text_data(corpus_path, paths['cleaned'], workers=workers)),
+        ('apply_topic_labels', lambda: processing.apply_topic_labels(paths['topics'], paths['final_topics'])),
+        ('link_legislation_fuzzy', lambda: run_fuzzy_linker(paths)),
+        ('create_dashboard_data', lambda: processing.create_dashboard_data(
+            paths['final_topics'], paths['emotions'], paths['mapping'], paths['dashboard'],
+            paths['laws_dashboard'], paths['cleaned'], paths['clusters'], search_index_path=None)),
+        ('link_legislation_semantic', lambda: run_semantic_linker(paths)),
+        ('dashboard_cubes', lambda: build_dashboard_cubes(paths['dashboard'], paths['cubes'], render=False)),
+        ('trends', lambda: run_trends(paths)),
+        ('post_store', lambda: build_post_store(paths['dashboard'], paths['post_store'])),
+        ('search_index', lambda: build_search_index(paths['dashboard'], paths['search_index'])),
+    ]
+
+
+def run_size(label, n_posts, args, reference):
+    """
+    Runs every stage on a corpus of n_posts, keeping the fastest of args.repeat runs per stage.
+    """
+    size_dir = os.path.join(args.work_dir, label)
+    os.makedirs(size_dir, exist_ok=True)
+    corpus_path = os.path.join(args.work_dir, f'corpus_{n_posts}_seed{args.seed}.csv')
+    if not os.path.exists(corpus_path):
+        print(f"--- Generating synthetic corpus of {n_posts} posts ---")
+        write_corpus(corpus_path, n_posts, seed=args.seed)
+
+    paths = work_paths(size_dir)
+    legislation_table(paths)
+    results = []
+    for stage, function in benchmark_stages(paths, corpus_path, args.workers):
+        runs = []
+        for _ in range(args.repeat):
+            profiling.profile_stage(function, name=f"benchmark.{label}.{stage}")()
+            runs.append(profiling.recorded_stages()[-1])
+        best = min(runs, key=lambda record: record['wall_seconds'])
+        results.append({
+            'size': label, 'posts': n_posts, 'stage': stage,
+            'wall_seconds': best['wall_seconds'], 'cpu_seconds': best['cpu_seconds'],
+            'child_cpu_seconds': best['child_cpu_seconds'], 'peak_rss_mb': best['peak_rss_mb'],
+            'posts_per_second': round(n_posts / best['wall_seconds'], 1) if best['wall_seconds'] else None,
+        })
+        # The model stages sit between cleaning and labeling; their outputs are inputs, not measurements
+        if stage == 'clean_text_data':
+            stub_topic_model(paths, reference, args.seed)
+            stub_emotion_model(paths, reference, args.seed)
+    return results
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return f"{commit}-dirty" if dirty else commit
+
+
+def compare_results(current, baseline, factor=profiling.REGRESSION_FACTOR, min_seconds=profiling.MIN_REGRESSION_SECONDS):
+    """
+    Per (size, stage) wall times of two result files, with the slowdown of current over baseline.
+    Stages faster than min_seconds are too noisy to be flagged as regressions.
+    """
+    before = {(r['size'], r['stage']): r for r in baseline['results']}
+    rows = []
+    for result in current['results']:
+        previous = before.get((result['size'], result['stage']))
+        if previous is None:
+            continue
+        slowdown = result['wall_seconds'] / max(previous['wall_seconds'], 1e-9)
+        rows.append({'size': result['size'], 'stage': result['stage'],
+                     'baseline_seconds': previous['wall_seconds'], 'seconds': result['wall_seconds'],
+                     'slowdown': round(slowdown, 2),
+                     'regression': slowdown >= factor and result['wall_seconds'] >= min_seconds})
+    return pd.DataFrame(rows)
+
+
+def print_results(results):
+    print(f"{'size':<6}{'stage':<28}{'wall s':>9}{'cpu s':>9}{'rss MB':>9}{'posts/s':>11}")
+    for r in results:
+        print(f"{r['size']:<6}{r['stage']:<28}{r['wall_seconds']:>9.2f}{r['cpu_seconds']:>9.2f}"
+              f"{r['peak_rss_mb']:>9.0f}{r['posts_per_second'] or 0:>11.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES, choices=list(SIZES))
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per stage; the fastest is reported")
+    parser.add_argument('--workers', type=int, default=None, help="Cleaning worker processes (default: all CPUs)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', default=WORK_DIR)
+    parser.add_argument('--output', default=None, help="Results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help="Compare two results files instead of running the benchmarks")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        comparison = compare_results(current, baseline)
+        print(f"--- {baseline['commit']} -> {current['commit']} ---")
+        print(comparison.to_string(index=False))
+        if comparison['regression'].any():
+            raise SystemExit(1)
+        raise SystemExit(0)
+
+    # Keep the per-stage run reports of the benchmark out of reports/runs
+    profiling.enable(report_dir=os.path.join(args.work_dir, 'runs'))
+    stopwords = use_stub_models()
+    reference = reference_labels()
+    results = []
+    for label in args.sizes:
+        print(f"\n=== {label}: {SIZES[label]} posts ===")
+        results.extend(run_size(label, SIZES[label], args, reference))
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'stopwords': stopwords,
+        'results': results,
+    }
+    output_path = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print()
+    print_results(results)
+    print(f"--- Benchmark results saved to {output_path} ---")
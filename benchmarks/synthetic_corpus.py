@@ -0,0 +1,153 @@
+"""
+Generates synthetic Reddit corpora with the schema of data/raw/reddit_scraped_posts.csv.
+
+Post lengths are bootstrapped from the (title, selftext) word counts of the scraped
+posts in data/raw/reddit_scraped_posts.json, including the posts with an empty body,
+and words are drawn from the unigram distribution of the same posts, so URLs,
+punctuation and paragraph breaks occur about as often as in the real data. Every
+post carries one of the keywords it was "matched" on, as the collector guarantees.
+Subreddit, score and comment counts are resampled from the scraped posts.
+
+Run from the repository root:
+    python benchmarks/synthetic_corpus.py --posts 100000 --output data/cache/benchmarks/corpus_100000.csv
+"""
+import argparse
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from storage import TableWriter  # noqa: E402
+
+REFERENCE_JSON = 'data/raw/reddit_scraped_posts.json'
+COLUMNS = ['id', 'title', 'selftext', 'created_utc', 'author', 'score', 'num_comments', 'subreddit', 'url',
+           'keyword_matched']
+CHUNK_SIZE = 10000
+FIRST_ID = 36 ** 6  # Reddit ids are base36; start at seven digits like current post ids
+
+
+def _words(text):
+    # Split on spaces only, so newlines stay inside the tokens they separate
+    return [word for word in str(text or '').split(' ') if word]
+
+
+def load_reference(reference_path=REFERENCE_JSON):
+    """
+    Word counts, vocabulary and metadata distributions of the scraped posts.
+    """
+    posts = pd.read_json(reference_path, dtype={'id': str}, convert_dates=False)
+    titles = posts['title'].map(_words)
+    bodies = posts['selftext'].map(_words)
+    vocabulary = Counter(word for words in titles for word in words)
+    vocabulary.update(word for words in bodies for word in words)
+    words, counts = zip(*vocabulary.items())
+    timestamps = pd.to_datetime(posts['created_utc'], utc=True, errors='coerce').dropna()
+    return {
+        'title_lengths': titles.map(len).to_numpy(),
+        'body_lengths': bodies.map(len).to_numpy(),
+        'words': np.array(words, dtype=object),
+        'word_probabilities': np.array(counts, dtype=np.float64) / sum(counts),
+        'keywords': posts['keyword_matched'].map(list).tolist(),
+        'subreddits': posts['subreddit'].to_numpy(dtype=object),
+        'scores': posts['score'].to_numpy(),
+        'comments': posts['num_comments'].to_numpy(),
+        'time_range': (timestamps.min().timestamp(), timestamps.max().timestamp()),
+    }
+
+
+def _base36(number):
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    text = ''
+    while number:
+        number, remainder = divmod(number, 36)
+        text = digits[remainder] + text
+    return text or '0'
+
+
+def _insert(words, phrase, rng):
+    position = rng.integers(0, len(words) + 1)
+    return words[:position] + [phrase] + words[position:]
+
+
+def generate_chunk(start, size, reference, rng):
+    """
+    Posts start .. start + size - 1 of a synthetic corpus as a DataFrame.
+    """
+    sample = rng.integers(0, len(reference['title_lengths']), size=size)
+    title_lengths = np.maximum(reference['title_lengths'][sample], 1)
+    body_lengths = reference['body_lengths'][sample]
+    offsets = np.concatenate([[0], np.cumsum(title_lengths + body_lengths)])
+    words = reference['words'][rng.choice(len(reference['words']), size=offsets[-1],
+                                          p=reference['word_probabilities'])]
+
+    titles, bodies, keywords = [], [], []
+    keyword_sample = rng.integers(0, len(reference['keywords']), size=size)
+    in_title = rng.random(size) < 0.5
+    for i in range(size):
+        title = list(words[offsets[i]:offsets[i] + title_lengths[i]])
+        body = list(words[offsets[i] + title_lengths[i]:offsets[i + 1]])
+        matched = reference['keywords'][keyword_sample[i]]
+        if in_title[i] or not body:
+            title = _insert(title, matched[0], rng)
+        else:
+            body = _insert(body, matched[0], rng)
+        titles.append(' '.join(title))
+        bodies.append(' '.join(body))
+        keywords.append(str(matched))
+
+    ids = [_base36(FIRST_ID + start + i) for i in range(size)]
+    subreddits = reference['subreddits'][rng.integers(0, len(reference['subreddits']), size=size)]
+    slugs = ['_'.join(title.lower().split()[:6]) for title in titles]
+    low, high = reference['time_range']
+    return pd.DataFrame({
+        'id': ids,
+        'title': titles,
+        'selftext': bodies,
+        'created_utc': np.round(rng.uniform(low, high, size=size)),
+        'author': [f"user_{i}" for i in rng.integers(0, max(size // 3, 1), size=size)],
+        'score': reference['scores'][rng.integers(0, len(reference['scores']), size=size)],
+        'num_comments': reference['comments'][rng.integers(0, len(reference['comments']), size=size)],
+        'subreddit': subreddits,
+        'url': [f"https://www.reddit.com/r/{s}/comments/{i}/{slug}/" for s, i, slug in zip(subreddits, ids, slugs)],
+        'keyword_matched': keywords,
+    }, columns=COLUMNS)
+
+
+def iter_corpus(n_posts, seed=0, chunk_size=CHUNK_SIZE, reference_path=REFERENCE_JSON):
+    """
+    Yields a synthetic corpus of n_posts in DataFrame chunks. The same seed gives the same corpus.
+    """
+    reference = load_reference(reference_path)
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_posts, chunk_size):
+        yield generate_chunk(start, min(chunk_size, n_posts - start), reference, rng)
+
+
+def write_corpus(output_path, n_posts, seed=0, chunk_size=CHUNK_SIZE, reference_path=REFERENCE_JSON):
+    """
+    Writes a synthetic corpus to output_path (CSV like the collector's export, or Parquet). Returns the path.
+    """
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    root, extension = os.path.splitext(output_path)
+    tmp_path = f"{root}.tmp{extension}"
+    with TableWriter(tmp_path) as writer:
+        for chunk in iter_corpus(n_posts, seed=seed, chunk_size=chunk_size, reference_path=reference_path):
+            writer.write(chunk)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=10000)
+    parser.add_argument('--output', default=None, help="CSV or .parquet path (default: data/cache/benchmarks/corpus_<posts>.csv)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    output_path = args.output or f'data/cache/benchmarks/corpus_{args.posts}.csv'
+    print(f"--- Generating {args.posts} synthetic posts ---")
+    write_corpus(output_path, args.posts, seed=args.seed)
+    print(f"--- Saved synthetic corpus to {output_path} ({os.path.getsize(output_path) / 1e6:.1f} MB) ---")
@@ -1,13 +1,16 @@
-import praw
 import pandas as pd
 import requests
 from bs4 import BeautifulSoup
-import time
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+from gov_fetcher import GOV_UK_SEARCH_URL, CachedFetcher, search_gov_uk
+from profiling import profile_stage
+from keyword_matcher import KeywordMatcher
+from reddit_collector import API_BASE, TOKEN_URL, DEFAULT_WORKERS, RedditCollector, export_jsonl_to_csv
 
 # --- Configuration ---
-# Ensure you have a praw.ini file set up or use environment variables
-# For simplicity, this script assumes praw.ini
+# Credentials of a Reddit "script" app, used for application-only OAuth
 CLIENT_ID = "YOUR_CLIENT_ID"
 CLIENT_SECRET = "YOUR_CLIENT_SECRET"
 USER_AGENT = "MScProject/0.1 by YourUsername"
@@ -15,16 +18,16 @@ USER_AGENT = "MScProject/0.1 by YourUsername"
 # --- Directory Setup ---
 os.makedirs('data/raw', exist_ok=True)
 
-def scrape_reddit_data():
+@profile_stage
+def scrape_reddit_data(workers=DEFAULT_WORKERS, api_base=API_BASE, token_url=TOKEN_URL):
     """
     Scrapes posts from specified subreddits based on keywords.
+
+    Subreddits are fetched concurrently within Reddit's rate limit. Matching posts are
+    appended to data/raw/reddit_scraped_posts.jsonl as they arrive and re-runs only
+    fetch posts newer than the last checkpoint of each subreddit.
     """
     print("--- Starting Reddit Data Scraping ---")
-    reddit = praw.Reddit(
-        client_id=CLIENT_ID,
-        client_secret=CLIENT_SECRET,
-        user_agent=USER_AGENT,
-    )
 
     subreddits_to_scrape = [
         'ukvisa', 'spousevisauk', 'immigration', 'visas', 'immigrationUK',
@@ -44,49 +47,52 @@ def scrape_reddit_data():
         'rwanda policy'
     ]
 
-    scraped_posts = []
-    for sub_name in subreddits_to_scrape:
-        print(f"Scraping subreddit: r/{sub_name}")
-        subreddit = reddit.subreddit(sub_name)
-        for post in subreddit.new(limit=1000):
-            post_text = post.title + " " + post.selftext
-            if any(keyword.lower() in post_text.lower() for keyword in keywords):
-                scraped_posts.append({
-                    'id': post.id,
-                    'title': post.title,
-                    'selftext': post.selftext,
-                    'created_utc': post.created_utc,
-                    'author': str(post.author),
-                    'score': post.score,
-                    'num_comments': post.num_comments,
-                    'subreddit': str(post.subreddit),
-                    'url': post.url,
-                    'keyword_matched': [kw for kw in keywords if kw.lower() in post_text.lower()]
-                })
-        time.sleep(2) # Respect API rate limits
+    # Finds every keyword in a post with one case-insensitive pass
+    keyword_matcher = KeywordMatcher(keywords)
+
+    collector = RedditCollector(
+        output_path='data/raw/reddit_scraped_posts.jsonl',
+        checkpoint_path='data/raw/reddit_checkpoints.json',
+        match_fn=keyword_matcher.find_all,
+        client_id=CLIENT_ID,
+        client_secret=CLIENT_SECRET,
+        user_agent=USER_AGENT,
+        api_base=api_base,
+        token_url=token_url,
+        workers=workers
+    )
+    new_posts = collector.collect(subreddits_to_scrape)
 
-    df = pd.DataFrame(scraped_posts)
     output_path = 'data/raw/reddit_scraped_posts.csv'
-    df.to_csv(output_path, index=False)
-    print(f"--- Reddit scraping complete. Saved {len(df)} posts to {output_path} ---")
+    df = export_jsonl_to_csv(collector.output_path, output_path)
+    print(f"--- Reddit scraping complete. {new_posts} new posts; saved {len(df)} posts to {output_path} ---")
     return df
 
-def scrape_legislation_data():
+@profile_stage
+def scrape_legislation_data(workers=8, search_url=GOV_UK_SEARCH_URL):
     """
     Scrapes UK legislation and guidance from government websites.
+
+    Requests go through a pooled session with an on-disk HTTP cache, so documents
+    that have not changed since the last run come back as 304 Not Modified.
     """
     print("--- Starting Legislation Data Scraping ---")
+    fetcher = CachedFetcher()
     
-    # Part 1: GOV.UK API for guidance and policy
+    # Part 1: GOV.UK API for guidance and policy (every page of results per keyword)
     gov_uk_results = []
     search_keywords = ["eVisa", "immigration act 2014", "biometric residence permit", "right to rent"]
-    for keyword in search_keywords:
-        url = f"https://www.gov.uk/api/search.json?q={keyword}&count=100"
+
+    def search(keyword):
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            for item in data.get('results', []):
+            return search_gov_uk(fetcher, keyword, search_url=search_url, workers=workers)
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching from GOV.UK for keyword '{keyword}': {e}")
+            return []
+
+    with ThreadPoolExecutor(max_workers=len(search_keywords)) as executor:
+        for items in executor.map(search, search_keywords):
+            for item in items:
                 gov_uk_results.append({
                     'title': item.get('title'),
                     'link': "https://www.gov.uk" + item.get('link'),
@@ -94,16 +100,12 @@ def scrape_legislation_data():
                     'date': item.get('public_timestamp', '').split('T')[0],
                     'source': 'GOV.UK'
                 })
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching from GOV.UK for keyword '{keyword}': {e}")
-        time.sleep(1)
 
     # Part 2: legislation.gov.uk for formal acts
     legislation_gov_uk_results = []
     base_url = "https://www.legislation.gov.uk/ukpga/2014/22/contents" # Example: Immigration Act 2014
     try:
-        response = requests.get(base_url)
-        response.raise_for_status()
+        response = fetcher.get(base_url)
         soup = BeautifulSoup(response.content, 'html.parser')
         title = soup.find('h1', class_='title').text.strip()
         legislation_gov_uk_results.append({
@@ -122,6 +124,7 @@ def scrape_legislation_data():
     
     output_path = 'data/raw/uk_legislation.csv'
     df_combined.to_csv(output_path, index=False)
+    print(f"HTTP requests: {fetcher.stats['fetched']} downloaded, {fetcher.stats['not_modified']} not modified")
     print(f"--- Legislation scraping complete. Saved {len(df_combined)} documents to {output_path} ---")
     return df_combined
 
@@ -1,10 +1,16 @@
 import pandas as pd
 import nltk
 from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-import re
 import os
 
+from text_cleaning import DEFAULT_CHUNK_SIZE, clean_csv
+from dedup import DUPLICATE_CLUSTERS_PATH, deduplicate_posts, expand_to_duplicates, expand_to_duplicates_chunked
+from partitioned import partition_count, partitioned_join
+from profiling import profile_stage, record_rows
+from search_index import SEARCH_INDEX_PATH, build_search_index
+from storage import TableWriter, iter_table, read_table, table_columns, table_rows, write_table
+from topic_labels import LABEL_RULES_PATH, load_label_rules, label_topics
+
 # --- Download NLTK data if not present ---
 try:
     stopwords.words('english')
@@ -16,88 +22,139 @@ except LookupError:
 os.makedirs('data/processed', exist_ok=True)
 
 
-def clean_text_data(input_path='data/raw/reddit_scraped_posts.csv', output_path='data/processed/reddit_cleaned.csv'):
+@profile_stage
+def clean_text_data(
+    input_path='data/raw/reddit_scraped_posts.csv',
+    output_path='data/processed/reddit_cleaned.parquet',
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    workers=None
+):
     """
     Cleans raw Reddit text data by normalizing, tokenizing, and removing stopwords.
+
+    The CSV is streamed in chunks over a process pool and written as it goes,
+    so memory use does not grow with the corpus.
     """
     print("--- Starting text cleaning ---")
-    df = pd.read_csv(input_path)
-    df['selftext'] = df['selftext'].fillna('')
-    df['full_text'] = df['title'] + ' ' + df['selftext']
-    
-    stop_words = set(stopwords.words('english'))
-
-    def clean_text(text):
-        text = text.lower()
-        text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
-        text = re.sub(r'\@\w+|\#', '', text)
-        text = re.sub(r'[^\w\s]', '', text)
-        text = re.sub(r'\d+', '', text)
-        tokens = word_tokenize(text)
-        filtered_tokens = [w for w in tokens if not w in stop_words]
-        return " ".join(filtered_tokens)
-
-    df['text_cleaned'] = df['full_text'].apply(clean_text)
-    df.to_csv(output_path, index=False)
-    print(f"--- Text cleaning complete. Saved to {output_path} ---")
-    return df
+    stats = clean_csv(input_path, output_path, chunk_size=chunk_size, workers=workers)
+    print(f"--- Text cleaning complete. Cleaned {stats['rows']} rows "
+          f"({stats['rows_per_second']:.0f} rows/s). Saved to {output_path} ---")
+    return stats
 
 
-def apply_topic_labels(input_path='data/processed/reddit_with_topics.csv', output_path='data/processed/reddit_with_final_topics.csv'):
+@profile_stage
+def remove_near_duplicates(
+    input_path='data/processed/reddit_cleaned.parquet',
+    output_path='data/processed/reddit_deduplicated.parquet',
+    clusters_path=DUPLICATE_CLUSTERS_PATH
+):
+    """
+    Keeps one representative per cluster of near-duplicate posts (crossposts, reposts)
+    so the topic and emotion models only score each text once.
+    """
+    print("--- Removing near-duplicate posts ---")
+    stats = deduplicate_posts(input_path, output_path, clusters_path=clusters_path)
+    record_rows(rows_in=stats['rows'], rows_out=stats['representatives'])
+    print(f"--- Near-duplicate removal complete. Kept {stats['representatives']} of {stats['rows']} posts. "
+          f"Saved to {output_path} ---")
+    return stats
+
+
+@profile_stage
+def apply_topic_labels(
+    input_path='data/processed/reddit_with_topics.parquet',
+    output_path='data/processed/reddit_with_final_topics.parquet',
+    rules_path=LABEL_RULES_PATH,
+    chunk_size=None
+):
     """
     Applies a multi-stage, rule-based labeling process to the topic model output.
+
+    The rules are read from rules_path (see config/topic_label_rules.yaml). Every post is
+    labeled on its own, so with chunk_size the table is labeled chunk by chunk instead of
+    being loaded whole.
     """
     print("--- Applying custom and refined topic labels ---")
-    df = pd.read_csv(input_path)
+    rules = load_label_rules(rules_path)
+    if chunk_size:
+        with TableWriter(output_path) as writer:
+            for chunk in iter_table(input_path, chunk_size=chunk_size):
+                chunk['Final_Topic_Label'] = label_topics(chunk, rules)
+                writer.write(chunk)
+        record_rows(rows_in=writer.rows, rows_out=writer.rows)
+        print(f"--- Topic labeling complete ({writer.rows} posts in chunks of {chunk_size}). Saved to {output_path} ---")
+        return {'rows': writer.rows}
 
+    df = read_table(input_path)
+    record_rows(rows_in=len(df))
+
+    df['Final_Topic_Label'] = label_topics(df, rules)
     
-    def map_custom_label(topic_name):
-        if "brp" in topic_name or "biometric" in topic_name: return "BRP & Biometric Problems"
-        if "visa" in topic_name or "application" in topic_name: return "Visa Applications & Issues"
-        if "settled" in topic_name or "euss" in topic_name: return "EUSS & Settled Status"
-        if "delay" in topic_name or "ukvi" in topic_name: return "UKVI Delays & Complaints"
-        if "share" in topic_name or "work" in topic_name: return "Right to Work / Share Code"
-        if "student" in topic_name: return "Student Visa & Universities"
-        if "ilr" in topic_name: return "ILR & Settlement"
-        if "law" in topic_name or "policy" in topic_name: return "UK Immigration Law & Policy"
-        if "nhs" in topic_name or "health" in topic_name: return "NHS & Health Access"
-        return "General Immigration Concerns"
-    
-    df['Final_Topic_Label'] = df['topic_name'].apply(map_custom_label)
-
-    # Stages 2 & 3: Refinement and fallback (logic from 6b and 6c)
-    def refine_label(row):
-        if row['Final_Topic_Label'] == "General Immigration Concerns":
-            text = row['full_text'].lower()
-            if any(kw in text for kw in ["delay", "waiting", "complaint"]): return "UKVI Delays & Complaints"
-            if any(kw in text for kw in ["brp", "biometric"]): return "BRP & Biometric Problems"
-            # Add more refinement rules as needed
-        return row['Final_Topic_Label']
-
-    df['Final_Topic_Label'] = df.apply(refine_label, axis=1)
-    
-    df.to_csv(output_path, index=False)
+    write_table(df, output_path)
     print(f"--- Topic labeling complete. Saved to {output_path} ---")
     return df
 
+@profile_stage
 def create_dashboard_data(
-    topics_path='data/processed/reddit_with_final_topics.csv',
-    emotions_path='data/processed/reddit_with_emotions.csv',
+    topics_path='data/processed/reddit_with_final_topics.parquet',
+    emotions_path='data/processed/reddit_with_emotions.parquet',
     legislation_path='data/processed/topic_legislation_mapping.csv',
-    output_reddit_path='data/processed/reddit_dashboard_data.csv',
-    output_laws_path='data/processed/laws_dashboard_data.csv'
+    output_reddit_path='data/processed/reddit_dashboard_data.parquet',
+    output_laws_path='data/processed/laws_dashboard_data.csv',
+    cleaned_path='data/processed/reddit_cleaned.parquet',
+    clusters_path=DUPLICATE_CLUSTERS_PATH,
+    chunk_size=None,
+    search_index_path=SEARCH_INDEX_PATH
 ):
     """
     Merges all analysis outputs into final datasets for the Streamlit dashboard.
+
+    When near-duplicates were removed before modeling, the labels of each cluster's
+    representative are copied back to its other members.
+
+    With chunk_size the merges are hash-partitioned joins over partitions of about
+    chunk_size posts spilled to disk (see src/partitioned.py), so memory use depends on
+    chunk_size rather than the corpus size. Rows are then written in partition order.
+
+    The dashboard's full-text search index is then built from text_cleaned (see
+    src/search_index.py); pass search_index_path=None to skip it.
     """
     print("--- Merging data for dashboard ---")
-    df_topics = pd.read_csv(topics_path)
-    df_emotions = pd.read_csv(emotions_path)
-    
-    # Merge topics and emotions
-    df_dashboard = pd.merge(df_topics, df_emotions[['id', 'emotion_label']], on='id', how='left')
-    df_dashboard.to_csv(output_reddit_path, index=False)
+    # emotion_mask holds every detected emotion; older emotion outputs only have the top label
+    emotion_columns = ['id', 'emotion_label'] + [c for c in ['emotion_mask'] if c in table_columns(emotions_path)]
+    if chunk_size:
+        rows = table_rows(topics_path)
+        record_rows(rows_in=rows)
+        partitions = partition_count(rows, chunk_size)
+        topic_columns = None
+        if os.path.exists(clusters_path):
+            # Members take their raw columns from the cleaned table, so only spill the labels
+            cleaned_columns = set(table_columns(cleaned_path))
+            topic_columns = ['id'] + [c for c in table_columns(topics_path) if c not in cleaned_columns]
+        df_dashboard = partitioned_join(iter_table(topics_path, columns=topic_columns, chunk_size=chunk_size),
+                                        iter_table(emotions_path, columns=emotion_columns, chunk_size=chunk_size),
+                                        'id', partitions)
+        if os.path.exists(clusters_path):
+            partitions = partition_count(table_rows(cleaned_path), chunk_size)
+            df_dashboard = expand_to_duplicates_chunked(df_dashboard, cleaned_path, clusters_path, partitions, chunk_size)
+        with TableWriter(output_reddit_path) as writer:
+            for partition in df_dashboard:
+                writer.write(partition)
+        record_rows(rows_out=writer.rows)
+        df_dashboard = {'rows': writer.rows}
+    else:
+        df_topics = read_table(topics_path)
+        record_rows(rows_in=len(df_topics))
+        df_emotions = read_table(emotions_path, columns=emotion_columns)
+
+        # Merge topics and emotions
+        df_dashboard = pd.merge(df_topics, df_emotions, on='id', how='left')
+        if os.path.exists(clusters_path):
+            df_dashboard = expand_to_duplicates(df_dashboard, read_table(cleaned_path), read_table(clusters_path))
+        write_table(df_dashboard, output_reddit_path)
     print(f"--- Reddit dashboard data created. Saved to {output_reddit_path} ---")
+    if search_index_path:
+        build_search_index(output_reddit_path, search_index_path)
 
     # Prepare legislation data (simple copy/rename in this case)
     if os.path.exists(legislation_path):
@@ -111,7 +168,7 @@ def create_dashboard_data(
 
 if __name__ == '__main__':
     clean_text_data()
+    remove_near_duplicates()
     # Note: The following functions depend on the output of the modeling script.
-    # They would typically be run after train_models.py
-    # For a simple pipeline, you might call them from a master script.
-    print("To run the full processing pipeline, first run train_models.py, then run the remaining functions in this script.")
\ No newline at end of file
+    # src/pipeline.py runs every stage in dependency order.
+    print("To run the full processing pipeline, use: python src/pipeline.py")
\ No newline at end of file
@@ -1,98 +1,269 @@
 import pandas as pd
+import numpy as np
 from bertopic import BERTopic
 from sentence_transformers import SentenceTransformer
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
-import torch
-from fuzzywuzzy import fuzz
+from transformers import pipeline, AutoConfig, AutoTokenizer
+from sklearn.metrics.pairwise import cosine_similarity
+from datetime import datetime
+import json
 import os
 
+from embedding_cache import EMBEDDING_MODEL, EmbeddingStore
+from emotion_sets import check_labels, emotion_masks
+from profiling import profile_stage, record_rows
+from storage import TableWriter, iter_table, read_table, write_table
+from legislation_index import LegislationIndex
+from emotion_backends import DEFAULT_BACKEND, cache_name, load_emotion_model
+from emotion_inference import (
+    GOEMOTIONS_MODEL, DEFAULT_BATCH_SIZE, predict_emotion_probabilities, predict_emotion_probabilities_windowed,
+    top_emotion_labels, probability_table, save_emotion_probabilities
+)
+
+# --- Configuration ---
+TOPIC_MODEL_DIR = 'bertopic_model_folder'
+
+# Drift thresholds that trigger a refit recommendation in incremental mode
+MAX_OUTLIER_RATE_INCREASE = 0.10
+MAX_CENTROID_SIMILARITY_DROP = 0.05
+MAX_TRANSFORMED_FRACTION = 0.5
+
 # --- Directory Setup ---
 os.makedirs('data/processed', exist_ok=True)
 
 
-def run_topic_modeling(input_path='data/processed/reddit_cleaned.csv', output_path='data/processed/reddit_with_topics.csv'):
+def topic_drift_metrics(topic_model, topics, embeddings):
     """
-    Performs topic modeling on the cleaned text data using BERTopic.
+    Measures how well a batch of documents fits an already-fitted topic model.
     """
-    print("--- Starting topic modeling ---")
-    df = pd.read_csv(input_path)
-    docs = df['text_cleaned'].tolist()
+    topics = np.asarray(topics)
+    # Skip the outlier topic's embedding when it is present
+    centroids = topic_model.topic_embeddings_[topic_model._outliers:]
+    similarities = cosine_similarity(embeddings, centroids).max(axis=1)
+    return {
+        'n_docs': int(len(topics)),
+        'outlier_rate': float((topics == -1).mean()),
+        'mean_centroid_similarity': float(similarities.mean()),
+    }
 
-    embedding_model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
-    topic_model = BERTopic(embedding_model=embedding_model, min_topic_size=10, verbose=True)
-    
-    topics, _ = topic_model.fit_transform(docs)
-    
+
+def refit_reasons(meta, drift):
+    """
+    Returns the reasons (if any) why a full refit of the topic model is recommended.
+    """
+    baseline = meta['baseline']
+    reasons = []
+    if drift['outlier_rate'] - baseline['outlier_rate'] > MAX_OUTLIER_RATE_INCREASE:
+        reasons.append(f"outlier rate rose from {baseline['outlier_rate']:.2f} to {drift['outlier_rate']:.2f}")
+    if baseline['mean_centroid_similarity'] - drift['mean_centroid_similarity'] > MAX_CENTROID_SIMILARITY_DROP:
+        reasons.append(
+            f"mean centroid similarity fell from {baseline['mean_centroid_similarity']:.3f} "
+            f"to {drift['mean_centroid_similarity']:.3f}"
+        )
+    if meta['n_docs_transformed'] > MAX_TRANSFORMED_FRACTION * meta['n_docs_fit']:
+        reasons.append(f"{meta['n_docs_transformed']} posts assigned since the last fit on {meta['n_docs_fit']}")
+    return reasons
+
+
+def _attach_topic_names(df, topics, topic_model):
+    df = df.copy()
     df['topic_id'] = topics
     topic_info = topic_model.get_topic_info()
     df = pd.merge(df, topic_info[['Topic', 'Name']], left_on='topic_id', right_on='Topic', how='left')
-    df = df.rename(columns={'Name': 'topic_name'})
+    return df.rename(columns={'Name': 'topic_name'})
+
+
+@profile_stage
+def run_topic_modeling(
+    input_path='data/processed/reddit_deduplicated.parquet',
+    output_path='data/processed/reddit_with_topics.parquet',
+    model_dir=TOPIC_MODEL_DIR,
+    refit=False
+):
+    """
+    Performs topic modeling on the cleaned text data using BERTopic.
+
+    The fitted model is saved to model_dir. On later runs only posts missing from the
+    previous output are assigned with transform, keeping earlier topic ids and names
+    stable, unless refit is True or no saved model exists.
+    """
+    print("--- Starting topic modeling ---")
+    df = read_table(input_path)
+    record_rows(rows_in=len(df))
+    model_path = os.path.join(model_dir, 'bertopic_model.pkl')
+    meta_path = os.path.join(model_dir, 'model_meta.json')
+
+    embedding_model = SentenceTransformer(EMBEDDING_MODEL)
     
-    df.to_csv(output_path, index=False)
+    # Only embed posts whose cleaned text has not been seen before
+    embedding_store = EmbeddingStore(EMBEDDING_MODEL)
+    def embed(docs):
+        return embedding_store.get_or_compute(
+            docs, lambda texts: embedding_model.encode(texts, show_progress_bar=True)
+        )
+
+    if not refit and os.path.exists(model_path) and os.path.exists(meta_path) and os.path.exists(output_path):
+        df_previous = read_table(output_path)
+        df_old = df_previous[df_previous['id'].isin(df['id'])]
+        df_new = df[~df['id'].isin(df_previous['id'])]
+        print(f"Incremental mode: {len(df_old)} posts keep their topics, {len(df_new)} new posts to assign")
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+        if len(df_new) > 0:
+            topic_model = BERTopic.load(model_path, embedding_model=embedding_model)
+            docs = df_new['text_cleaned'].tolist()
+            embeddings = embed(docs)
+            topics, _ = topic_model.transform(docs, embeddings=embeddings)
+            df_new = _attach_topic_names(df_new, topics, topic_model)
+
+            drift = topic_drift_metrics(topic_model, topics, embeddings)
+            meta['n_docs_transformed'] += drift['n_docs']
+            meta['last_drift'] = drift
+            meta['refit_reasons'] = refit_reasons(meta, drift)
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f, indent=2)
+
+            print(f"Drift on new posts: outlier rate {drift['outlier_rate']:.2f}, "
+                  f"mean centroid similarity {drift['mean_centroid_similarity']:.3f}")
+            if meta['refit_reasons']:
+                print("Warning: a full refit is recommended (" + "; ".join(meta['refit_reasons']) + "). "
+                      "Run run_topic_modeling(refit=True).")
+
+        df = pd.concat([df_old, df_new], ignore_index=True)
+    else:
+        docs = df['text_cleaned'].tolist()
+        embeddings = embed(docs)
+
+        topic_model = BERTopic(embedding_model=embedding_model, min_topic_size=10, verbose=True)
+        topics, _ = topic_model.fit_transform(docs, embeddings=embeddings)
+        df = _attach_topic_names(df, topics, topic_model)
+
+        # Persist the fitted model and the baseline drift metrics for incremental runs
+        os.makedirs(model_dir, exist_ok=True)
+        topic_model.save(model_path, serialization='pickle', save_embedding_model=False)
+        meta = {
+            'fitted_at': datetime.now().isoformat(timespec='seconds'),
+            'n_docs_fit': len(docs),
+            'n_docs_transformed': 0,
+            'baseline': topic_drift_metrics(topic_model, topics, embeddings),
+            'refit_reasons': [],
+        }
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+        print(f"Saved fitted topic model to {model_path}")
+    
+    write_table(df, output_path)
     print(f"--- Topic modeling complete. Saved results to {output_path} ---")
     return df
 
 
-def run_emotion_detection(input_path='data/processed/reddit_cleaned.csv', output_path='data/processed/reddit_with_emotions.csv'):
+@profile_stage
+def run_emotion_detection(
+    input_path='data/processed/reddit_deduplicated.parquet',
+    output_path='data/processed/reddit_with_emotions.parquet',
+    probabilities_path='data/processed/emotion_probabilities.npz',
+    batch_size=DEFAULT_BATCH_SIZE,
+    num_threads=None,
+    backend=DEFAULT_BACKEND,
+    pooling=None,
+    chunk_size=None
+):
     """
     Runs emotion detection using the fine-grained GoEmotions model.
+
+    backend selects the CPU inference backend (see src/emotion_backends.py); check a
+    faster one against FP32 with benchmarks/bench_emotion_backends.py before switching.
+    Posts longer than 512 tokens are truncated unless pooling is 'max' or 'mean', which
+    scores them in overlapping windows and combines the window probabilities.
+
+    With chunk_size the posts are read, scored and written chunk by chunk, and the
+    probabilities are appended to a Parquet table next to probabilities_path.
     """
     print("--- Starting emotion detection ---")
-    df = pd.read_csv(input_path)
-    
     # Using the more detailed GoEmotions model as the primary choice
-    model_name = "monologg/bert-base-cased-goemotions-original"
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    config = AutoConfig.from_pretrained(GOEMOTIONS_MODEL)
+    labels = config.id2label
+    label_names = [labels[i] for i in range(len(labels))]
+    check_labels(label_names)
+    loaded = {}
     
-    labels = model.config.id2label
+    def score_texts(texts):
+        # Load the model on the first texts that miss the cache, then reuse it for later chunks
+        if not loaded:
+            loaded['tokenizer'] = AutoTokenizer.from_pretrained(GOEMOTIONS_MODEL)
+            loaded['model'] = load_emotion_model(GOEMOTIONS_MODEL, loaded['tokenizer'], backend=backend,
+                                                 num_threads=num_threads)
+        tokenizer, model = loaded['tokenizer'], loaded['model']
+        if pooling:
+            return predict_emotion_probabilities_windowed(texts, tokenizer, model, pooling=pooling,
+                                                          batch_size=batch_size, num_threads=num_threads)
+        return predict_emotion_probabilities(texts, tokenizer, model, batch_size=batch_size, num_threads=num_threads)
     
-    emotions = []
-    for text in df['full_text']:
-        inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=512)
-        with torch.no_grad():
-            logits = model(**inputs).logits
-        
-        # Apply sigmoid to get probabilities and find the most likely emotion
-        probabilities = torch.sigmoid(logits)
-        top_emotion_idx = probabilities.argmax().item()
-        emotions.append(labels[top_emotion_idx])
-        
-    df['emotion_label'] = emotions
-    df.to_csv(output_path, index=False)
-    print(f"--- Emotion detection complete. Saved results to {output_path} ---")
+    # Score posts in length-bucketed batches, reusing cached probabilities for posts seen before
+    store_name = cache_name(GOEMOTIONS_MODEL, backend) + (f"#windows-{pooling}" if pooling else "")
+    emotion_store = EmbeddingStore(store_name)
+
+    if chunk_size:
+        probabilities_path = os.path.splitext(probabilities_path)[0] + '.parquet'
+        with TableWriter(output_path) as writer, TableWriter(probabilities_path) as probability_writer:
+            for chunk in iter_table(input_path, chunk_size=chunk_size):
+                probabilities = emotion_store.get_or_compute(chunk['full_text'], score_texts)
+                chunk['emotion_label'] = top_emotion_labels(probabilities, labels)
+                chunk['emotion_mask'] = emotion_masks(probabilities)
+                writer.write(chunk)
+                probability_writer.write(probability_table(chunk['id'], label_names, probabilities))
+        record_rows(rows_in=writer.rows, rows_out=writer.rows)
+        print(f"--- Emotion detection complete ({writer.rows} posts in chunks of {chunk_size}). "
+              f"Saved results to {output_path} and probabilities to {probabilities_path} ---")
+        return {'rows': writer.rows}
+
+    df = read_table(input_path)
+    record_rows(rows_in=len(df))
+    probabilities = emotion_store.get_or_compute(df['full_text'], score_texts)
+    
+    df['emotion_label'] = top_emotion_labels(probabilities, labels)
+    # Every emotion above the threshold, packed one bit per label (see src/emotion_sets.py)
+    df['emotion_mask'] = emotion_masks(probabilities)
+    write_table(df, output_path)
+    save_emotion_probabilities(probabilities_path, df['id'], label_names, probabilities)
+    print(f"--- Emotion detection complete. Saved results to {output_path} and probabilities to {probabilities_path} ---")
     return df
 
 
+@profile_stage
 def link_legislation_to_topics(
-    topics_path='data/processed/reddit_with_final_topics.csv',
+    topics_path='data/processed/reddit_with_final_topics.parquet',
     legislation_path='data/raw/uk_legislation.csv',
-    output_path='data/processed/topic_legislation_mapping.csv'
+    output_path='data/processed/topic_legislation_mapping.csv',
+    top_k=None
 ):
     """
     Links identified topics to relevant legislation using fuzzy string matching.
+
+    With top_k, only the top_k titles most similar by character n-gram TF-IDF are scored
+    for each topic, which is faster but may miss the best match.
     """
     print("--- Linking topics to legislation ---")
     if not os.path.exists(legislation_path):
         print(f"Error: Legislation file not found at {legislation_path}. Skipping.")
         return
 
-    df_topics = pd.read_csv(topics_path)
+    df_topics = read_table(topics_path, columns=['Final_Topic_Label'])
     df_laws = pd.read_csv(legislation_path)
+    record_rows(rows_in=len(df_topics))
     
     unique_topics = df_topics['Final_Topic_Label'].unique()
     
+    # Every title is scored unless top_k asks to narrow each topic to its most similar titles first
+    law_index = LegislationIndex([str(title).lower() for title in df_laws['title']])
+    
     mappings = []
     for topic in unique_topics:
-        best_match_score = 0
-        best_match_law = None
-        for _, law in df_laws.iterrows():
-            score = fuzz.partial_ratio(topic.lower(), str(law['title']).lower())
-            if score > best_match_score:
-                best_match_score = score
-                best_match_law = law
+        best_position, best_match_score = law_index.best_match(topic.lower(), top_k=top_k)
         
-        if best_match_law is not None and best_match_score > 75: # Confidence threshold
+        if best_position is not None and best_match_score > 75: # Confidence threshold
+            best_match_law = df_laws.iloc[best_position]
             mappings.append({
                 'Topic': topic,
                 'Legislation_Title': best_match_law['title'],
@@ -110,5 +281,5 @@ if __name__ == '__main__':
     run_topic_modeling()
     run_emotion_detection()
     # Note: The linking script depends on the output of process_data.py
-    # which should be run after this script. A master script would handle this ordering.
-    print("Run process_data.py after this script, then call link_legislation_to_topics() from this script again or a master script.")
\ No newline at end of file
+    # which should be run after this script. src/pipeline.py handles this ordering.
+    print("To run the full processing pipeline, use: python src/pipeline.py")
\ No newline at end of file
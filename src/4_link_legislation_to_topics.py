@@ -1,44 +1,55 @@
 import pandas as pd
-from fuzzywuzzy import fuzz
-from fuzzywuzzy import process
 import os
 
-REDDIT_DATA_PATH = "data/processed/reddit_dashboard_data.csv"
+from legislation_index import LegislationIndex
+from profiling import profile_stage, record_rows
+from storage import read_table
+from semantic_linker import VECTOR_INDEX_DIR, SemanticLegislationIndex, embed_texts
+
+REDDIT_DATA_PATH = "data/processed/reddit_dashboard_data.parquet"
 LEGISLATION_PATH = "data/processed/legislation_cleaned.csv"
 OUTPUT_PATH = "data/processed/topic_legislation_mapping.csv"
+SEMANTIC_TOPIC_OUTPUT_PATH = "data/processed/topic_legislation_semantic.csv"
+SEMANTIC_POST_OUTPUT_PATH = "data/processed/post_legislation_semantic.csv"
 
 def clean_text(text):
     if pd.isna(text):
         return ""
     return str(text).lower().strip()
 
-def match_legislation_to_topic(topic, laws_df, threshold=75):
+def build_legislation_index(laws_df):
+    return LegislationIndex([clean_text(f"{row['keyword']} {row['title']}") for _, row in laws_df.iterrows()])
+
+def match_legislation_to_topic(topic, laws_df, threshold=75, index=None, top_k=None):
+    if index is None:
+        index = build_legislation_index(laws_df)
     matches = []
     topic_cleaned = clean_text(topic)
 
-    for _, row in laws_df.iterrows():
-        combined_text = f"{row['keyword']} {row['title']}"
-        score = fuzz.partial_ratio(topic_cleaned, clean_text(combined_text))
-        if score >= threshold:
-            matches.append({
-                "topic": topic,
-                "law_keyword": row['keyword'],
-                "law_title": row['title'],
-                "law_link": row['link'],
-                "law_date": row['date'],
-                "match_score": score
-            })
+    for position, score in index.match(topic_cleaned, threshold, top_k=top_k):
+        row = laws_df.iloc[position]
+        matches.append({
+            "topic": topic,
+            "law_keyword": row['keyword'],
+            "law_title": row['title'],
+            "law_link": row['link'],
+            "law_date": row['date'],
+            "match_score": score
+        })
     return matches
 
+@profile_stage
 def link_legislation_to_topics():
-    reddit_df = pd.read_csv(REDDIT_DATA_PATH)
+    reddit_df = read_table(REDDIT_DATA_PATH, columns=["Final_Topic_Label"])
+    record_rows(rows_in=len(reddit_df))
     laws_df = pd.read_csv(LEGISLATION_PATH)
 
     unique_topics = reddit_df["Final_Topic_Label"].dropna().unique()
     all_matches = []
+    index = build_legislation_index(laws_df)
 
     for topic in unique_topics:
-        topic_matches = match_legislation_to_topic(topic, laws_df)
+        topic_matches = match_legislation_to_topic(topic, laws_df, index=index)
         if topic_matches:
             all_matches.extend(topic_matches)
         else:
@@ -56,5 +67,30 @@ def link_legislation_to_topics():
     df_out.to_csv(OUTPUT_PATH, index=False)
     print(f"✅ Saved legislation-topic links to {OUTPUT_PATH}")
 
+@profile_stage
+def link_legislation_semantically(top_k=5, min_similarity=0.4, link_posts=True, index_dir=VECTOR_INDEX_DIR):
+    """
+    Links topics, and optionally individual posts, to legislation by embedding similarity.
+    """
+    reddit_df = read_table(REDDIT_DATA_PATH, columns=["id", "text_cleaned", "Final_Topic_Label"])
+    record_rows(rows_in=len(reddit_df))
+    laws_df = pd.read_csv(LEGISLATION_PATH)
+    index = SemanticLegislationIndex.build_or_load(laws_df, index_dir=index_dir)
+
+    unique_topics = reddit_df["Final_Topic_Label"].dropna().unique()
+    topic_links = index.links(unique_topics, embed_texts(unique_topics), top_k=top_k,
+                              min_similarity=min_similarity, id_column="topic")
+    topic_links.to_csv(SEMANTIC_TOPIC_OUTPUT_PATH, index=False)
+    print(f"✅ Saved {len(topic_links)} semantic topic-legislation links to {SEMANTIC_TOPIC_OUTPUT_PATH}")
+
+    if link_posts:
+        # Posts reuse the text_cleaned embeddings cached by run_topic_modeling
+        post_vectors = embed_texts(reddit_df["text_cleaned"].fillna("").tolist())
+        post_links = index.links(reddit_df["id"], post_vectors, top_k=top_k,
+                                 min_similarity=min_similarity, id_column="id")
+        post_links.to_csv(SEMANTIC_POST_OUTPUT_PATH, index=False)
+        print(f"✅ Saved {len(post_links)} semantic post-legislation links to {SEMANTIC_POST_OUTPUT_PATH}")
+
 if __name__ == "__main__":
     link_legislation_to_topics()
+    link_legislation_semantically()
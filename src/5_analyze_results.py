@@ -1,71 +1,199 @@
 import pandas as pd
-import matplotlib.pyplot as plt
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import seaborn as sns
-from wordcloud import WordCloud
+import multiprocessing
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from profiling import profile_stage, record_rows
+from storage import read_table, table_columns
+from trends import LEGISLATION_SPIKES_PATH, TREND_DIR, TrendCube
+
+# --- Configuration ---
+TOPIC_FIGURES_DIR = 'reports/figures/topics'
 
 # --- Directory Setup ---
 os.makedirs('reports/figures', exist_ok=True)
 
 
-def generate_visualizations(input_path='data/processed/reddit_dashboard_data.csv'):
+def load_report_data(input_path='data/processed/reddit_dashboard_data.parquet'):
+    """
+    Loads the columns every report stage uses, once.
+    """
+    available = table_columns(input_path)
+    columns = ['Final_Topic_Label', 'emotion_label', 'text_cleaned']
+    return read_table(input_path, columns=columns + [c for c in ['duplicate_of'] if c in available])
+
+
+def count_clusters_once(df):
+    """
+    Drops the near-duplicates whose labels were copied from a cluster representative, so every
+    figure and table counts each cluster of near-duplicate posts once (as the trends do).
+    """
+    if 'duplicate_of' in df.columns:
+        return df[df['duplicate_of'].isna()]
+    return df
+
+
+def report_aggregates(df):
+    """
+    Topic counts, emotion counts and the topic x emotion crosstab shared by the figures and tables.
+    """
+    topic_counts = df['Final_Topic_Label'].value_counts()
+    emotion_counts = df['emotion_label'].value_counts()
+    return {
+        'topic_counts': topic_counts[topic_counts > 0],
+        'emotion_counts': emotion_counts[emotion_counts > 0],
+        'crosstab': pd.crosstab(df['Final_Topic_Label'].astype(str), df['emotion_label'].astype(str)),
+    }
+
+
+def _subplots(figsize):
+    """
+    A figure and axes outside pyplot's global figure manager, which is not thread-safe:
+    the pipeline runner draws the trend report while other stages draw on other threads.
+    """
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.subplots()
+
+
+def _save(fig, path):
+    fig.tight_layout()
+    fig.savefig(path)
+    # Unmanaged figures are freed with their last reference, so long runs do not accumulate them
+    return path
+
+
+def plot_topic_distribution(topic_counts, path='reports/figures/topic_distribution.png'):
+    fig, ax = _subplots((12, 8))
+    sns.barplot(x=topic_counts.values, y=topic_counts.index.astype(str), palette='viridis', ax=ax)
+    ax.set_title('Figure 5.1: Distribution of Posts by Topic', fontsize=16)
+    ax.set_xlabel('Number of Posts', fontsize=12)
+    ax.set_ylabel('Topic', fontsize=12)
+    return _save(fig, path)
+
+
+def plot_emotion_distribution(emotion_counts, path='reports/figures/emotion_distribution.png',
+                              title='Figure 5.3: Overall Distribution of Top 10 Emotions'):
+    emotion_counts = emotion_counts.head(10)
+    fig, ax = _subplots((12, 8))
+    sns.barplot(x=emotion_counts.values, y=emotion_counts.index.astype(str), palette='plasma', ax=ax)
+    ax.set_title(title, fontsize=16)
+    ax.set_xlabel('Number of Posts', fontsize=12)
+    ax.set_ylabel('Emotion', fontsize=12)
+    return _save(fig, path)
+
+
+def plot_topic_emotion_heatmap(crosstab, path='reports/figures/topic_emotion_heatmap.png'):
+    fig, ax = _subplots((16, 10))
+    sns.heatmap(crosstab, cmap='YlGnBu', annot=False, ax=ax)
+    ax.set_title('Figure 5.4: Heatmap of Topic and Emotion Correlations', fontsize=16)
+    ax.set_xlabel('Emotion', fontsize=12)
+    ax.set_ylabel('Topic', fontsize=12)
+    return _save(fig, path)
+
+
+def plot_topic_word_cloud(topic, text, path):
+    from wordcloud import WordCloud
+    if not text.strip():
+        return None
+    try:
+        wordcloud = WordCloud(background_color="white", colormap="viridis", width=800, height=400).generate(text)
+    except ValueError:
+        # Only stopwords or single characters: nothing to draw
+        return None
+    fig, ax = _subplots((10, 5))
+    ax.imshow(wordcloud, interpolation='bilinear')
+    ax.axis("off")
+    ax.set_title(f'Key Terms: {topic}', fontsize=14)
+    return _save(fig, path)
+
+
+def topic_slug(topic):
+    return re.sub(r'[^\w]+', '_', str(topic)).strip('_').lower()
+
+
+def _render(task):
+    function, args = task
+    return function(*args)
+
+
+def render_figures(tasks, workers=None):
+    """
+    Renders (function, args) figure tasks on a process pool. Returns the saved paths.
+
+    Workers are spawned rather than forked, so rendering is safe to start from the
+    threaded pipeline runner; each worker imports matplotlib with the Agg backend.
+    """
+    workers = workers or min(len(tasks), os.cpu_count() or 1)
+    if workers <= 1:
+        return [_render(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return list(executor.map(_render, tasks))
+
+
+@profile_stage
+def generate_visualizations(input_path='data/processed/reddit_dashboard_data.parquet', per_topic=False,
+                            workers=None, df=None):
     """
     Generates and saves all key visualizations for the report.
+
+    The shared aggregates are computed once and the figures are drawn in parallel.
+    With per_topic, every Final_Topic_Label also gets a word cloud and an emotion
+    bar chart in reports/figures/topics/.
     """
     print("--- Generating visualizations ---")
-    if not os.path.exists(input_path):
-        print(f"Error: Dashboard data not found at {input_path}. Please run the full pipeline first.")
-        return
+    if df is None:
+        if not os.path.exists(input_path):
+            print(f"Error: Dashboard data not found at {input_path}. Please run the full pipeline first.")
+            return
+        df = load_report_data(input_path)
+    record_rows(rows_in=len(df))
+    df = count_clusters_once(df)
+
+    aggregates = report_aggregates(df)
+    tasks = [
+        (plot_topic_distribution, (aggregates['topic_counts'],)),
+        (plot_emotion_distribution, (aggregates['emotion_counts'],)),
+        (plot_topic_emotion_heatmap, (aggregates['crosstab'],)),
+    ]
+    if per_topic:
+        os.makedirs(TOPIC_FIGURES_DIR, exist_ok=True)
+        for topic, group in df.groupby(df['Final_Topic_Label'].astype(str)):
+            slug = os.path.join(TOPIC_FIGURES_DIR, topic_slug(topic))
+            text = " ".join(group['text_cleaned'].fillna('').astype(str))
+            emotion_counts = aggregates['crosstab'].loc[topic].sort_values(ascending=False)
+            tasks.append((plot_topic_word_cloud, (topic, text, f'{slug}_wordcloud.png')))
+            tasks.append((plot_emotion_distribution, (emotion_counts[emotion_counts > 0], f'{slug}_emotions.png',
+                                                      f'Top Emotions: {topic}')))
+
+    saved = [path for path in render_figures(tasks, workers) if path]
+    print(f"--- {len(saved)} visualizations generated and saved to reports/figures/ ---")
+    return saved
 
-    df = pd.read_csv(input_path)
-
-    # Figure 1: Topic Distribution
-    plt.figure(figsize=(12, 8))
-    sns.countplot(y='Final_Topic_Label', data=df, order=df['Final_Topic_Label'].value_counts().index, palette='viridis')
-    plt.title('Figure 5.1: Distribution of Posts by Topic', fontsize=16)
-    plt.xlabel('Number of Posts', fontsize=12)
-    plt.ylabel('Topic', fontsize=12)
-    plt.tight_layout()
-    plt.savefig('reports/figures/topic_distribution.png')
-    print("Saved topic distribution plot.")
-
-    # Figure 2: Emotion Distribution
-    plt.figure(figsize=(12, 8))
-    sns.countplot(y='emotion_label', data=df, order=df['emotion_label'].value_counts().index[:10], palette='plasma')
-    plt.title('Figure 5.3: Overall Distribution of Top 10 Emotions', fontsize=16)
-    plt.xlabel('Number of Posts', fontsize=12)
-    plt.ylabel('Emotion', fontsize=12)
-    plt.tight_layout()
-    plt.savefig('reports/figures/emotion_distribution.png')
-    print("Saved emotion distribution plot.")
-
-    # Figure 3: Topic-Emotion Heatmap
-    crosstab = pd.crosstab(df['Final_Topic_Label'], df['emotion_label'])
-    plt.figure(figsize=(16, 10))
-    sns.heatmap(crosstab, cmap='YlGnBu', annot=False)
-    plt.title('Figure 5.4: Heatmap of Topic and Emotion Correlations', fontsize=16)
-    plt.xlabel('Emotion', fontsize=12)
-    plt.ylabel('Topic', fontsize=12)
-    plt.tight_layout()
-    plt.savefig('reports/figures/topic_emotion_heatmap.png')
-    print("Saved topic-emotion heatmap.")
-    
-    print("--- All visualizations generated and saved to reports/figures/ ---")
-
-
-def generate_summary_tables(input_path='data/processed/reddit_dashboard_data.csv'):
+
+@profile_stage
+def generate_summary_tables(input_path='data/processed/reddit_dashboard_data.parquet', df=None):
     """
     Generates summary tables (as DataFrames) for the report.
     """
     print("--- Generating summary tables ---")
-    if not os.path.exists(input_path):
-        print(f"Error: Dashboard data not found at {input_path}. Please run the full pipeline first.")
-        return
-
-    df = pd.read_csv(input_path)
+    if df is None:
+        if not os.path.exists(input_path):
+            print(f"Error: Dashboard data not found at {input_path}. Please run the full pipeline first.")
+            return
+        df = load_report_data(input_path)
+    record_rows(rows_in=len(df))
+    df = count_clusters_once(df)
+    aggregates = report_aggregates(df)
 
     # Table 1: Topic Distribution
-    topic_counts = df['Final_Topic_Label'].value_counts().reset_index()
+    topic_counts = aggregates['topic_counts'].reset_index()
     topic_counts.columns = ['Topic', 'Post Count']
     topic_counts['Percentage of Corpus'] = (topic_counts['Post Count'] / len(df) * 100).round(1).astype(str) + '%'
     print("\n--- Table 5.1: Distribution of Posts Across Final Identified Topics ---")
@@ -73,16 +201,57 @@ def generate_summary_tables(input_path='data/processed/reddit_dashboard_data.csv
     topic_counts.to_csv('reports/table_topic_distribution.csv', index=False)
 
     # Table 2: Emotion Distribution
-    emotion_counts = df['emotion_label'].value_counts().reset_index().head(10)
+    emotion_counts = aggregates['emotion_counts'].reset_index().head(10)
     emotion_counts.columns = ['Emotion', 'Post Count']
     emotion_counts['Percentage of Corpus'] = (emotion_counts['Post Count'] / len(df) * 100).round(1).astype(str) + '%'
     print("\n--- Table 5.2 (from report): Top 10 Emotions Detected in the Corpus ---")
     print(emotion_counts)
     emotion_counts.to_csv('reports/table_emotion_distribution.csv', index=False)
-    
+
     print("\n--- Summary tables generated and saved to reports/ ---")
 
 
+@profile_stage
+def generate_trend_report(trend_dir=TREND_DIR, spikes_path=LEGISLATION_SPIKES_PATH, top_topics=6):
+    """
+    Plots weekly post volume per topic and tabulates volume spikes near linked legislation dates.
+    """
+    print("--- Generating trend report ---")
+    if not os.path.exists(os.path.join(trend_dir, 'meta.json')):
+        print(f"Error: Trend data not found at {trend_dir}. Please run src/trends.py first.")
+        return
+
+    cube = TrendCube.load(trend_dir)
+    volumes = cube.query(by='topic')
+    volumes = volumes[volumes.sum().sort_values(ascending=False).index[:top_topics]]
+
+    # Figure 4: Topic Volume Over Time
+    fig, ax = _subplots((14, 7))
+    for topic in volumes.columns:
+        ax.plot(volumes.index, volumes[topic].rolling(4, min_periods=1).mean(), label=topic)
+    if os.path.exists(spikes_path):
+        for law_date in pd.read_csv(spikes_path)['law_date'].unique():
+            ax.axvline(pd.Timestamp(law_date), color='grey', linestyle=':', linewidth=1)
+    ax.set_title(f'Figure 5.5: Post Volume per Topic ({cube.freq} windows, 4-window rolling mean)', fontsize=16)
+    ax.set_xlabel('Date', fontsize=12)
+    ax.set_ylabel('Posts', fontsize=12)
+    ax.legend()
+    _save(fig, 'reports/figures/topic_trends.png')
+    print("Saved topic trend plot.")
+
+    if os.path.exists(spikes_path):
+        spikes = pd.read_csv(spikes_path)
+        print("\n--- Volume Spikes Near Linked Legislation Dates ---")
+        print(spikes)
+        spikes.to_csv('reports/table_legislation_spikes.csv', index=False)
+
+
 if __name__ == '__main__':
-    generate_visualizations()
-    generate_summary_tables()
\ No newline at end of file
+    input_path = 'data/processed/reddit_dashboard_data.parquet'
+    if os.path.exists(input_path):
+        df = load_report_data(input_path)
+        generate_visualizations(df=df)
+        generate_summary_tables(df=df)
+    else:
+        print(f"Error: Dashboard data not found at {input_path}. Please run the full pipeline first.")
+    generate_trend_report()
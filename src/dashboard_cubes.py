@@ -0,0 +1,135 @@
+import io
+import os
+import pickle
+
+import pandas as pd
+
+from emotion_sets import cooccurrence
+from storage import read_table, table_columns
+
+# --- Configuration ---
+DASHBOARD_DATA_PATH = 'data/processed/reddit_dashboard_data.parquet'
+DASHBOARD_CUBES_PATH = 'data/processed/dashboard_cubes.pkl'
+MAX_WORDS = 200  # WordCloud's default max_words; only the top terms are ever drawn
+TOP_EMOTIONS = 10
+SAMPLE_POSTS = 5
+SAMPLE_COLUMNS = ['id', 'subreddit', 'emotion_label']  # Bodies are read from the post store by id
+
+
+def _png_bytes(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def term_frequencies(texts, max_words=MAX_WORDS):
+    """
+    Word cloud frequencies for a set of cleaned posts.
+
+    Uses WordCloud.process_text, the same tokenizing (stopwords, plurals, collocations)
+    WordCloud.generate applies, so generate_from_frequencies draws the same cloud.
+    """
+    from wordcloud import WordCloud
+    frequencies = WordCloud().process_text(" ".join(texts))
+    top = sorted(frequencies.items(), key=lambda item: item[1], reverse=True)[:max_words]
+    return dict(top)
+
+
+def render_word_cloud(frequencies):
+    """
+    PNG of the dashboard word cloud for precomputed term frequencies, or None if there are no terms.
+    """
+    if not frequencies:
+        return None
+    from wordcloud import WordCloud
+    wordcloud = WordCloud(background_color="white", colormap="viridis", width=800, height=400)
+    image = wordcloud.generate_from_frequencies(frequencies).to_image()
+    buffer = io.BytesIO()
+    image.save(buffer, format='png')
+    return buffer.getvalue()
+
+
+def render_heatmap(crosstab):
+    # A figure outside pyplot's global figure manager, which is not thread-safe:
+    # the pipeline runner builds the cubes while other stages draw on other threads
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    import seaborn as sns
+    fig = Figure(figsize=(16, 10))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    sns.heatmap(crosstab, cmap='YlGnBu', annot=False, ax=ax)
+    ax.set_title('Heatmap of Topic and Emotion Correlations', fontsize=16)
+    return _png_bytes(fig)
+
+
+def build_dashboard_cubes(input_path=DASHBOARD_DATA_PATH, output_path=DASHBOARD_CUBES_PATH, render=True):
+    """
+    Precomputes everything the dashboard shows per topic into one small pickle:
+    post counts, top emotion counts, the global topic x emotion crosstab, word cloud
+    term frequencies, sample post ids, emotion co-occurrence matrices (when the data has an
+    emotion_mask column) and (optionally) the rendered images.
+    """
+    print("--- Building dashboard cubes ---")
+    available = table_columns(input_path)
+    columns = ['id', 'subreddit', 'Final_Topic_Label', 'emotion_label', 'text_cleaned']
+    has_masks = 'emotion_mask' in available
+    df = read_table(input_path, columns=columns + [c for c in ['emotion_mask', 'duplicate_of'] if c in available])
+    if 'duplicate_of' in df.columns:
+        # Count each cluster of near-duplicate posts once, as the report and trends do
+        df = df[df['duplicate_of'].isna()]
+    # Posts without a topic are left out. Posts without an emotion (no emotion row after the
+    # left merge) count towards their topic but not the emotion counts, as in pd.crosstab.
+    df = df[df['Final_Topic_Label'].notna()].copy()
+    df['Final_Topic_Label'] = df['Final_Topic_Label'].astype(str)
+    df['emotion_label'] = df['emotion_label'].astype(str).where(df['emotion_label'].notna())
+
+    crosstab = pd.crosstab(df['Final_Topic_Label'], df['emotion_label'])
+    topic_counts = df['Final_Topic_Label'].value_counts()
+    topics = sorted(topic_counts.index)
+
+    cubes = {
+        'source_mtime': os.path.getmtime(input_path),
+        'topics': topics,
+        'topic_counts': topic_counts.to_dict(),
+        'crosstab': crosstab,
+        'emotion_counts': {},
+        'term_frequencies': {},
+        'samples': {},
+        'cooccurrence': {},
+        'word_clouds': {},
+        'heatmap': render_heatmap(crosstab) if render else None,
+    }
+    for topic, group in df.groupby('Final_Topic_Label', sort=True):
+        counts = group['emotion_label'].value_counts().head(TOP_EMOTIONS)
+        cubes['emotion_counts'][topic] = counts
+        cubes['samples'][topic] = group[SAMPLE_COLUMNS].head(SAMPLE_POSTS).reset_index(drop=True)
+        frequencies = term_frequencies(group['text_cleaned'].fillna('').astype(str))
+        cubes['term_frequencies'][topic] = frequencies
+        if has_masks:
+            cubes['cooccurrence'][topic] = cooccurrence(group['emotion_mask'])
+        if render:
+            cubes['word_clouds'][topic] = render_word_cloud(frequencies)
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'wb') as f:
+        pickle.dump(cubes, f)
+    print(f"--- Dashboard cubes for {len(topics)} topics saved to {output_path} "
+          f"({os.path.getsize(output_path) / 1e6:.2f} MB) ---")
+    return cubes
+
+
+def load_dashboard_cubes(path=DASHBOARD_CUBES_PATH, input_path=DASHBOARD_DATA_PATH):
+    """
+    Loads the cubes, rebuilding them first if they are missing or older than the dashboard data.
+    """
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            cubes = pickle.load(f)
+        if not os.path.exists(input_path) or cubes['source_mtime'] >= os.path.getmtime(input_path):
+            return cubes
+    return build_dashboard_cubes(input_path, path)
+
+
+if __name__ == '__main__':
+    build_dashboard_cubes()
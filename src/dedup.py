@@ -0,0 +1,199 @@
+import os
+import pickle
+
+import pandas as pd
+from datasketch import MinHash, MinHashLSH
+
+from partitioned import SPILL_DIR, partitioned_join
+from storage import iter_table, read_table, table_columns, write_table
+
+# --- Configuration ---
+LSH_INDEX_PATH = 'data/cache/minhash_lsh.pkl'
+DUPLICATE_CLUSTERS_PATH = 'data/processed/duplicate_clusters.parquet'
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 128
+SHINGLE_SIZE = 3
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """
+    Word shingles of a cleaned post. Posts shorter than size are a single shingle.
+    """
+    tokens = str(text).split() if isinstance(text, str) else []
+    if len(tokens) < size:
+        return {" ".join(tokens).encode('utf-8')}
+    return {" ".join(tokens[i:i + size]).encode('utf-8') for i in range(len(tokens) - size + 1)}
+
+
+class DuplicateIndex:
+    """
+    Persisted MinHash LSH index that assigns every post to a near-duplicate cluster.
+
+    The first post seen in a cluster is its representative; later posts whose estimated
+    Jaccard similarity to any indexed post exceeds the threshold join that post's cluster.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM, shingle_size=SHINGLE_SIZE):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.lsh = MinHashLSH(threshold=threshold, num_perm=num_perm)
+        self.representative = {}
+        self.order = {}
+
+    @staticmethod
+    def load_or_create(index_path=LSH_INDEX_PATH, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM,
+                       shingle_size=SHINGLE_SIZE):
+        if os.path.exists(index_path):
+            with open(index_path, 'rb') as f:
+                index = pickle.load(f)
+            if (index.threshold, index.num_perm, index.shingle_size) == (threshold, num_perm, shingle_size):
+                return index
+            print("Warning: LSH index parameters changed. Rebuilding the duplicate index.")
+        return DuplicateIndex(threshold, num_perm, shingle_size)
+
+    def save(self, index_path=LSH_INDEX_PATH):
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f)
+        os.replace(tmp_path, index_path)
+
+    def add(self, ids, texts):
+        """
+        Indexes posts not seen before. Returns the number of new posts indexed.
+        """
+        new = [(str(post_id), text) for post_id, text in zip(ids, texts) if str(post_id) not in self.representative]
+        minhashes = MinHash.bulk([shingles(text, self.shingle_size) for _, text in new], num_perm=self.num_perm)
+        for (post_id, _), minhash in zip(new, minhashes):
+            candidates = self.lsh.query(minhash)
+            if candidates:
+                # Join the cluster of the earliest indexed candidate
+                earliest = min(candidates, key=self.order.get)
+                self.representative[post_id] = self.representative[earliest]
+            else:
+                self.representative[post_id] = post_id
+            self.order[post_id] = len(self.order)
+            self.lsh.insert(post_id, minhash)
+        return len(new)
+
+    def clusters(self, ids):
+        """
+        Returns a DataFrame mapping each id to its cluster representative and the cluster size within ids.
+        """
+        ids = [str(post_id) for post_id in ids]
+        df = pd.DataFrame({'id': ids, 'representative_id': [self.representative[post_id] for post_id in ids]})
+        df['cluster_size'] = df.groupby('representative_id')['id'].transform('size')
+        return df
+
+
+def _cluster_of(df, clusters):
+    cluster_of = clusters.assign(id=clusters['id'].astype(str)).set_index('id')['representative_id']
+    ids = df['id'].astype(str)
+    # Posts missing from the clusters table form clusters of their own
+    return ids.map(cluster_of).fillna(ids)
+
+
+def select_representatives(df, clusters):
+    """
+    Keeps one post per cluster: the representative if it is in df, otherwise the first member.
+    """
+    cluster = _cluster_of(df, clusters)
+    is_rep = cluster == df['id'].astype(str)
+    keep = (
+        pd.DataFrame({'cluster': cluster, 'is_rep': is_rep})
+        .sort_values('is_rep', ascending=False, kind='stable')
+        .drop_duplicates('cluster')
+        .index
+    )
+    return df[df.index.isin(keep)]
+
+
+def expand_to_duplicates(df_scored, df_all, clusters):
+    """
+    Copies the columns computed for the scored post of each cluster to every member.
+
+    Rows of df_all keep their own raw columns; columns present only in df_scored are
+    looked up through the member's cluster. A duplicate_of column holds the id of the
+    scored post for members that were not scored themselves.
+    """
+    label_columns = [c for c in df_scored.columns if c not in df_all.columns]
+    labels = df_scored[['id'] + label_columns].copy()
+    labels['_cluster'] = _cluster_of(labels, clusters)
+    labels['id'] = labels['id'].astype(str)
+    labels = labels.drop_duplicates('_cluster').rename(columns={'id': 'duplicate_of'})
+
+    df = df_all.copy()
+    df['_cluster'] = _cluster_of(df, clusters)
+    df['id'] = df['id'].astype(str)
+    df = pd.merge(df, labels, on='_cluster', how='left')
+    df['duplicate_of'] = df['duplicate_of'].where(df['duplicate_of'] != df['id'])
+    columns = [c for c in df.columns if c not in ('_cluster', 'duplicate_of')] + ['duplicate_of']
+    return df[columns]
+
+
+def _string_ids(chunks):
+    for df in chunks:
+        yield df.assign(id=df['id'].astype(str))
+
+
+def _with_cluster(chunks):
+    # Chunks joined with the clusters table; posts missing from it form clusters of their own
+    for df in chunks:
+        representative = df['representative_id'].astype(object)
+        yield df.assign(_cluster=representative.where(representative.notna(), df['id'])).drop(
+            columns='representative_id')
+
+
+def expand_to_duplicates_chunked(scored_chunks, all_path, clusters_path, partitions, chunk_size,
+                                 spill_dir=SPILL_DIR):
+    """
+    Out-of-core expand_to_duplicates over a stream of scored chunks and the all-posts table at all_path.
+
+    Posts are matched to their cluster with a hash-partitioned join on id, and members to the
+    labels of their cluster with a second one on the cluster, so only about one partition of
+    each table is in memory at a time. Yields the expanded rows one partition at a time.
+    Each cluster should have a single scored post, as after remove_near_duplicates.
+    """
+    all_columns = set(table_columns(all_path))
+
+    def clusters():
+        return _string_ids(iter_table(clusters_path, columns=['id', 'representative_id'], chunk_size=chunk_size))
+
+    def labels():
+        scored = partitioned_join(_string_ids(scored_chunks), clusters(), 'id', partitions, right_unique=True,
+                                  spill_dir=spill_dir)
+        for df in _with_cluster(scored):
+            label_columns = [c for c in df.columns if c not in all_columns and c != '_cluster']
+            yield df[['id'] + label_columns + ['_cluster']].rename(columns={'id': 'duplicate_of'})
+
+    members = _with_cluster(partitioned_join(_string_ids(iter_table(all_path, chunk_size=chunk_size)), clusters(),
+                                             'id', partitions, right_unique=True, spill_dir=spill_dir))
+    for df in partitioned_join(members, labels(), '_cluster', partitions, right_unique=True, spill_dir=spill_dir):
+        df['duplicate_of'] = df['duplicate_of'].where(df['duplicate_of'] != df['id'])
+        columns = [c for c in df.columns if c not in ('_cluster', 'duplicate_of')] + ['duplicate_of']
+        yield df[columns]
+
+
+def deduplicate_posts(
+    input_path,
+    output_path,
+    clusters_path=DUPLICATE_CLUSTERS_PATH,
+    index_path=LSH_INDEX_PATH,
+    threshold=DEFAULT_THRESHOLD,
+    num_perm=DEFAULT_NUM_PERM
+):
+    """
+    Groups near-duplicate posts with MinHash LSH over text_cleaned shingles and writes
+    one representative per cluster to output_path and the full id -> cluster table to clusters_path.
+    """
+    df = read_table(input_path)
+    index = DuplicateIndex.load_or_create(index_path, threshold=threshold, num_perm=num_perm)
+    added = index.add(df['id'], df['text_cleaned'])
+    index.save(index_path)
+
+    clusters = index.clusters(df['id'])
+    write_table(clusters, clusters_path)
+    df_reps = select_representatives(df, clusters)
+    write_table(df_reps, output_path)
+    return {'rows': len(df), 'indexed': added, 'representatives': len(df_reps)}
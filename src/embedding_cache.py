@@ -0,0 +1,269 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+
+import numpy as np
+
+# --- Configuration ---
+CACHE_DIR = 'data/cache/embeddings'
+EMBEDDING_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+COPY_BLOCK_ROWS = 100000
+SEGMENT_PATTERN = re.compile(r'vectors-(\d+)\.npy$')
+
+
+def text_key(text, model_name):
+    """
+    Content address of a text under a given model.
+    """
+    return hashlib.sha1(f"{model_name}\0{text}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    On-disk, memory-mapped store of per-text vectors for one model.
+
+    Vectors are appended as float32 .npy segments, one per batch of newly computed texts,
+    and never rewritten. An SQLite table maps each content hash to its segment, row and
+    last use, so lookups and appends cost the size of the batch, not of the store, and
+    repeated runs only compute vectors for new or changed texts.
+    """
+
+    def __init__(self, model_name, cache_dir=CACHE_DIR):
+        self.model_name = model_name
+        self.path = os.path.join(cache_dir, re.sub(r'[^\w.-]+', '_', model_name))
+        self.index_path = os.path.join(self.path, 'index.sqlite')
+        os.makedirs(self.path, exist_ok=True)
+        self._segments = {}
+
+        self.connection = sqlite3.connect(self.index_path, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS rows (key BLOB PRIMARY KEY, segment INTEGER, row INTEGER,
+                                             last_used REAL) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+        """)
+        self.connection.execute("INSERT OR IGNORE INTO meta VALUES ('model_name', ?)", [model_name])
+        self.connection.commit()
+        self._import_legacy()
+
+    def _import_legacy(self):
+        # Stores written before segments existed: one vectors.npy and an index.json of keys
+        legacy_index = os.path.join(self.path, 'index.json')
+        legacy_vectors = os.path.join(self.path, 'vectors.npy')
+        if not os.path.exists(legacy_index):
+            return
+        with open(legacy_index) as f:
+            index = json.load(f)
+        if index['keys'] and os.path.exists(legacy_vectors):
+            segment = self._next_segment()
+            os.replace(legacy_vectors, self._segment_path(segment))
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO rows VALUES (?, ?, ?, ?)",
+                ((bytes.fromhex(key), segment, row, last_used)
+                 for row, (key, last_used) in enumerate(zip(index['keys'], index['last_used']))))
+            self.connection.commit()
+        os.remove(legacy_index)
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def _segment_path(self, segment):
+        return os.path.join(self.path, f'vectors-{segment:05d}.npy')
+
+    def _segment_numbers(self):
+        return sorted(int(match.group(1)) for match in map(SEGMENT_PATTERN.match, os.listdir(self.path)) if match)
+
+    def _next_segment(self):
+        numbers = self._segment_numbers()
+        return numbers[-1] + 1 if numbers else 0
+
+    def _segment(self, segment):
+        if segment not in self._segments:
+            self._segments[segment] = np.load(self._segment_path(segment), mmap_mode='r')
+        return self._segments[segment]
+
+    def dim(self):
+        numbers = self._segment_numbers()
+        return self._segment(numbers[0]).shape[1] if numbers else 0
+
+    def _lookup(self, keys):
+        """
+        (positions, segments, rows) of the keys already stored, via a temporary table join.
+        """
+        self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS lookup (pos INTEGER PRIMARY KEY, key BLOB)")
+        self.connection.execute("DELETE FROM lookup")
+        self.connection.executemany("INSERT INTO lookup VALUES (?, ?)",
+                                    ((pos, bytes.fromhex(key)) for pos, key in enumerate(keys)))
+        found = self.connection.execute(
+            "SELECT l.pos, r.segment, r.row FROM lookup AS l JOIN rows AS r ON r.key = l.key").fetchall()
+        found = np.array(found, dtype=np.int64).reshape(-1, 3)
+        return found[:, 0], found[:, 1], found[:, 2]
+
+    def _append(self, new_vectors, new_keys, now):
+        # The segment is complete on disk before its rows are indexed, so a crash never
+        # leaves keys pointing at missing vectors
+        segment = self._next_segment()
+        tmp_path = self._segment_path(segment) + '.tmp.npy'
+        np.save(tmp_path, np.asarray(new_vectors, dtype=np.float32))
+        os.replace(tmp_path, self._segment_path(segment))
+        self.connection.executemany("INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?)",
+                                    ((bytes.fromhex(key), segment, row, now) for row, key in enumerate(new_keys)))
+
+    def get_or_compute(self, texts, encode_fn):
+        """
+        Returns a float32 matrix of vectors for texts, one row per text.
+
+        encode_fn is called once with the list of texts that are not yet cached
+        and must return one vector per text.
+        """
+        texts = [str(text) for text in texts]
+        if not texts:
+            return np.empty((0, self.dim()), dtype=np.float32)
+        keys = [text_key(text, self.model_name) for text in texts]
+
+        positions, _, _ = self._lookup(keys)
+        cached = np.zeros(len(keys), dtype=bool)
+        cached[positions] = True
+        missing = {}
+        for key, text, is_cached in zip(keys, texts, cached):
+            if not is_cached and key not in missing:
+                missing[key] = text
+        print(f"Embedding cache '{self.model_name}': {len(texts) - len(missing)} cached, {len(missing)} to compute")
+
+        now = time.time()
+        if missing:
+            new_vectors = np.asarray(encode_fn(list(missing.values())), dtype=np.float32)
+            self._append(new_vectors, list(missing), now)
+        self.connection.execute("UPDATE rows SET last_used = ? WHERE key IN (SELECT key FROM lookup)", [now])
+        self.connection.commit()
+
+        positions, segments, rows = self._lookup(keys)
+        vectors = np.empty((len(keys), self.dim()), dtype=np.float32)
+        for segment in np.unique(segments):
+            in_segment = segments == segment
+            order = np.argsort(rows[in_segment], kind='stable')
+            # Sorted row reads from the memory map, scattered back to the input order
+            vectors[positions[in_segment][order]] = self._segment(segment)[rows[in_segment][order]]
+        return vectors
+
+    def stats(self):
+        """
+        Returns size accounting for the store.
+        """
+        size_bytes = sum(os.path.getsize(os.path.join(self.path, name)) for name in os.listdir(self.path))
+        return {
+            'model_name': self.model_name,
+            'rows': len(self),
+            'segments': len(self._segment_numbers()),
+            'dim': self.dim(),
+            'size_bytes': size_bytes,
+        }
+
+    def compact(self, keep_texts=None, max_rows=None, max_age_days=None):
+        """
+        Evicts rows and rewrites the store without them, merged into a single segment.
+
+        Rows are kept only if their text is in keep_texts (when given) and they were
+        used within max_age_days (when given); max_rows then keeps the most recently used.
+        Returns the number of rows evicted.
+        """
+        total = len(self)
+        if not total:
+            return 0
+        conditions, params = [], []
+        if keep_texts is not None:
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (key BLOB PRIMARY KEY)")
+            self.connection.execute("DELETE FROM wanted")
+            self.connection.executemany("INSERT OR IGNORE INTO wanted VALUES (?)",
+                                        ((bytes.fromhex(text_key(str(text), self.model_name)),) for text in keep_texts))
+            conditions.append("key IN (SELECT key FROM wanted)")
+        if max_age_days is not None:
+            conditions.append("last_used >= ?")
+            params.append(time.time() - max_age_days * 86400)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        limit = f"LIMIT {int(max_rows)}" if max_rows is not None else ""
+        kept = self.connection.execute(
+            f"SELECT key, segment, row, last_used FROM rows {where} ORDER BY last_used DESC {limit}", params).fetchall()
+        old_segments = self._segment_numbers()
+        if len(kept) == total and len(old_segments) <= 1:
+            return 0
+
+        # Copy the kept rows into one new segment in blocks, so compaction never loads the store
+        kept.sort(key=lambda r: (r[1], r[2]))
+        segment = old_segments[-1] + 1 if old_segments else 0
+        tmp_path = self._segment_path(segment) + '.tmp.npy'
+        vectors = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(len(kept), self.dim()))
+        for start in range(0, len(kept), COPY_BLOCK_ROWS):
+            block = np.array([(r[1], r[2]) for r in kept[start:start + COPY_BLOCK_ROWS]], dtype=np.int64)
+            for old in np.unique(block[:, 0]):
+                in_segment = np.flatnonzero(block[:, 0] == old)
+                vectors[start + in_segment] = self._segment(old)[block[in_segment, 1]]
+        vectors.flush()
+        del vectors
+        os.replace(tmp_path, self._segment_path(segment))
+
+        with self.connection:
+            self.connection.execute("DELETE FROM rows")
+            self.connection.executemany("INSERT INTO rows VALUES (?, ?, ?, ?)",
+                                        ((r[0], segment, i, r[3]) for i, r in enumerate(kept)))
+        self._segments = {}
+        for old in old_segments:
+            os.remove(self._segment_path(old))
+        self.connection.execute("VACUUM")
+        return total - len(kept)
+
+
+def list_stores(cache_dir=CACHE_DIR):
+    """
+    Returns an EmbeddingStore for every model that has a cache on disk.
+    """
+    if not os.path.isdir(cache_dir):
+        return []
+    stores = []
+    for name in sorted(os.listdir(cache_dir)):
+        index_path = os.path.join(cache_dir, name, 'index.sqlite')
+        legacy_path = os.path.join(cache_dir, name, 'index.json')
+        if os.path.exists(index_path):
+            connection = sqlite3.connect(index_path)
+            model_name = connection.execute("SELECT value FROM meta WHERE name = 'model_name'").fetchone()[0]
+            connection.close()
+            stores.append(EmbeddingStore(model_name, cache_dir=cache_dir))
+        elif os.path.exists(legacy_path):
+            with open(legacy_path) as f:
+                stores.append(EmbeddingStore(json.load(f)['model_name'], cache_dir=cache_dir))
+    return stores
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect or compact the on-disk embedding cache.")
+    parser.add_argument('command', choices=['stats', 'compact'])
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--model', help="Only this model's store (required with --corpus)")
+    parser.add_argument('--corpus', help="Parquet or CSV table of texts to keep; rows for any other text are evicted")
+    parser.add_argument('--column', default='text_cleaned',
+                        help="Column of --corpus holding the texts --model was keyed on (full_text for GoEmotions)")
+    parser.add_argument('--max-rows', type=int, help="Keep at most this many most recently used rows per model")
+    parser.add_argument('--max-age-days', type=float, help="Evict rows not used for this many days")
+    args = parser.parse_args()
+    # Each store is keyed on its own texts (cleaned text for embeddings, full text for emotions),
+    # so a corpus column can only say what to keep for one of them
+    if args.corpus and not args.model:
+        parser.error("--corpus requires --model; run `stats` to list the cached models")
+
+    keep_texts = None
+    if args.corpus:
+        from storage import read_table
+        keep_texts = read_table(args.corpus, columns=[args.column])[args.column].tolist()
+
+    for store in list_stores(args.cache_dir):
+        if args.model and store.model_name != args.model:
+            continue
+        if args.command == 'compact':
+            evicted = store.compact(keep_texts=keep_texts, max_rows=args.max_rows, max_age_days=args.max_age_days)
+            print(f"Evicted {evicted} rows from '{store.model_name}'")
+        stats = store.stats()
+        print(f"{stats['model_name']}: {stats['rows']} rows x {stats['dim']} dims in {stats['segments']} segments, "
+              f"{stats['size_bytes'] / 1e6:.1f} MB")
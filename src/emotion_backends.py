@@ -0,0 +1,126 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+from transformers import AutoModelForSequenceClassification
+
+# --- Configuration ---
+ONNX_MODEL_DIR = 'data/cache/onnx'
+ONNX_OPSET = 14
+BACKENDS = ('pytorch', 'quantized', 'onnx', 'onnx_int8')
+DEFAULT_BACKEND = 'pytorch'
+MIN_LABEL_AGREEMENT = 0.98  # Share of top labels a faster backend must keep identical to FP32
+
+
+class OnnxEmotionModel:
+    """
+    ONNX Runtime session with the parts of the transformers model interface that
+    predict_emotion_probabilities uses: .config, .eval() and model(**inputs).logits.
+    """
+
+    def __init__(self, onnx_path, config, num_threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("The ONNX backends need onnxruntime: pip install -r requirements-onnx.txt")
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.config = config
+
+    def eval(self):
+        return self
+
+    def __call__(self, **inputs):
+        feed = {name: inputs[name].numpy().astype(np.int64) for name in self.input_names}
+        logits = self.session.run(['logits'], feed)[0]
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+
+def onnx_model_path(model_name, quantized=False, onnx_dir=ONNX_MODEL_DIR):
+    directory = os.path.join(onnx_dir, model_name.replace('/', '__'))
+    return os.path.join(directory, 'model.int8.onnx' if quantized else 'model.onnx')
+
+
+def export_onnx(model_name, tokenizer, onnx_dir=ONNX_MODEL_DIR):
+    """
+    Exports the classifier to ONNX with dynamic batch and sequence axes, once per model.
+    """
+    onnx_path = onnx_model_path(model_name, onnx_dir=onnx_dir)
+    if os.path.exists(onnx_path):
+        return onnx_path
+    print(f"Exporting {model_name} to {onnx_path}...")
+    os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+    sample = tokenizer(["An example post used to trace the model."], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['logits'] = {0: 'batch'}
+    tmp_path = onnx_path + '.tmp'
+    # torch.onnx.export traces the model under no_grad(); tensors made in inference_mode()
+    # can break the tracer
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(sample[name] for name in input_names), tmp_path,
+                          input_names=input_names, output_names=['logits'],
+                          dynamic_axes=dynamic_axes, opset_version=ONNX_OPSET)
+    os.replace(tmp_path, onnx_path)
+    return onnx_path
+
+
+def export_onnx_int8(model_name, tokenizer, onnx_dir=ONNX_MODEL_DIR):
+    """
+    Dynamic INT8 quantization of the exported ONNX model (weights of MatMul / Gemm layers).
+    """
+    int8_path = onnx_model_path(model_name, quantized=True, onnx_dir=onnx_dir)
+    if os.path.exists(int8_path):
+        return int8_path
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError:
+        raise ImportError("The onnx_int8 backend needs onnx and onnxruntime: pip install -r requirements-onnx.txt")
+    fp32_path = export_onnx(model_name, tokenizer, onnx_dir)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+def load_emotion_model(model_name, tokenizer, backend=DEFAULT_BACKEND, num_threads=None, onnx_dir=ONNX_MODEL_DIR):
+    """
+    Loads the emotion classifier for one of BACKENDS:
+
+    - pytorch: the FP32 transformers model
+    - quantized: PyTorch dynamic INT8 quantization of its Linear layers
+    - onnx / onnx_int8: an exported (and optionally INT8-quantized) ONNX model run by ONNX Runtime
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown emotion backend '{backend}'. Choose one of: {', '.join(BACKENDS)}")
+
+    if backend in ('pytorch', 'quantized'):
+        model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+        if backend == 'quantized':
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    if backend == 'onnx':
+        onnx_path = export_onnx(model_name, tokenizer, onnx_dir)
+    else:
+        onnx_path = export_onnx_int8(model_name, tokenizer, onnx_dir)
+    from transformers import AutoConfig
+    return OnnxEmotionModel(onnx_path, AutoConfig.from_pretrained(model_name), num_threads=num_threads)
+
+
+def cache_name(model_name, backend=DEFAULT_BACKEND):
+    """
+    Name the probabilities of a backend are cached under; FP32 keeps the plain model name.
+    """
+    return model_name if backend == 'pytorch' else f"{model_name}#{backend}"
+
+
+def label_agreement(labels, reference):
+    """
+    Share of rows whose label equals the reference label.
+    """
+    labels, reference = np.asarray(labels, dtype=object), np.asarray(reference, dtype=object)
+    return float((labels == reference).mean()) if len(labels) else 1.0
@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+import torch
+
+from storage import read_table, write_table
+
+# --- Configuration ---
+GOEMOTIONS_MODEL = "monologg/bert-base-cased-goemotions-original"
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_LENGTH = 512
+DEFAULT_MAX_PADDING = 64  # Max tokens of padding allowed between the shortest and longest post in a batch
+DEFAULT_STRIDE = 128  # Tokens shared by consecutive windows of a long post
+POOLING_METHODS = ('max', 'mean')
+
+
+def make_length_buckets(lengths, batch_size=DEFAULT_BATCH_SIZE, max_padding=DEFAULT_MAX_PADDING):
+    """
+    Groups row indices into batches of similar token length.
+
+    Rows are sorted by length and a new batch is started whenever the batch is full
+    or adding the next row would pad the shortest row by more than max_padding tokens.
+    """
+    order = np.argsort(np.asarray(lengths), kind='stable')
+    batches = []
+    current = []
+    shortest = 0
+    for idx in order:
+        length = lengths[idx]
+        if current and (len(current) >= batch_size or length - shortest > max_padding):
+            batches.append(current)
+            current = []
+        if not current:
+            shortest = length
+        current.append(int(idx))
+    if current:
+        batches.append(current)
+    return batches
+
+
+def predict_emotion_probabilities(
+    texts,
+    tokenizer,
+    model,
+    batch_size=DEFAULT_BATCH_SIZE,
+    max_length=DEFAULT_MAX_LENGTH,
+    max_padding=DEFAULT_MAX_PADDING,
+    num_threads=None
+):
+    """
+    Scores texts with a multi-label emotion model in length-bucketed batches.
+
+    Returns a float32 array of shape (len(texts), num_labels) holding the sigmoid
+    probability of every label, in the same row order as texts.
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
+    texts = list(texts)
+    num_labels = model.config.num_labels
+    probabilities = np.zeros((len(texts), num_labels), dtype=np.float32)
+    if not texts:
+        return probabilities
+
+    # Tokenize once without padding so each post's true length is known
+    encodings = tokenizer(texts, truncation=True, max_length=max_length)
+    probabilities[:] = _score_encodings(encodings, tokenizer, model, num_labels, batch_size, max_padding)
+    return probabilities
+
+
+def _score_encodings(encodings, tokenizer, model, num_labels, batch_size, max_padding):
+    keys = [key for key in encodings.keys() if key != 'overflow_to_sample_mapping']
+    lengths = [len(ids) for ids in encodings['input_ids']]
+    batches = make_length_buckets(lengths, batch_size=batch_size, max_padding=max_padding)
+    probabilities = np.zeros((len(lengths), num_labels), dtype=np.float32)
+
+    model.eval()
+    with torch.inference_mode():
+        for batch in batches:
+            features = [{key: encodings[key][i] for key in keys} for i in batch]
+            inputs = tokenizer.pad(features, padding=True, return_tensors="pt")
+            logits = model(**inputs).logits
+            probabilities[batch] = torch.sigmoid(logits).float().numpy()
+    return probabilities
+
+
+def predict_emotion_probabilities_windowed(
+    texts,
+    tokenizer,
+    model,
+    pooling='max',
+    batch_size=DEFAULT_BATCH_SIZE,
+    max_length=DEFAULT_MAX_LENGTH,
+    stride=DEFAULT_STRIDE,
+    max_padding=DEFAULT_MAX_PADDING,
+    num_threads=None
+):
+    """
+    Scores texts of any length by splitting long posts into overlapping windows.
+
+    Each post becomes windows of at most max_length tokens overlapping by stride tokens.
+    Windows from all posts are length-bucketed together, so full-length windows fill
+    dense batches whatever the mix of post lengths. Window probabilities are combined per
+    post with pooling ('max' or 'mean'). Posts that fit in one window score exactly as in
+    predict_emotion_probabilities.
+    """
+    if pooling not in POOLING_METHODS:
+        raise ValueError(f"pooling must be one of {POOLING_METHODS}, got '{pooling}'")
+    if not getattr(tokenizer, 'is_fast', False):
+        raise ValueError("Windowed inference needs a fast tokenizer (overflow_to_sample_mapping)")
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
+    texts = list(texts)
+    num_labels = model.config.num_labels
+    probabilities = np.zeros((len(texts), num_labels), dtype=np.float32)
+    if not texts:
+        return probabilities
+
+    encodings = tokenizer(texts, truncation=True, max_length=max_length, stride=stride,
+                          return_overflowing_tokens=True)
+    post_of_window = np.asarray(encodings['overflow_to_sample_mapping'])
+    window_probabilities = _score_encodings(encodings, tokenizer, model, num_labels, batch_size, max_padding)
+
+    if pooling == 'max':
+        np.maximum.at(probabilities, post_of_window, window_probabilities)
+    else:
+        np.add.at(probabilities, post_of_window, window_probabilities)
+        probabilities /= np.bincount(post_of_window, minlength=len(texts))[:, None]
+    return probabilities
+
+
+def top_emotion_labels(probabilities, id2label):
+    """
+    Maps each row of a probability matrix to its most likely emotion label.
+    """
+    return [id2label[idx] for idx in probabilities.argmax(axis=1)]
+
+
+def probability_table(ids, labels, probabilities):
+    """
+    The probability matrix as a DataFrame with an id column and one float32 column per label.
+    """
+    df = pd.DataFrame(np.asarray(probabilities, dtype=np.float32), columns=list(labels))
+    df.insert(0, 'id', np.asarray(ids, dtype=str))
+    return df
+
+
+def save_emotion_probabilities(output_path, ids, labels, probabilities):
+    """
+    Saves the emotion probability matrix with its post ids and label names,
+    as .npz or, for .parquet paths, as a probability_table.
+    """
+    if output_path.endswith('.parquet'):
+        write_table(probability_table(ids, labels, probabilities), output_path)
+        return
+    np.savez(
+        output_path,
+        ids=np.asarray(ids, dtype=str),
+        labels=np.asarray(labels, dtype=str),
+        probabilities=np.asarray(probabilities, dtype=np.float32)
+    )
+
+
+def load_emotion_probabilities(input_path):
+    """
+    Loads a probability matrix saved by save_emotion_probabilities (or written chunk by chunk as a probability_table).
+
+    Returns (ids, labels, probabilities).
+    """
+    if input_path.endswith('.parquet'):
+        df = read_table(input_path)
+        labels = [column for column in df.columns if column != 'id']
+        return df['id'].to_numpy(dtype=str), np.asarray(labels, dtype=str), df[labels].to_numpy(dtype=np.float32)
+    with np.load(input_path) as data:
+        return data['ids'], data['labels'], data['probabilities']
@@ -0,0 +1,164 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from storage import read_table, write_table
+
+# --- Configuration ---
+# Bit i of emotion_mask is set when the post expresses EMOTION_LABELS[i]. This is the label
+# order of the GoEmotions model (config.id2label), so masks can be decoded without loading it.
+EMOTION_LABELS = (
+    'admiration', 'amusement', 'anger', 'annoyance', 'approval', 'caring', 'confusion', 'curiosity',
+    'desire', 'disappointment', 'disapproval', 'disgust', 'embarrassment', 'excitement', 'fear',
+    'gratitude', 'grief', 'joy', 'love', 'nervousness', 'optimism', 'pride', 'realization', 'relief',
+    'remorse', 'sadness', 'surprise', 'neutral'
+)
+EMOTION_THRESHOLD = 0.3  # Sigmoid probability above which an emotion is counted, as in the GoEmotions model card
+EMOTIONS_PATH = 'data/processed/reddit_with_emotions.parquet'
+DASHBOARD_DATA_PATH = 'data/processed/reddit_dashboard_data.parquet'
+PROBABILITIES_PATH = 'data/processed/emotion_probabilities.npz'
+SEARCH_INDEX_PATH = 'data/processed/search_index.sqlite'
+
+_BITS = np.arange(len(EMOTION_LABELS), dtype=np.int64)
+
+
+def check_labels(labels):
+    """
+    Raises ValueError unless labels are the model labels in EMOTION_LABELS order.
+    """
+    labels = [str(label) for label in labels]
+    if labels != list(EMOTION_LABELS):
+        raise ValueError(f"Emotion labels {labels} do not match EMOTION_LABELS; update the bit order first.")
+
+
+def _mask_array(masks):
+    # Posts without emotion scores (null after a left merge) have the empty mask
+    return pd.Series(masks).fillna(0).to_numpy(dtype=np.int64)
+
+
+def emotion_masks(probabilities, threshold=EMOTION_THRESHOLD):
+    """
+    Packs every row of a (posts x 28) probability matrix into an int32 with one bit per
+    emotion at or above threshold. The top emotion is always set, so emotion_label is in the set.
+    """
+    probabilities = np.asarray(probabilities)
+    selected = probabilities >= threshold
+    if len(probabilities):
+        selected[np.arange(len(probabilities)), probabilities.argmax(axis=1)] = True
+    return (selected.astype(np.int64) << _BITS).sum(axis=1).astype(np.int32)
+
+
+def mask_of(emotions):
+    """
+    The bitmask of one emotion name or a list of them.
+    """
+    if isinstance(emotions, str):
+        emotions = [emotions]
+    mask = 0
+    for emotion in emotions:
+        if emotion not in EMOTION_LABELS:
+            raise ValueError(f"Unknown emotion '{emotion}'. Choose from: {', '.join(EMOTION_LABELS)}")
+        mask |= 1 << EMOTION_LABELS.index(emotion)
+    return mask
+
+
+def has_all(masks, emotions):
+    """
+    Boolean array: posts expressing every one of emotions (e.g. has_all(df['emotion_mask'], ['anger', 'fear'])).
+    """
+    mask = mask_of(emotions)
+    return (_mask_array(masks) & mask) == mask
+
+
+def has_any(masks, emotions):
+    """
+    Boolean array: posts expressing at least one of emotions.
+    """
+    return (_mask_array(masks) & mask_of(emotions)) != 0
+
+
+def emotion_indicators(masks):
+    """
+    Unpacks masks into a (posts x 28) 0/1 matrix.
+    """
+    return ((_mask_array(masks)[:, None] >> _BITS) & 1).astype(np.int32)
+
+
+def emotion_sets(masks):
+    """
+    The emotion names of every mask, in EMOTION_LABELS order.
+    """
+    indicators = emotion_indicators(masks).astype(bool)
+    return [[EMOTION_LABELS[i] for i in np.flatnonzero(row)] for row in indicators]
+
+
+def cooccurrence(masks, drop_empty=True):
+    """
+    Emotion x emotion matrix of post counts: cell (a, b) counts posts expressing both a and b,
+    and the diagonal counts posts expressing each emotion. With drop_empty, emotions no post
+    expresses are left out.
+    """
+    indicators = emotion_indicators(masks)
+    counts = pd.DataFrame(indicators.T @ indicators, index=list(EMOTION_LABELS), columns=list(EMOTION_LABELS))
+    if drop_empty:
+        present = np.diag(counts.to_numpy()) > 0
+        counts = counts.loc[present, present]
+    return counts
+
+
+def cooccurrence_by_topic(df, topic_column='Final_Topic_Label', drop_empty=True):
+    """
+    cooccurrence of the emotion_mask column for every topic, as a dict of DataFrames.
+    """
+    return {str(topic): cooccurrence(group['emotion_mask'], drop_empty)
+            for topic, group in df.groupby(df[topic_column].astype(str), sort=True)}
+
+
+def probabilities_file(probabilities_path=PROBABILITIES_PATH):
+    """
+    The saved probabilities: the .npz of a whole-table run or the .parquet of a chunked run,
+    whichever exists (the newer if both do).
+    """
+    candidates = [probabilities_path, os.path.splitext(probabilities_path)[0] + '.parquet']
+    existing = [path for path in candidates if os.path.exists(path)]
+    if not existing:
+        raise FileNotFoundError(f"No emotion probabilities at {' or '.join(candidates)}. Run emotion detection first.")
+    return max(existing, key=os.path.getmtime)
+
+
+def update_emotion_masks(probabilities_path=PROBABILITIES_PATH, table_paths=(EMOTIONS_PATH, DASHBOARD_DATA_PATH),
+                         threshold=EMOTION_THRESHOLD, search_index_path=SEARCH_INDEX_PATH):
+    """
+    Recomputes the emotion_mask column of the given tables from the saved probabilities, for
+    example at a new threshold, without loading the model. Near-duplicates that were not
+    scored themselves take the mask of the post they duplicate.
+
+    The search index filters on the masks, so it is rebuilt when the dashboard data changes.
+    """
+    from emotion_inference import load_emotion_probabilities
+    ids, labels, probabilities = load_emotion_probabilities(probabilities_file(probabilities_path))
+    check_labels(labels)
+    mask_by_id = pd.Series(emotion_masks(probabilities, threshold), index=pd.Index(ids, dtype=str))
+    for path in table_paths:
+        if not os.path.exists(path):
+            continue
+        df = read_table(path)
+        scored_ids = df['duplicate_of'].fillna(df['id']) if 'duplicate_of' in df.columns else df['id']
+        masks = scored_ids.astype(str).map(mask_by_id)
+        df['emotion_mask'] = masks.fillna(0).astype(np.int32)
+        write_table(df, path)
+        print(f"Updated emotion_mask of {masks.notna().sum()} of {len(df)} posts in {path}")
+        if os.path.abspath(path) == os.path.abspath(DASHBOARD_DATA_PATH) and search_index_path and os.path.exists(search_index_path):
+            from search_index import build_search_index
+            build_search_index(path, search_index_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Recompute emotion_mask columns from saved emotion probabilities.")
+    parser.add_argument('--threshold', type=float, default=EMOTION_THRESHOLD)
+    parser.add_argument('--probabilities', default=PROBABILITIES_PATH)
+    parser.add_argument('tables', nargs='*', default=[EMOTIONS_PATH, DASHBOARD_DATA_PATH])
+    args = parser.parse_args()
+    update_emotion_masks(args.probabilities, args.tables, args.threshold)
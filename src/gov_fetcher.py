@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# --- Configuration ---
+HTTP_CACHE_DIR = 'data/cache/http'
+GOV_UK_SEARCH_URL = "https://www.gov.uk/api/search.json"
+GOV_UK_PAGE_SIZE = 100
+MAX_PER_HOST = 4
+REQUEST_TIMEOUT = 30
+
+
+class FetchResult:
+    def __init__(self, url, status_code, content, from_cache):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.from_cache = from_cache
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class CachedFetcher:
+    """
+    Pooled HTTP client with an on-disk cache validated by ETag and Last-Modified.
+
+    Cached responses are revalidated with If-None-Match / If-Modified-Since, so an
+    unchanged document costs a 304 with no body. Requests to the same host are limited
+    to max_per_host at a time, whatever the number of worker threads.
+    """
+
+    def __init__(self, cache_dir=HTTP_CACHE_DIR, max_per_host=MAX_PER_HOST, timeout=REQUEST_TIMEOUT,
+                 user_agent="MScProject/0.1"):
+        self.cache_dir = cache_dir
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        os.makedirs(cache_dir, exist_ok=True)
+
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=['GET'])
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=max_per_host, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = user_agent
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._host_limits = {}
+        self._host_lock = threading.Lock()
+        self.stats = {'fetched': 0, 'not_modified': 0}
+
+    def _host_limit(self, url):
+        host = urlparse(url).netloc
+        with self._host_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_limits[host]
+
+    def _count(self, key):
+        with self._host_lock:
+            self.stats[key] += 1
+
+    def _cache_paths(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key + '.json'), os.path.join(self.cache_dir, key + '.body')
+
+    def get(self, url, params=None):
+        """
+        GETs url (with optional query params), returning a FetchResult. Raises
+        requests.exceptions.RequestException on network or HTTP errors.
+        """
+        if params:
+            url = f"{url}?{urlencode(params)}"
+        meta_path, body_path = self._cache_paths(url)
+
+        headers = {}
+        meta = None
+        if os.path.exists(meta_path) and os.path.exists(body_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        with self._host_limit(url):
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+
+        if response.status_code == 304 and meta is not None:
+            self._count('not_modified')
+            with open(body_path, 'rb') as f:
+                return FetchResult(url, 200, f.read(), from_cache=True)
+
+        response.raise_for_status()
+        self._count('fetched')
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            with open(body_path, 'wb') as f:
+                f.write(response.content)
+            with open(meta_path, 'w') as f:
+                json.dump({'url': url, 'etag': etag, 'last_modified': last_modified}, f)
+        return FetchResult(url, response.status_code, response.content, from_cache=False)
+
+    def get_many(self, requests_, workers=8):
+        """
+        Fetches (url, params) pairs concurrently. Returns results in input order, with
+        the exception raised for any request that failed in place of its result.
+        """
+        def fetch(request):
+            url, params = request
+            try:
+                return self.get(url, params)
+            except requests.exceptions.RequestException as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(fetch, requests_))
+
+
+def search_gov_uk(fetcher, keyword, page_size=GOV_UK_PAGE_SIZE, search_url=GOV_UK_SEARCH_URL, workers=8):
+    """
+    Returns every GOV.UK search result for keyword, fetching all pages.
+
+    The first page reports the total; the remaining pages are then fetched concurrently.
+    """
+    first = fetcher.get(search_url, {'q': keyword, 'count': page_size, 'start': 0}).json()
+    results = list(first.get('results', []))
+    total = first.get('total', len(results))
+
+    pages = [(search_url, {'q': keyword, 'count': page_size, 'start': start})
+             for start in range(page_size, total, page_size)]
+    for page in fetcher.get_many(pages, workers=workers):
+        if isinstance(page, Exception):
+            raise page
+        results.extend(page.json().get('results', []))
+    return results
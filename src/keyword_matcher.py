@@ -0,0 +1,107 @@
+from collections import deque
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == '_'
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton that finds every keyword contained in a text in one pass.
+
+    The automaton is built once; failure links are folded into a full transition table
+    so scanning costs one dict lookup per character regardless of the number of keywords.
+    By default keywords match as case-insensitive substrings, like `kw.lower() in text.lower()`.
+    """
+
+    def __init__(self, keywords, case_sensitive=False, word_boundary=False):
+        self.keywords = list(keywords)
+        self.case_sensitive = case_sensitive
+        self.word_boundary = word_boundary
+
+        patterns = [kw if case_sensitive else kw.lower() for kw in self.keywords]
+        self.lengths = [len(p) for p in patterns]
+
+        # Trie of all patterns
+        goto = [{}]
+        outputs = [[]]
+        for i, pattern in enumerate(patterns):
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                if ch not in goto[state]:
+                    goto.append({})
+                    outputs.append([])
+                    goto[state][ch] = len(goto) - 1
+                state = goto[state][ch]
+            outputs[state].append(i)
+
+        # Breadth-first pass computing failure links and folding them into the transitions
+        fail = [0] * len(goto)
+        delta = [dict(transitions) for transitions in goto]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            for ch, target in goto[state].items():
+                fail[target] = delta[fail[state]].get(ch, 0)
+                queue.append(target)
+            for ch, target in delta[fail[state]].items():
+                delta[state].setdefault(ch, target)
+
+        self._delta = delta
+        self._outputs = [tuple(out) for out in outputs]
+
+    def _scan(self, text):
+        if not self.case_sensitive:
+            text = text.lower()
+        delta = self._delta
+        outputs = self._outputs
+        state = 0
+        for end, ch in enumerate(text):
+            state = delta[state].get(ch, 0)
+            if outputs[state]:
+                yield text, end, outputs[state]
+
+    def _on_boundary(self, text, end, index):
+        start = end - self.lengths[index] + 1
+        if start > 0 and _is_word_char(text[start - 1]) and _is_word_char(text[start]):
+            return False
+        if end + 1 < len(text) and _is_word_char(text[end]) and _is_word_char(text[end + 1]):
+            return False
+        return True
+
+    def find_all(self, text):
+        """
+        Returns the keywords found in text, in the order they were given.
+        """
+        found = set()
+        for scanned, end, indices in self._scan(text):
+            for index in indices:
+                if index not in found and (not self.word_boundary or self._on_boundary(scanned, end, index)):
+                    found.add(index)
+        return [self.keywords[i] for i in sorted(found)]
+
+    def first_index(self, text):
+        """
+        Returns the position in the keyword list of the earliest-listed keyword found in text, or None.
+        """
+        first = None
+        for scanned, end, indices in self._scan(text):
+            for index in indices:
+                if (first is None or index < first) and (
+                        not self.word_boundary or self._on_boundary(scanned, end, index)):
+                    first = index
+        return first
+
+    def contains_any(self, text):
+        """
+        Returns True as soon as any keyword is found in text.
+        """
+        for scanned, end, indices in self._scan(text):
+            if not self.word_boundary:
+                return True
+            if any(self._on_boundary(scanned, end, index) for index in indices):
+                return True
+        return False
@@ -0,0 +1,164 @@
+import math
+import pickle
+from collections import Counter
+
+import numpy as np
+from fuzzywuzzy import fuzz
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+try:
+    import Levenshtein  # python-Levenshtein, which fuzzywuzzy also uses when installed
+except ImportError:
+    Levenshtein = None
+
+# --- Configuration ---
+DEFAULT_TOP_K = 50  # Candidates per block when approximate matching is asked for
+NGRAM_RANGE = (3, 3)
+
+
+class LegislationIndex:
+    """
+    Character n-gram TF-IDF index over legislation texts.
+
+    By default results are exactly those of the original partial_ratio loop: upper bounds on
+    every law's score, from the characters it shares with the query and (with python-Levenshtein)
+    their longest common subsequence, rule out most laws and fuzz.partial_ratio is computed only
+    for the rest. With top_k, a query is first
+    compared against every law with one sparse matrix product and partial_ratio is computed
+    only for the most similar laws, which is faster still but can miss a few matches.
+    """
+
+    def __init__(self, texts, ngram_range=NGRAM_RANGE):
+        self.texts = [str(text) for text in texts]
+        self.vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=ngram_range, lowercase=False)
+        self.matrix = self.vectorizer.fit_transform(self.texts) if self.texts else None
+        # How often each law contains each character, for the score bounds
+        codes = np.frombuffer(''.join(self.texts).encode('utf-32-le'), dtype='<u4')
+        self.lengths = np.array([len(text) for text in self.texts], dtype=np.int64)
+        self.alphabet, columns = np.unique(codes, return_inverse=True)
+        self.char_counts = np.zeros((len(self.texts), len(self.alphabet)), dtype=np.int32)
+        np.add.at(self.char_counts, (np.repeat(np.arange(len(self.texts)), self.lengths), columns), 1)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def ranked(self, query):
+        """
+        Returns the positions of all laws ordered from most to least similar to query.
+        """
+        if self.matrix is None:
+            return np.arange(0)
+        similarities = (self.matrix @ self.vectorizer.transform([query]).T).toarray().ravel()
+        return np.argsort(-similarities, kind='stable')
+
+    def candidates(self, query, top_k=DEFAULT_TOP_K):
+        """
+        Returns the positions of the top_k laws most similar to query, in index order.
+        """
+        if top_k is None or top_k >= len(self.texts):
+            return np.arange(len(self.texts))
+        return np.sort(self.ranked(query)[:top_k])
+
+    def max_scores(self, query):
+        """
+        Upper bounds of fuzz.partial_ratio(query, text) for every law, without aligning any strings.
+
+        partial_ratio is the best 2 * matches / (len(shorter) + len(window)) over windows of the
+        longer string at most len(shorter) long. Matched characters are at most the window length
+        and at most the characters the query shares with the law (the overlap of their character
+        counts), so with C shared characters the ratio is at most 2C / (len(shorter) + C).
+        """
+        common = np.zeros(len(self.texts), dtype=np.int64)
+        for char, count in Counter(query).items():
+            column = np.searchsorted(self.alphabet, ord(char))
+            if column < len(self.alphabet) and self.alphabet[column] == ord(char):
+                common += np.minimum(self.char_counts[:, column], count)
+        return _bounded_scores(common, np.minimum(self.lengths, len(query)))
+
+    def _may_reach(self, query, i, threshold):
+        """
+        Whether partial_ratio(query, law i) can reach threshold, bounding its matches by the
+        longest common subsequence of the two strings, which python-Levenshtein's ratio gives.
+        """
+        if Levenshtein is None:
+            return True
+        text = self.texts[i]
+        shorter = min(len(query), len(text))
+        if not shorter:
+            return True
+        common = min(round(Levenshtein.ratio(query, text) * (len(query) + len(text)) / 2), shorter)
+        return math.floor(200 * common / (shorter + common) + 0.5 + 1e-9) >= threshold
+
+    def match(self, query, threshold, top_k=None):
+        """
+        Returns (position, score) pairs for laws whose partial_ratio with query is at
+        least threshold, in index order.
+
+        Unless top_k is given, every law whose score bounds reach threshold is scored.
+        With top_k, laws are scored in blocks of top_k from most to least similar, stopping at
+        the first block without a match, so broad queries are not cut off at top_k results.
+        Matches in later blocks are missed.
+        """
+        if not top_k:
+            candidates = np.flatnonzero(self.max_scores(query) >= threshold)
+            scores = ((int(i), fuzz.partial_ratio(query, self.texts[i]))
+                      for i in candidates if self._may_reach(query, i, threshold))
+            return [(i, score) for i, score in scores if score >= threshold]
+        order = self.ranked(query)
+        matches = []
+        for start in range(0, len(order), top_k):
+            found = False
+            for i in order[start:start + top_k]:
+                score = fuzz.partial_ratio(query, self.texts[i])
+                if score >= threshold:
+                    matches.append((int(i), score))
+                    found = True
+            if not found:
+                break
+        return sorted(matches)
+
+    def best_match(self, query, top_k=None):
+        """
+        Returns (position, score) of the law with the highest partial_ratio, preferring the
+        earliest law on ties, or (None, 0) if the index is empty. Laws are scored from the
+        highest max_scores bound down, stopping once no remaining law can reach the best score.
+        With top_k, only the top_k most similar laws by TF-IDF are scored.
+        """
+        best_position, best_score = None, 0
+        if top_k:
+            for i in self.candidates(query, top_k):
+                score = fuzz.partial_ratio(query, self.texts[i])
+                if score > best_score:
+                    best_position, best_score = int(i), score
+            return best_position, best_score
+        bounds = self.max_scores(query)
+        for i in np.argsort(-bounds, kind='stable'):
+            if bounds[i] < max(best_score, 1):
+                break
+            if not self._may_reach(query, i, max(best_score, 1)):
+                continue
+            score = fuzz.partial_ratio(query, self.texts[i])
+            if score > best_score or (score == best_score and score > 0 and i < best_position):
+                best_position, best_score = int(i), score
+        return best_position, best_score
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+def _bounded_scores(common, shorter):
+    """
+    The highest partial_ratio possible with at most common matched characters, where shorter is
+    the length of the shorter string. Empty strings score 0, or 100 against each other, so they
+    are never ruled out.
+    """
+    common = np.minimum(common, shorter)
+    bounds = np.where(shorter > 0, 2 * common / np.maximum(shorter + common, 1), 1.0)
+    # partial_ratio rounds; the small slack keeps float error from ruling out a tie
+    return np.floor(100 * bounds + 0.5 + 1e-9).astype(np.int64)
@@ -0,0 +1,157 @@
+import itertools
+import math
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from storage import CATEGORICAL_COLUMNS, arrow_schema, read_table, to_arrow
+
+# --- Configuration ---
+SPILL_DIR = 'data/cache/spill'
+SPILL_COMPRESSION = 'lz4'  # Spilled partitions are read back once, so favour speed over size
+MAX_FANOUT = 256  # Partition files open at once; well under the usual limit of 1024 file descriptors
+SPILL_BUFFER_CHUNKS = 4  # Input chunks buffered across all partitions before they are written
+
+
+def partition_count(rows, chunk_size):
+    """
+    Partitions needed for each to hold about chunk_size rows.
+    """
+    return max(1, math.ceil(rows / chunk_size))
+
+
+def partition_of(keys, partitions, level=0):
+    """
+    Partition number of every key. Keys are hashed as strings, so '123' and 123 land together.
+    Each level of recursive partitioning uses its own hash key, so sub-partitions split evenly.
+    """
+    hash_key = f"spill-level{level:05d}"
+    hashes = pd.util.hash_pandas_object(pd.Series(keys).astype(str), index=False, hash_key=hash_key).to_numpy()
+    return (hashes % partitions).astype(np.int64)
+
+
+def _partition_paths(directory, partitions):
+    return [os.path.join(directory, f"part-{i:05d}.parquet") for i in range(partitions)]
+
+
+def _spill(tables, key, partitions, directory, level, buffer_rows):
+    """
+    Writes a stream of Arrow tables to `partitions` files by the hash of key. Slices are
+    buffered per partition and flushed together once buffer_rows rows are held, so each
+    file gets few, large row groups however many chunks there are.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = _partition_paths(directory, partitions)
+    writers, buffers, buffered = {}, {}, 0
+
+    def flush():
+        for i, slices in buffers.items():
+            if i not in writers:
+                writers[i] = pq.ParquetWriter(paths[i], slices[0].schema, compression=SPILL_COMPRESSION,
+                                              use_dictionary=False)
+            writers[i].write_table(pa.concat_tables(slices))
+        buffers.clear()
+
+    try:
+        for table in tables:
+            parts = partition_of(table.column(key).to_pandas(), partitions, level)
+            # Cut the table into one contiguous slice per partition
+            table = table.take(np.argsort(parts, kind='stable'))
+            counts = np.bincount(parts, minlength=partitions)
+            for i, start in zip(np.flatnonzero(counts), np.cumsum(counts)[counts > 0] - counts[counts > 0]):
+                buffers.setdefault(i, []).append(table.slice(start, counts[i]))
+            buffered += table.num_rows
+            if buffered >= buffer_rows:
+                flush()
+                buffered = 0
+        flush()
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return paths
+
+
+def _read_batches(path, batch_size):
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield pa.Table.from_batches([batch])
+
+
+def _partition_tables(tables, key, partitions, directory, level, buffer_rows):
+    fanout = min(partitions, MAX_FANOUT)
+    paths = _spill(tables, key, fanout, directory, level, buffer_rows)
+    if fanout == partitions:
+        return paths
+    # Too many partitions to keep a file open for each: split every file again, one at a time
+    sub_partitions = math.ceil(partitions / fanout)
+    leaves = []
+    for path in paths:
+        sub_directory = os.path.splitext(path)[0]
+        batches = _read_batches(path, buffer_rows) if os.path.exists(path) else iter(())
+        leaves += _partition_tables(batches, key, sub_partitions, sub_directory, level + 1, buffer_rows)
+        if os.path.exists(path):
+            os.remove(path)
+    return leaves
+
+
+def hash_partition(chunks, key, partitions, directory, buffer_rows=None):
+    """
+    Spills a stream of DataFrame chunks to about `partitions` Parquet files by the hash of key.
+
+    Returns (paths, schema). All rows with the same key end up in the same file, and the
+    paths only depend on partitions, so both sides of a join line up. Partitions that received
+    no rows have no file, and read_partition returns them empty with the schema. At most
+    MAX_FANOUT files are open at once; more partitions are made by splitting each file again.
+    Rows are written once buffer_rows (by default SPILL_BUFFER_CHUNKS input chunks) are buffered.
+    """
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return _partition_tables(iter(()), key, partitions, directory, 0, 1), None
+    # Every partition file is written with the schema of the first chunk
+    schema = arrow_schema(first)
+    buffer_rows = buffer_rows or max(SPILL_BUFFER_CHUNKS * len(first), 1)
+    tables = (to_arrow(chunk, schema) for chunk in itertools.chain([first], chunks))
+    return _partition_tables(tables, key, partitions, directory, 0, buffer_rows), schema
+
+
+def read_partition(path, schema):
+    """
+    Reads a partition written by hash_partition, or an empty DataFrame with its schema if it has no rows.
+    """
+    if os.path.exists(path):
+        return read_table(path)
+    df = schema.empty_table().to_pandas()
+    return df.astype({column: 'category' for column in CATEGORICAL_COLUMNS if column in df.columns})
+
+
+def partitioned_join(left_chunks, right_chunks, on, partitions, how='left', right_unique=False, spill_dir=SPILL_DIR):
+    """
+    Grace hash join of two streams of DataFrame chunks, yielding one merged DataFrame per partition.
+
+    Both sides are first spilled to disk in `partitions` files by the hash of `on`; each pair
+    of files is then merged in memory with pd.merge. Rows with equal keys always share a
+    partition, so together the results equal pd.merge of the whole tables, apart from row
+    order. Peak memory is about one partition of each side rather than the whole tables.
+    With right_unique, only the first right row per key is joined.
+    """
+    os.makedirs(spill_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=spill_dir) as directory:
+        left_paths, left_schema = hash_partition(left_chunks, on, partitions, os.path.join(directory, 'left'))
+        right_paths, right_schema = hash_partition(right_chunks, on, partitions, os.path.join(directory, 'right'))
+        if left_schema is None:
+            return
+        for left_path, right_path in zip(left_paths, right_paths):
+            if how == 'left' and not os.path.exists(left_path):
+                continue
+            left = read_partition(left_path, left_schema)
+            if right_schema is None:
+                yield left
+                continue
+            right = read_partition(right_path, right_schema)
+            if right_unique:
+                right = right.drop_duplicates(on)
+            yield pd.merge(left, right, on=on, how=how)
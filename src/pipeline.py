@@ -0,0 +1,357 @@
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import profiling
+
+# --- Configuration ---
+PIPELINE_STATE_PATH = 'data/cache/pipeline_state.json'
+DEFAULT_WORKERS = 2
+HASH_BLOCK_SIZE = 1 << 20
+
+
+class Node:
+    """
+    One pipeline stage: a function in a src module with declared input and output paths.
+
+    The function is imported only when the node runs, so nodes that are skipped never
+    load their (often heavy) dependencies. params are passed as keyword arguments and
+    are part of the node's cache key together with the content of its inputs.
+
+    Paths in optional may be missing: the stage runs without that input, or only writes
+    that output when it has the data for it. With skip_if_missing, a missing required input
+    skips the node instead of failing it, for stages whose source data may not be collected.
+    """
+
+    def __init__(self, name, module, function, inputs=(), outputs=(), params=None, optional=(),
+                 skip_if_missing=False):
+        self.name = name
+        self.module = module
+        self.function = function
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+        self.optional = set(optional)
+        self.skip_if_missing = skip_if_missing
+
+    def required(self, paths):
+        return [path for path in paths if path not in self.optional]
+
+    def run(self):
+        func = getattr(importlib.import_module(self.module), self.function)
+        return func(**self.params)
+
+
+RAW_POSTS = 'data/raw/reddit_scraped_posts.csv'
+RAW_LEGISLATION = 'data/raw/uk_legislation.csv'
+CLEANED = 'data/processed/reddit_cleaned.parquet'
+DEDUPLICATED = 'data/processed/reddit_deduplicated.parquet'
+CLUSTERS = 'data/processed/duplicate_clusters.parquet'
+TOPICS = 'data/processed/reddit_with_topics.parquet'
+EMOTIONS = 'data/processed/reddit_with_emotions.parquet'
+EMOTION_PROBABILITIES = 'data/processed/emotion_probabilities.npz'
+FINAL_TOPICS = 'data/processed/reddit_with_final_topics.parquet'
+LEGISLATION_MAPPING = 'data/processed/topic_legislation_mapping.csv'
+DASHBOARD = 'data/processed/reddit_dashboard_data.parquet'
+DASHBOARD_LAWS = 'data/processed/laws_dashboard_data.csv'
+DASHBOARD_CUBES = 'data/processed/dashboard_cubes.pkl'
+POST_STORE = 'data/processed/post_bodies.jsonl'
+SEARCH_INDEX = 'data/processed/search_index.sqlite'
+TREND_COUNTS = 'data/processed/trends/counts.parquet'
+LEGISLATION_SPIKES = 'data/processed/legislation_spikes.csv'
+LABEL_RULES = 'config/topic_label_rules.yaml'
+
+
+def default_nodes(chunk_size=None):
+    """
+    The processing pipeline from raw posts to report figures, in dependency order.
+
+    With chunk_size, labeling, emotion scoring and the dashboard merge run out of core
+    over chunks of that many posts (cleaning always streams its input).
+    """
+    chunked = {'chunk_size': chunk_size} if chunk_size else {}
+    # Chunked emotion scoring appends its probabilities to a Parquet table instead of one .npz
+    probabilities = os.path.splitext(EMOTION_PROBABILITIES)[0] + '.parquet' if chunk_size else EMOTION_PROBABILITIES
+    return [
+        Node('clean_text', '2_process_data', 'clean_text_data',
+             inputs=[RAW_POSTS], outputs=[CLEANED],
+             params={'input_path': RAW_POSTS, 'output_path': CLEANED}),
+        Node('deduplicate', '2_process_data', 'remove_near_duplicates',
+             inputs=[CLEANED], outputs=[DEDUPLICATED, CLUSTERS],
+             params={'input_path': CLEANED, 'output_path': DEDUPLICATED, 'clusters_path': CLUSTERS}),
+        Node('topic_modeling', '3_train_models', 'run_topic_modeling',
+             inputs=[DEDUPLICATED], outputs=[TOPICS],
+             params={'input_path': DEDUPLICATED, 'output_path': TOPICS}),
+        Node('emotion_detection', '3_train_models', 'run_emotion_detection',
+             inputs=[DEDUPLICATED], outputs=[EMOTIONS, probabilities],
+             params={'input_path': DEDUPLICATED, 'output_path': EMOTIONS,
+                     'probabilities_path': probabilities, **chunked}),
+        Node('topic_labels', '2_process_data', 'apply_topic_labels',
+             inputs=[TOPICS, LABEL_RULES], outputs=[FINAL_TOPICS],
+             params={'input_path': TOPICS, 'output_path': FINAL_TOPICS, 'rules_path': LABEL_RULES, **chunked}),
+        # Legislation is scraped separately; without it the mapping and everything drawn from it is left out
+        Node('legislation_mapping', '3_train_models', 'link_legislation_to_topics',
+             inputs=[FINAL_TOPICS, RAW_LEGISLATION], outputs=[LEGISLATION_MAPPING],
+             params={'topics_path': FINAL_TOPICS, 'legislation_path': RAW_LEGISLATION,
+                     'output_path': LEGISLATION_MAPPING},
+             skip_if_missing=True),
+        Node('dashboard_data', '2_process_data', 'create_dashboard_data',
+             inputs=[FINAL_TOPICS, EMOTIONS, LEGISLATION_MAPPING, CLEANED, CLUSTERS],
+             outputs=[DASHBOARD, DASHBOARD_LAWS, SEARCH_INDEX],
+             params={'topics_path': FINAL_TOPICS, 'emotions_path': EMOTIONS,
+                     'legislation_path': LEGISLATION_MAPPING, 'output_reddit_path': DASHBOARD,
+                     'output_laws_path': DASHBOARD_LAWS, 'cleaned_path': CLEANED, 'clusters_path': CLUSTERS,
+                     'search_index_path': SEARCH_INDEX, **chunked},
+             optional=[LEGISLATION_MAPPING, DASHBOARD_LAWS]),
+        Node('dashboard_cubes', 'dashboard_cubes', 'build_dashboard_cubes',
+             inputs=[DASHBOARD], outputs=[DASHBOARD_CUBES],
+             params={'input_path': DASHBOARD, 'output_path': DASHBOARD_CUBES}),
+        Node('post_store', 'post_store', 'build_post_store',
+             inputs=[DASHBOARD], outputs=[POST_STORE, 'data/processed/post_bodies.idx.npz'],
+             params={'input_path': DASHBOARD, 'store_path': POST_STORE}),
+        Node('trends', 'trends', 'update_trends',
+             inputs=[DASHBOARD, LEGISLATION_MAPPING], outputs=[TREND_COUNTS, LEGISLATION_SPIKES],
+             params={'input_path': DASHBOARD, 'trend_dir': os.path.dirname(TREND_COUNTS),
+                     'legislation_path': LEGISLATION_MAPPING, 'spikes_path': LEGISLATION_SPIKES},
+             optional=[LEGISLATION_MAPPING, LEGISLATION_SPIKES]),
+        Node('trend_report', '5_analyze_results', 'generate_trend_report',
+             inputs=[TREND_COUNTS, LEGISLATION_SPIKES],
+             outputs=['reports/figures/topic_trends.png', 'reports/table_legislation_spikes.csv'],
+             params={'trend_dir': os.path.dirname(TREND_COUNTS), 'spikes_path': LEGISLATION_SPIKES},
+             optional=[LEGISLATION_SPIKES, 'reports/table_legislation_spikes.csv']),
+        Node('visualizations', '5_analyze_results', 'generate_visualizations',
+             inputs=[DASHBOARD],
+             outputs=['reports/figures/topic_distribution.png', 'reports/figures/emotion_distribution.png',
+                      'reports/figures/topic_emotion_heatmap.png'],
+             params={'input_path': DASHBOARD, 'per_topic': True}),
+        Node('summary_tables', '5_analyze_results', 'generate_summary_tables',
+             inputs=[DASHBOARD],
+             outputs=['reports/table_topic_distribution.csv', 'reports/table_emotion_distribution.csv'],
+             params={'input_path': DASHBOARD}),
+    ]
+
+
+class Pipeline:
+    """
+    Runs a set of nodes as a DAG, memoizing each node on the hash of its inputs and params.
+
+    A node depends on the nodes that produce any of its inputs. Independent nodes (e.g.
+    topic modeling and emotion detection) run at the same time on a thread pool. A node is
+    skipped when its cache key matches the last successful run and all its outputs exist.
+    """
+
+    def __init__(self, nodes, state_path=PIPELINE_STATE_PATH):
+        self.nodes = {node.name: node for node in nodes}
+        self.state_path = state_path
+        self.state = {'nodes': {}, 'files': {}}
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                self.state = json.load(f)
+        self._lock = threading.Lock()
+
+        producers = {output: node.name for node in nodes for output in node.outputs}
+        self.dependencies = {
+            node.name: sorted({producers[path] for path in node.inputs if path in producers} - {node.name})
+            for node in nodes
+        }
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline has a cycle through node '{name}'")
+            visiting.add(name)
+            for dependency in self.dependencies[name]:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.nodes:
+            visit(name)
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def file_hash(self, path):
+        """
+        Content hash of a file, reused from the state while its size and mtime are unchanged.
+        """
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        with self._lock:
+            cached = self.state['files'].get(path)
+        if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached['sha1']
+
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        with self._lock:
+            self.state['files'][path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                         'sha1': digest.hexdigest()}
+        return digest.hexdigest()
+
+    def cache_key(self, node):
+        payload = {
+            'function': f"{node.module}.{node.function}",
+            'params': node.params,
+            'inputs': {path: self.file_hash(path) for path in node.inputs},
+        }
+        return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def is_fresh(self, node):
+        with self._lock:
+            recorded = self.state['nodes'].get(node.name, {}).get('key')
+        return recorded == self.cache_key(node) and all(os.path.exists(path) for path in node.required(node.outputs))
+
+    def _run_node(self, node, force):
+        if not force and self.is_fresh(node):
+            print(f"--- [{node.name}] up to date, skipping ---")
+            return 'skipped'
+
+        missing = [path for path in node.required(node.inputs) if not os.path.exists(path)]
+        if missing and node.skip_if_missing:
+            print(f"--- [{node.name}] input not found: {', '.join(missing)}. Skipping. ---")
+            return 'skipped'
+        if missing:
+            raise FileNotFoundError(f"Node '{node.name}' is missing inputs: {', '.join(missing)}")
+
+        print(f"--- [{node.name}] running {node.module}.{node.function} ---")
+        start = time.perf_counter()
+        node.run()
+        seconds = time.perf_counter() - start
+
+        # Stages report most failures by printing and returning, so check the outputs were written
+        missing = [path for path in node.required(node.outputs) if not os.path.exists(path)]
+        if missing:
+            raise RuntimeError(f"Node '{node.name}' did not write: {', '.join(missing)}")
+
+        key = self.cache_key(node)
+        for path in node.outputs:
+            self.file_hash(path)
+        with self._lock:
+            self.state['nodes'][node.name] = {'key': key, 'seconds': round(seconds, 2),
+                                              'finished': time.strftime('%Y-%m-%dT%H:%M:%S')}
+            self._save_state()
+        print(f"--- [{node.name}] finished in {seconds:.1f}s ---")
+        return 'ran'
+
+    def selected(self, targets=None):
+        """
+        Names of the target nodes and everything they depend on (all nodes if targets is None).
+        """
+        if not targets:
+            return set(self.nodes)
+        unknown = [name for name in targets if name not in self.nodes]
+        if unknown:
+            raise ValueError(f"Unknown nodes: {', '.join(unknown)}")
+        selected, stack = set(), list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in selected:
+                selected.add(name)
+                stack.extend(self.dependencies[name])
+        return selected
+
+    def run(self, targets=None, force=(), workers=DEFAULT_WORKERS, dry_run=False):
+        """
+        Runs the selected nodes in dependency order. Nodes named in force always rerun;
+        a node downstream of one that reran is skipped if the new outputs hash the same.
+
+        Returns a dict mapping node names to 'ran', 'skipped', 'planned' or 'failed'.
+        """
+        names = self.selected(targets)
+        force = set(force)
+        results = {}
+
+        if dry_run:
+            for name in self._topological_order(names):
+                node = self.nodes[name]
+                changed = name in force or any(results.get(d) == 'planned' for d in self.dependencies[name])
+                results[name] = 'planned' if changed or not self.is_fresh(node) else 'skipped'
+                print(f"{name}: {'run' if results[name] == 'planned' else 'up to date'}")
+            return results
+
+        pending = set(names)
+        running = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while pending or running:
+                for name in sorted(pending):
+                    dependencies = [d for d in self.dependencies[name] if d in names]
+                    if any(results.get(d) == 'failed' for d in dependencies):
+                        results[name] = 'failed'
+                        pending.discard(name)
+                        print(f"--- [{name}] not run: an upstream node failed ---")
+                    elif all(d in results for d in dependencies):
+                        running[executor.submit(self._run_node, self.nodes[name], name in force)] = name
+                        pending.discard(name)
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        print(f"Error in node '{name}': {e}")
+                        results[name] = 'failed'
+        return results
+
+    def _topological_order(self, names):
+        order, seen = [], set()
+
+        def visit(name):
+            if name in seen:
+                return
+            seen.add(name)
+            for dependency in self.dependencies[name]:
+                if dependency in names:
+                    visit(dependency)
+            order.append(name)
+
+        for name in self.nodes:
+            if name in names:
+                visit(name)
+        return order
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the processing pipeline, skipping stages whose inputs are unchanged.")
+    parser.add_argument('targets', nargs='*', help="Nodes to run together with their dependencies (default: all)")
+    parser.add_argument('--force', nargs='+', default=[], metavar='NODE', help="Rerun these nodes even if up to date")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Nodes run at the same time")
+    parser.add_argument('--dry-run', action='store_true', help="Only show which nodes would run")
+    parser.add_argument('--list', action='store_true', help="List nodes and their dependencies")
+    parser.add_argument('--cprofile', action='store_true', help="Dump a cProfile of every stage next to the run report")
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help="Label, score and merge out of core in chunks of this many posts")
+    args = parser.parse_args()
+
+    if args.cprofile:
+        profiling.enable(cprofile=True)
+
+    pipeline = Pipeline(default_nodes(args.chunk_size))
+    if args.list:
+        for name, node in pipeline.nodes.items():
+            print(f"{name}: {node.module}.{node.function} <- {', '.join(pipeline.dependencies[name]) or '-'}")
+    else:
+        results = pipeline.run(args.targets, force=args.force, workers=args.workers, dry_run=args.dry_run)
+        if not args.dry_run:
+            print("--- Pipeline summary: " + ", ".join(f"{name}={status}" for name, status in results.items()) + " ---")
+            if 'failed' in results.values():
+                raise SystemExit(1)
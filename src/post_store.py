@@ -0,0 +1,77 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# --- Configuration ---
+DASHBOARD_DATA_PATH = 'data/processed/reddit_dashboard_data.parquet'
+POST_STORE_PATH = 'data/processed/post_bodies.jsonl'
+BODY_COLUMNS = ['title', 'selftext', 'url']
+
+
+def _index_path(store_path):
+    return os.path.splitext(store_path)[0] + '.idx.npz'
+
+
+def build_post_store(input_path=DASHBOARD_DATA_PATH, store_path=POST_STORE_PATH, columns=BODY_COLUMNS):
+    """
+    Writes post bodies as JSON lines plus an index of sorted ids and byte offsets,
+    so single posts can be read back by seeking instead of loading the whole table.
+    """
+    print("--- Building post body store ---")
+    parquet = pq.ParquetFile(input_path)
+    columns = [c for c in columns if c in parquet.schema_arrow.names]
+    ids, offsets, lengths = [], [], []
+    offset = 0
+    with open(store_path, 'wb') as f:
+        for batch in parquet.iter_batches(columns=['id'] + columns):
+            for record in batch.to_pylist():
+                line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+                f.write(line)
+                ids.append(str(record['id']))
+                offsets.append(offset)
+                lengths.append(len(line))
+                offset += len(line)
+
+    ids = np.array(ids, dtype=str)
+    order = np.argsort(ids, kind='stable')
+    np.savez(_index_path(store_path), ids=ids[order],
+             offsets=np.array(offsets, dtype=np.int64)[order], lengths=np.array(lengths, dtype=np.int64)[order])
+    print(f"--- {len(ids)} post bodies saved to {store_path} ---")
+    return store_path
+
+
+class PostStore:
+    """
+    Read-only access to post bodies by id. Only the id index is held in memory.
+    """
+
+    def __init__(self, store_path=POST_STORE_PATH):
+        self.store_path = store_path
+        with np.load(_index_path(store_path)) as index:
+            self.ids = index['ids']
+            self.offsets = index['offsets']
+            self.lengths = index['lengths']
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get(self, ids):
+        """
+        Returns a DataFrame of the stored posts for ids, in the given order. Unknown ids are skipped.
+        """
+        ids = [str(post_id) for post_id in ids]
+        positions = np.searchsorted(self.ids, ids)
+        records = []
+        with open(self.store_path, 'rb') as f:
+            for post_id, position in zip(ids, positions):
+                if position < len(self.ids) and self.ids[position] == post_id:
+                    f.seek(self.offsets[position])
+                    records.append(json.loads(f.read(self.lengths[position])))
+        return pd.DataFrame(records)
+
+
+if __name__ == '__main__':
+    build_post_store()
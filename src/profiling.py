@@ -0,0 +1,315 @@
+import argparse
+import atexit
+import contextvars
+import cProfile
+import functools
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# --- Configuration ---
+RUN_REPORT_DIR = 'reports/runs'
+RSS_SAMPLE_SECONDS = 0.05
+REGRESSION_FACTOR = 1.5    # A stage this many times slower than in the previous run is flagged
+MIN_REGRESSION_SECONDS = 1.0
+
+# Set PIPELINE_CPROFILE=1 (or call enable(cprofile=True)) to dump a cProfile per stage
+# next to the run report. The .prof files open in snakeviz or pstats; for sampling
+# profiles of native code run the pipeline under `py-spy record -o profile.svg -- python src/pipeline.py`.
+_settings = {'cprofile': os.environ.get('PIPELINE_CPROFILE') == '1', 'report_dir': RUN_REPORT_DIR}
+_records = []
+_records_lock = threading.Lock()
+_run_started = time.strftime('%Y%m%d-%H%M%S')
+_current = contextvars.ContextVar('current_stage', default=None)
+
+
+def enable(report_dir=RUN_REPORT_DIR, cprofile=False):
+    _settings['report_dir'] = report_dir
+    _settings['cprofile'] = cprofile
+
+
+def resident_bytes():
+    """
+    Resident memory of this process, falling back to its peak where /proc is unavailable.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        pass
+    if resource is not None:
+        return _max_rss_bytes()
+    counters = _windows_memory_counters()
+    return counters.WorkingSetSize if counters else 0
+
+
+def peak_resident_bytes():
+    """
+    Peak resident memory of this process (VmHWM, ru_maxrss or the peak working set).
+    """
+    try:
+        # ru_maxrss survives exec on Linux (it would report the parent's peak), so read VmHWM first
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('VmHWM')) * 1024
+    except (OSError, StopIteration):
+        pass
+    if resource is not None:
+        return _max_rss_bytes()
+    counters = _windows_memory_counters()
+    return counters.PeakWorkingSetSize if counters else 0
+
+
+def _max_rss_bytes():
+    # ru_maxrss is the process peak (KB on Linux, bytes on macOS)
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def _windows_memory_counters():
+    """
+    PROCESS_MEMORY_COUNTERS from GetProcessMemoryInfo, or None where it is unavailable.
+    """
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in
+                ['PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                 'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage']]
+
+        kernel32, psapi = ctypes.WinDLL('kernel32'), ctypes.WinDLL('psapi')
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(Counters), wintypes.DWORD]
+        psapi.GetProcessMemoryInfo.restype = wintypes.BOOL
+        counters = Counters(cb=ctypes.sizeof(Counters))
+        if psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return counters
+    except (AttributeError, OSError):
+        pass
+    return None
+
+
+def _child_cpu_seconds():
+    # Worker processes' CPU time once they have exited; None where resource is unavailable (Windows)
+    if resource is None:
+        return None
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return children.ru_utime + children.ru_stime
+
+
+class _RssSampler(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak = resident_bytes()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(RSS_SAMPLE_SECONDS):
+            self.peak = max(self.peak, resident_bytes())
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.peak = max(self.peak, resident_bytes())
+        return self.peak
+
+
+def record_rows(rows_in=None, rows_out=None):
+    """
+    Records the rows a stage read and wrote. A no-op outside a profiled stage.
+    """
+    record = _current.get()
+    if record is not None:
+        if rows_in is not None:
+            record['rows_in'] = int(rows_in)
+        if rows_out is not None:
+            record['rows_out'] = int(rows_out)
+
+
+def _rows_of(result):
+    if hasattr(result, 'shape') and hasattr(result, 'columns'):
+        return len(result)
+    if isinstance(result, dict) and isinstance(result.get('rows'), int):
+        return result['rows']
+    return None
+
+
+def profile_stage(func=None, name=None):
+    """
+    Decorator recording wall time, CPU time, peak RSS, rows in and out and throughput
+    of a pipeline stage into the run report.
+
+    CPU time is for the whole process (including model threads), so it overlaps when
+    the pipeline runs stages concurrently; worker processes count once they finish
+    (child_cpu_seconds is None on Windows, which has no getrusage).
+    """
+    if func is None:
+        return functools.partial(profile_stage, name=name)
+    # Scripts run as __main__, so name stages after the file they are defined in
+    module_file = getattr(sys.modules.get(func.__module__), '__file__', None)
+    module = os.path.splitext(os.path.basename(module_file))[0] if module_file else func.__module__
+    stage_name = name or f"{module}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        parent = _current.get()
+        record = {'stage': stage_name, 'parent': parent['stage'] if parent else None,
+                  'started': time.strftime('%Y-%m-%dT%H:%M:%S'), 'rows_in': None, 'rows_out': None}
+        token = _current.set(record)
+        sampler = _RssSampler()
+        sampler.start()
+        profiler = cProfile.Profile() if _settings['cprofile'] else None
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        children_start = _child_cpu_seconds()
+        status = 'ok'
+        try:
+            if profiler:
+                profiler.enable()
+            result = func(*args, **kwargs)
+            if record['rows_out'] is None:
+                record['rows_out'] = _rows_of(result)
+            return result
+        except BaseException:
+            status = 'failed'
+            raise
+        finally:
+            if profiler:
+                profiler.disable()
+            children = _child_cpu_seconds()
+            record['wall_seconds'] = round(time.perf_counter() - wall_start, 4)
+            record['cpu_seconds'] = round(time.process_time() - cpu_start, 4)
+            record['child_cpu_seconds'] = round(children - children_start, 4) if children is not None else None
+            record['peak_rss_mb'] = round(sampler.stop() / 1e6, 1)
+            rows = record['rows_in'] if record['rows_in'] is not None else record['rows_out']
+            record['rows_per_second'] = round(rows / record['wall_seconds'], 2) if rows and record['wall_seconds'] else None
+            record['status'] = status
+            if profiler:
+                record['cprofile'] = _dump_profile(profiler, stage_name)
+            _current.reset(token)
+            with _records_lock:
+                _records.append(record)
+
+    return wrapper
+
+
+def recorded_stages():
+    """
+    The stage records collected in this process so far, oldest first.
+    """
+    with _records_lock:
+        return list(_records)
+
+
+def _dump_profile(profiler, stage_name):
+    directory = os.path.join(_settings['report_dir'], f"run_{_run_started}_profiles")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, stage_name.replace('/', '_') + '.prof')
+    profiler.dump_stats(path)
+    return path
+
+
+def _report_paths(report_dir):
+    return sorted(glob.glob(os.path.join(report_dir, 'run_*.json')))
+
+
+def compare_runs(current, previous, factor=REGRESSION_FACTOR, min_seconds=MIN_REGRESSION_SECONDS):
+    """
+    Stages of the current run that were more than `factor` times slower than in the previous
+    run (wall time per row when both runs report rows, otherwise wall time).
+    """
+    previous_stages = {s['stage']: s for s in previous['stages'] if s['status'] == 'ok'}
+    regressions = []
+    for stage in current['stages']:
+        before = previous_stages.get(stage['stage'])
+        if before is None or stage['status'] != 'ok' or stage['wall_seconds'] < min_seconds:
+            continue
+        if stage['rows_per_second'] and before['rows_per_second']:
+            ratio = before['rows_per_second'] / stage['rows_per_second']
+        else:
+            ratio = stage['wall_seconds'] / max(before['wall_seconds'], 1e-9)
+        if ratio >= factor:
+            regressions.append({'stage': stage['stage'], 'slowdown': round(ratio, 2),
+                                'wall_seconds': stage['wall_seconds'], 'previous_wall_seconds': before['wall_seconds']})
+    return regressions
+
+
+def write_run_report(report_dir=None):
+    """
+    Writes the stages recorded in this process to reports/runs/run_<timestamp>.json,
+    flagging regressions against the previous report. Returns the report path, or None
+    if no stage ran.
+    """
+    report_dir = report_dir or _settings['report_dir']
+    with _records_lock:
+        stages = list(_records)
+    if not stages:
+        return None
+
+    os.makedirs(report_dir, exist_ok=True)
+    previous_paths = _report_paths(report_dir)
+    report = {
+        'started': _run_started,
+        'argv': sys.argv,
+        'python': sys.version.split()[0],
+        'cpu_count': os.cpu_count(),
+        'peak_rss_mb': max(stage['peak_rss_mb'] for stage in stages),
+        'stages': stages,
+    }
+    if previous_paths:
+        with open(previous_paths[-1]) as f:
+            report['compared_to'] = os.path.basename(previous_paths[-1])
+            report['regressions'] = compare_runs(report, json.load(f))
+
+    path = os.path.join(report_dir, f"run_{_run_started}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"--- Run report saved to {path} ---")
+    for regression in report.get('regressions', []):
+        print(f"Warning: {regression['stage']} is {regression['slowdown']}x slower than in {report['compared_to']} "
+              f"({regression['previous_wall_seconds']}s -> {regression['wall_seconds']}s)")
+    return path
+
+
+def print_report(report):
+    print(f"{'stage':<50}{'wall s':>9}{'cpu s':>9}{'rss MB':>9}{'rows in':>10}{'rows out':>10}{'rows/s':>10}")
+    for stage in report['stages']:
+        print(f"{stage['stage']:<50}{stage['wall_seconds']:>9.2f}{stage['cpu_seconds']:>9.2f}"
+              f"{stage['peak_rss_mb']:>9.0f}{stage['rows_in'] or '-':>10}{stage['rows_out'] or '-':>10}"
+              f"{stage['rows_per_second'] or '-':>10}")
+
+
+atexit.register(write_run_report)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Show a pipeline run report and compare it with an earlier one.")
+    parser.add_argument('reports', nargs='*', help="Report to show and optional baseline (default: the latest two)")
+    parser.add_argument('--report-dir', default=RUN_REPORT_DIR)
+    parser.add_argument('--factor', type=float, default=REGRESSION_FACTOR)
+    args = parser.parse_args()
+
+    paths = args.reports or _report_paths(args.report_dir)[-2:][::-1]
+    if not paths:
+        raise SystemExit(f"No run reports found in {args.report_dir}")
+    with open(paths[0]) as f:
+        current = json.load(f)
+    print(f"--- {paths[0]} ---")
+    print_report(current)
+    if len(paths) > 1:
+        with open(paths[1]) as f:
+            regressions = compare_runs(current, json.load(f), factor=args.factor)
+        print(f"\n--- Compared with {paths[1]}: {len(regressions)} regressions ---")
+        for regression in regressions:
+            print(f"{regression['stage']}: {regression['slowdown']}x slower")
+        if regressions:
+            raise SystemExit(1)
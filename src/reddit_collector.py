@@ -0,0 +1,242 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+
+# --- Configuration ---
+API_BASE = "https://oauth.reddit.com"
+TOKEN_URL = "https://www.reddit.com/api/v1/access_token"
+PAGE_SIZE = 100
+MAX_POSTS_PER_SUBREDDIT = 1000  # Reddit listings stop after ~1000 items
+DEFAULT_WORKERS = 4
+REQUEST_TIMEOUT = 30
+TOKEN_REFRESH_MARGIN = 60  # Seconds before expiry at which the access token is renewed
+
+
+class RateBudget:
+    """
+    Shares Reddit's per-client request budget between worker threads.
+
+    The budget is read from the X-Ratelimit-Remaining and X-Ratelimit-Reset headers of
+    every response; when it drops to the reserve, callers wait until the window resets.
+    """
+
+    def __init__(self, reserve=DEFAULT_WORKERS):
+        self.reserve = reserve
+        self.remaining = None
+        self.reset_at = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.remaining is not None and self.remaining <= self.reserve:
+                wait = self.reset_at - time.monotonic()
+                if wait <= 0:
+                    # New window: the next response reports the fresh budget
+                    self.remaining = None
+                    break
+                self._condition.wait(timeout=wait)
+            if self.remaining is not None:
+                self.remaining -= 1
+
+    def update(self, headers):
+        remaining = headers.get('x-ratelimit-remaining')
+        reset = headers.get('x-ratelimit-reset')
+        if remaining is None or reset is None:
+            return
+        with self._condition:
+            self.remaining = float(remaining)
+            self.reset_at = time.monotonic() + float(reset)
+            self._condition.notify_all()
+
+    def exhaust(self, retry_after):
+        with self._condition:
+            self.remaining = 0
+            self.reset_at = time.monotonic() + retry_after
+
+
+class RedditCollector:
+    """
+    Fetches new posts from several subreddits concurrently within Reddit's rate budget.
+
+    Matching posts are appended to a JSONL file as they arrive. The newest created_utc
+    seen per subreddit is checkpointed, so a re-run only fetches posts newer than that,
+    and posts already in the JSONL file (e.g. from an interrupted run) are not written again.
+    The OAuth token (valid for about an hour) is renewed shortly before it expires, or when
+    a request is refused with 401, so long runs are not cut off.
+    """
+
+    def __init__(
+        self,
+        output_path,
+        checkpoint_path,
+        match_fn,
+        client_id=None,
+        client_secret=None,
+        user_agent="MScProject/0.1",
+        api_base=API_BASE,
+        token_url=TOKEN_URL,
+        workers=DEFAULT_WORKERS
+    ):
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path
+        self.match_fn = match_fn
+        self.api_base = api_base.rstrip('/')
+        self.workers = workers
+        self.budget = RateBudget(reserve=workers)
+        self._write_lock = threading.Lock()
+        self._token_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = user_agent
+        self.credentials = (client_id, client_secret) if client_id and client_secret and token_url else None
+        self.token_url = token_url
+        self.token_expires_at = None
+        if self.credentials:
+            self._authenticate()
+
+        self.checkpoints = {}
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                self.checkpoints = json.load(f)
+
+        self.seen_ids = set()
+        if os.path.exists(output_path):
+            with open(output_path) as f:
+                for line in f:
+                    if line.strip():
+                        self.seen_ids.add(json.loads(line)['id'])
+
+    def _authenticate(self, rejected=None):
+        """
+        Fetches a new access token, unless another thread has already replaced the
+        rejected Authorization header.
+        """
+        with self._token_lock:
+            if rejected is not None and self.session.headers.get('Authorization') != rejected:
+                return
+            response = self.session.post(
+                self.token_url, auth=self.credentials,
+                data={'grant_type': 'client_credentials'}, timeout=REQUEST_TIMEOUT
+            )
+            response.raise_for_status()
+            token = response.json()
+            self.session.headers['Authorization'] = f"bearer {token['access_token']}"
+            self.token_expires_at = time.monotonic() + float(token.get('expires_in', 3600)) - TOKEN_REFRESH_MARGIN
+
+    def _get(self, path, params):
+        reauthenticated = False
+        while True:
+            if self.token_expires_at is not None and time.monotonic() >= self.token_expires_at:
+                self._authenticate(rejected=self.session.headers.get('Authorization'))
+            self.budget.acquire()
+            authorization = self.session.headers.get('Authorization')
+            response = self.session.get(f"{self.api_base}{path}", params=params, timeout=REQUEST_TIMEOUT)
+            self.budget.update(response.headers)
+            if response.status_code == 429:
+                self.budget.exhaust(float(response.headers.get('x-ratelimit-reset', 60)))
+                continue
+            # Expired or revoked token: renew it once, then let a second 401 raise
+            if response.status_code == 401 and self.credentials and not reauthenticated:
+                self._authenticate(rejected=authorization)
+                reauthenticated = True
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def _write(self, records):
+        with self._write_lock:
+            records = [r for r in records if r['id'] not in self.seen_ids]
+            if not records:
+                return 0
+            with open(self.output_path, 'a') as f:
+                for record in records:
+                    f.write(json.dumps(record) + '\n')
+                f.flush()
+            self.seen_ids.update(r['id'] for r in records)
+            return len(records)
+
+    def _save_checkpoint(self, sub_name, newest):
+        with self._write_lock:
+            self.checkpoints[sub_name] = newest
+            tmp_path = self.checkpoint_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.checkpoints, f, indent=2)
+            os.replace(tmp_path, self.checkpoint_path)
+
+    def collect_subreddit(self, sub_name):
+        """
+        Pages through r/sub_name/new until the previous checkpoint is reached.
+        Returns the number of new matching posts written.
+        """
+        since = self.checkpoints.get(sub_name, 0)
+        newest = since
+        written = 0
+        fetched = 0
+        after = None
+        while fetched < MAX_POSTS_PER_SUBREDDIT:
+            params = {'limit': PAGE_SIZE, 'raw_json': 1}
+            if after:
+                params['after'] = after
+            listing = self._get(f"/r/{sub_name}/new", params)['data']
+            posts = [child['data'] for child in listing['children']]
+            fetched += len(posts)
+
+            records = []
+            reached_checkpoint = False
+            for post in posts:
+                if post['created_utc'] <= since:
+                    reached_checkpoint = True
+                    break
+                newest = max(newest, post['created_utc'])
+                post_text = post['title'] + " " + post['selftext']
+                matched = self.match_fn(post_text)
+                if matched:
+                    records.append({
+                        'id': post['id'],
+                        'title': post['title'],
+                        'selftext': post['selftext'],
+                        'created_utc': post['created_utc'],
+                        'author': str(post.get('author')),
+                        'score': post['score'],
+                        'num_comments': post['num_comments'],
+                        'subreddit': post['subreddit'],
+                        'url': post['url'],
+                        'keyword_matched': matched
+                    })
+            written += self._write(records)
+
+            after = listing.get('after')
+            if reached_checkpoint or not after:
+                break
+
+        # Only move the checkpoint once the subreddit has been read back to it
+        if newest > since:
+            self._save_checkpoint(sub_name, newest)
+        print(f"r/{sub_name}: {written} new matching posts")
+        return written
+
+    def collect(self, subreddits):
+        """
+        Collects all subreddits on a thread pool. Returns the total number of new posts written.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return sum(executor.map(self.collect_subreddit, subreddits))
+
+
+def export_jsonl_to_csv(jsonl_path, csv_path):
+    """
+    Writes the de-duplicated contents of a collector JSONL file to CSV.
+    """
+    if not os.path.exists(jsonl_path):
+        df = pd.DataFrame()
+    else:
+        df = pd.read_json(jsonl_path, lines=True, dtype={'id': str}, convert_dates=False)
+        if not df.empty:
+            df = df.drop_duplicates(subset=['id'], keep='last').reset_index(drop=True)
+    df.to_csv(csv_path, index=False)
+    return df
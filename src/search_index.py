@@ -0,0 +1,328 @@
+import argparse
+import heapq
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from emotion_sets import emotion_sets
+from trends import post_timestamps
+
+# --- Configuration ---
+DASHBOARD_DATA_PATH = 'data/processed/reddit_dashboard_data.parquet'
+SEARCH_INDEX_PATH = 'data/processed/search_index.sqlite'
+PAGE_SIZE = 20
+BATCH_SIZE = 50000
+# Matches ranked per query. Broad queries rank the newest CANDIDATE_LIMIT matches and report
+# the total as "at least", so latency does not grow with how common the words are.
+CANDIDATE_LIMIT = 2000
+# Posts per full-text shard. Shards are searched newest first until CANDIDATE_LIMIT posts match,
+# so a common word only reads the newest shard's postings instead of the whole corpus.
+SHARD_ROWS = 100000
+# Porter stemming on top of the default tokenizer, so 'landlord' also finds 'landlords'
+TOKENIZER = 'porter unicode61'
+FACETS = ('topic', 'emotion', 'subreddit')
+RESULT_COLUMNS = ['id', 'subreddit', 'topic', 'emotion', 'score']
+
+_QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+# Words as unicode61 splits them: runs of letters and digits
+_WORD_PATTERN = re.compile(r'[^\W_]+')
+# Rowids put the newest posts first: (2**33 - epoch seconds) in the high bits, a sequence number below
+_SEQUENCE_BITS = 26
+_MAX_EPOCH = 2 ** 33
+
+
+def _rowids(created_utc, start):
+    seconds = (post_timestamps(created_utc).dt.tz_convert(None) - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+    # Posts without a timestamp count as the oldest
+    newest_first = _MAX_EPOCH - seconds.fillna(0).clip(0, _MAX_EPOCH - 1).to_numpy(dtype=np.int64)
+    sequence = np.arange(start, start + len(newest_first), dtype=np.int64) & ((1 << _SEQUENCE_BITS) - 1)
+    return (newest_first << _SEQUENCE_BITS) | sequence
+
+
+def _facet_token(facet, code):
+    # Cleaned text and cleaned queries have no digits, so these tokens never collide with words
+    return f"x{facet}{code}"
+
+
+def _shard_table(shard):
+    return f"posts_text_{shard:03d}"
+
+
+class _Stemmer:
+    """
+    Porter stems as the index's own tokenizer computes them, read back through fts5vocab.
+
+    Word pairs are joined before indexing, so the tokenizer would only stem their second word;
+    stemming both words first keeps "landlords rent" matching "landlord rents" as a phrase does.
+    """
+
+    def __init__(self):
+        self.connection = sqlite3.connect(':memory:', check_same_thread=False)
+        self.connection.executescript(f"""
+            CREATE VIRTUAL TABLE words USING fts5(word, tokenize='{TOKENIZER}');
+            CREATE VIRTUAL TABLE word_stems USING fts5vocab(words, 'instance');
+        """)
+        self.stems = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, words):
+        with self.lock:
+            new = list({word for word in words if word not in self.stems})
+            if new:
+                self.connection.execute("DELETE FROM words")
+                self.connection.executemany("INSERT INTO words (rowid, word) VALUES (?, ?)", enumerate(new))
+                parts = {}
+                for doc, term in self.connection.execute("SELECT doc, term FROM word_stems ORDER BY doc, offset"):
+                    parts.setdefault(doc, []).append(term)
+                self.stems.update((word, ''.join(parts.get(doc, []))) for doc, word in enumerate(new))
+            return [self.stems[word] for word in words]
+
+    def pairs(self, text):
+        """
+        Adjacent word pairs of text as single tokens ('0' never occurs in cleaned text).
+        """
+        stems = [stem for stem in self(_WORD_PATTERN.findall(text)) if stem]
+        return [f"{first}0{second}" for first, second in zip(stems, stems[1:])]
+
+
+def build_search_index(input_path=DASHBOARD_DATA_PATH, index_path=SEARCH_INDEX_PATH, batch_size=BATCH_SIZE,
+                       shard_rows=SHARD_ROWS):
+    """
+    Writes a SQLite FTS5 index of text_cleaned for the dashboard search panel.
+
+    The full-text tables are contentless (only postings are stored, not the text) and split
+    into shards of shard_rows posts, newest posts in the first shard. Besides the text, each
+    post indexes its adjacent word pairs (so phrases are single-token lookups, and no word
+    positions are stored) and one facet token per topic, subreddit and emotion of the post
+    (every emotion in emotion_mask, or the top label), so facet filters are part of the MATCH.
+    Rowids order posts newest first, which is the order FTS5 returns matches in. The dashboard
+    data is read in batches: once for the timestamps that decide the shards, once to index.
+    """
+    print("--- Building search index ---")
+    parquet = pq.ParquetFile(input_path)
+    available = parquet.schema_arrow.names
+    columns = ['id', 'subreddit', 'Final_Topic_Label', 'emotion_label', 'text_cleaned']
+    columns += [c for c in ['emotion_mask', 'created_utc'] if c in available]
+
+    def batches(columns):
+        rows = 0
+        for batch in parquet.iter_batches(batch_size=batch_size, columns=columns):
+            df = batch.to_pandas()
+            created_utc = df['created_utc'] if 'created_utc' in df.columns else pd.Series(np.nan, index=df.index)
+            yield df, _rowids(created_utc, rows)
+            rows += len(df)
+
+    # The last rowid of every shard but the final one
+    timestamps = [c for c in ['created_utc'] if c in available] or ['id']
+    all_rowids = np.sort(np.concatenate([rowids for _, rowids in batches(timestamps)] or [np.empty(0, np.int64)]))
+    bounds = all_rowids[shard_rows - 1:-1:shard_rows]
+    shards = -(-len(all_rowids) // shard_rows)
+
+    # Build next to the old index and swap it in, so the dashboard never sees a half-written file
+    tmp_path = index_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    os.makedirs(os.path.dirname(index_path) or '.', exist_ok=True)
+    connection = sqlite3.connect(tmp_path)
+    connection.executescript("""
+        PRAGMA journal_mode = OFF;
+        PRAGMA synchronous = OFF;
+        CREATE TABLE posts (rowid INTEGER PRIMARY KEY, id TEXT, subreddit TEXT, topic TEXT, emotion TEXT);
+        CREATE TABLE facet_tokens (facet TEXT, value TEXT, token TEXT, PRIMARY KEY (facet, value));
+        CREATE TABLE shards (shard INTEGER PRIMARY KEY, posts INTEGER);
+    """)
+    for shard in range(shards):
+        connection.execute(f"CREATE VIRTUAL TABLE {_shard_table(shard)} USING fts5(text, pairs, facets, content='', "
+                           f"detail='column', tokenize='{TOKENIZER}')")
+    codes = {facet: {} for facet in FACETS}
+    stemmer = _Stemmer()
+
+    def tokens(facet, values):
+        codes_of = codes[facet]
+        return [_facet_token(facet, codes_of.setdefault(value, len(codes_of))) for value in values]
+
+    rows = 0
+    for df, rowids in batches(columns):
+        subreddits, topics, emotions = (_nullable(df[c]) for c in ['subreddit', 'Final_Topic_Label', 'emotion_label'])
+        if 'emotion_mask' in df.columns:
+            # Posts without a mask (older emotion outputs) fall back to their top label
+            sets = [names or ([label] if label is not None else [])
+                    for names, label in zip(emotion_sets(df['emotion_mask']), emotions)]
+        else:
+            sets = [[label] if label is not None else [] for label in emotions]
+        texts = df['text_cleaned'].fillna('').astype(str).tolist()
+        pairs = [' '.join(stemmer.pairs(text)) for text in texts]
+        facets = [' '.join(tokens('topic', [t] if t is not None else []) + tokens('subreddit', [s] if s is not None else [])
+                           + tokens('emotion', names))
+                  for t, s, names in zip(topics, subreddits, sets)]
+        connection.executemany("INSERT INTO posts VALUES (?, ?, ?, ?, ?)",
+                               zip(rowids.tolist(), df['id'].astype(str), subreddits, topics, emotions))
+        shard_of = np.searchsorted(bounds, rowids)
+        for shard in np.unique(shard_of):
+            rows_in_shard = np.flatnonzero(shard_of == shard)
+            connection.executemany(f"INSERT INTO {_shard_table(shard)} (rowid, text, pairs, facets) VALUES (?, ?, ?, ?)",
+                                   [(int(rowids[i]), texts[i], pairs[i], facets[i]) for i in rows_in_shard])
+        rows += len(df)
+    connection.executemany("INSERT INTO facet_tokens VALUES (?, ?, ?)",
+                           [(facet, value, _facet_token(facet, code))
+                            for facet, values in codes.items() for value, code in values.items()])
+    for shard in range(shards):
+        connection.execute(f"INSERT INTO {_shard_table(shard)} ({_shard_table(shard)}) VALUES ('optimize')")
+    connection.executemany("INSERT INTO shards VALUES (?, ?)",
+                           [(shard, min(shard_rows, rows - shard * shard_rows)) for shard in range(shards)])
+    connection.commit()
+    connection.close()
+    os.replace(tmp_path, index_path)
+    print(f"--- {rows} posts indexed in {shards} shards in {index_path} "
+          f"({os.path.getsize(index_path) / 1e6:.1f} MB) ---")
+    return index_path
+
+
+def _nullable(column):
+    return [None if pd.isna(value) else str(value) for value in column.astype(object)]
+
+
+def parse_query(query, stemmer=None):
+    """
+    Turns a search box query into an FTS5 expression: every word and "quoted phrase" must occur.
+
+    Terms are cleaned like text_cleaned (lower-cased, punctuation and stopwords removed), so a
+    phrase such as "right to rent" matches the indexed 'right rent'. A phrase must contain each
+    of its adjacent word pairs. Returns None if nothing is left.
+    """
+    from text_cleaning import clean_text
+    stemmer = stemmer or _Stemmer()
+    terms = []
+    for phrase, word in _QUERY_PATTERN.findall(query):
+        cleaned = clean_text(phrase or word)
+        pairs = stemmer.pairs(cleaned) if phrase else []
+        if pairs:
+            terms += [f'pairs : "{pair}"' for pair in pairs]
+        elif cleaned:
+            terms.append('text : "' + cleaned.replace('"', '""') + '"')
+    return ' AND '.join(terms) or None
+
+
+class SearchIndex:
+    """
+    Ranked keyword and phrase search over the posts in a search index, with facet filters.
+    """
+
+    def __init__(self, index_path=SEARCH_INDEX_PATH, candidate_limit=CANDIDATE_LIMIT):
+        self.index_path = index_path
+        self.candidate_limit = candidate_limit
+        # Read-only, and shareable across the dashboard's script threads
+        self.connection = sqlite3.connect(f'file:{index_path}?mode=ro', uri=True, check_same_thread=False)
+        if self.connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'shards'").fetchone() is None:
+            self.connection.close()
+            raise ValueError(f"{index_path} predates sharded search indexes; rebuild it with: python src/search_index.py")
+        self.facet_tokens = {(facet, value): token for facet, value, token
+                             in self.connection.execute("SELECT facet, value, token FROM facet_tokens")}
+        self.shards = [shard for shard, in self.connection.execute("SELECT shard FROM shards ORDER BY shard")]
+        self.stemmer = _Stemmer()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+
+    def _match(self, query, topic=None, emotion=None, subreddit=None):
+        """
+        The MATCH expression for query and facets, or None if nothing can match.
+        """
+        expression = parse_query(query, self.stemmer)
+        if expression is None:
+            return None
+        clauses = [expression]
+        for facet, value in [('topic', topic), ('emotion', emotion), ('subreddit', subreddit)]:
+            if value is None:
+                continue
+            token = self.facet_tokens.get((facet, str(value)))
+            if token is None:
+                return None
+            clauses.append(f'facets : "{token}"')
+        return ' AND '.join(clauses)
+
+    def _candidates(self, match):
+        """
+        (rowid, bm25) of up to candidate_limit + 1 matches, newest first, reading shards until enough match.
+
+        The facets column is weighted 0, so bm25 scores the text and word pairs alone. Like a
+        sharded search engine, bm25 weighs terms by how rare they are within each shard.
+        """
+        candidates = []
+        for shard in self.shards:
+            table = _shard_table(shard)
+            candidates += self.connection.execute(
+                f"SELECT rowid, bm25({table}, 1.0, 1.0, 0.0) FROM {table} WHERE {table} MATCH ? LIMIT ?",
+                [match, self.candidate_limit + 1 - len(candidates)]).fetchall()
+            if len(candidates) > self.candidate_limit:
+                break
+        return candidates
+
+    def search(self, query, topic=None, emotion=None, subreddit=None, page=1, page_size=PAGE_SIZE):
+        """
+        One page of posts matching query, best BM25 match first.
+
+        Returns (DataFrame with id, subreddit, topic, emotion and score columns, total, exact).
+        When more than candidate_limit posts match, only the newest candidate_limit are ranked,
+        total is candidate_limit and exact is False.
+        """
+        match = self._match(query, topic, emotion, subreddit)
+        if match is None:
+            return pd.DataFrame(columns=RESULT_COLUMNS), 0, True
+        candidates = self._candidates(match)
+        exact = len(candidates) <= self.candidate_limit
+        candidates = candidates[:self.candidate_limit]
+        page = max(page, 1)
+        top = heapq.nsmallest(page * page_size, candidates, key=lambda candidate: candidate[1])
+        top = top[(page - 1) * page_size:]
+        if not top:
+            return pd.DataFrame(columns=RESULT_COLUMNS), len(candidates), exact
+        scores = dict(top)
+        placeholders = ','.join('?' * len(top))
+        rows = self.connection.execute(
+            f"SELECT rowid, id, subreddit, topic, emotion FROM posts WHERE rowid IN ({placeholders})",
+            list(scores)).fetchall()
+        results = pd.DataFrame([row[1:] + (scores[row[0]],) for row in rows], columns=RESULT_COLUMNS)
+        return results.sort_values('score', kind='stable').reset_index(drop=True), len(candidates), exact
+
+    def facet_counts(self, query, facet, topic=None, emotion=None, subreddit=None):
+        """
+        Matching posts per topic, top emotion or subreddit, most frequent first, counted
+        over the same (possibly capped) candidates search ranks.
+        """
+        match = self._match(query, topic, emotion, subreddit)
+        if match is None:
+            return pd.Series(dtype='int64', name=facet)
+        rowids = [rowid for rowid, _ in self._candidates(match)[:self.candidate_limit]]
+        rows = self.connection.execute(
+            f"SELECT {facet}, COUNT(*) AS n FROM posts WHERE rowid IN (SELECT value FROM json_each(?)) "
+            f"GROUP BY {facet} ORDER BY n DESC", [json.dumps(rowids)]).fetchall()
+        return pd.Series(dict(rows), name=facet, dtype='int64')
+
+    def close(self):
+        self.connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the post search index, or search it.")
+    parser.add_argument('query', nargs='?', help='Words and "quoted phrases" to search for (omit to rebuild)')
+    parser.add_argument('--topic')
+    parser.add_argument('--emotion')
+    parser.add_argument('--subreddit')
+    parser.add_argument('--page', type=int, default=1)
+    args = parser.parse_args()
+    if args.query is None:
+        build_search_index()
+    else:
+        index = SearchIndex()
+        start = time.perf_counter()
+        results, total, exact = index.search(args.query, args.topic, args.emotion, args.subreddit, args.page)
+        print(results.to_string(index=False))
+        print(f"{total}{'' if exact else '+'} matches ({(time.perf_counter() - start) * 1e3:.1f} ms)")
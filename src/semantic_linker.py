@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from embedding_cache import EMBEDDING_MODEL, EmbeddingStore
+
+# --- Configuration ---
+VECTOR_INDEX_DIR = 'data/processed/legislation_vector_index'
+DEFAULT_QUERY_BATCH_SIZE = 1024
+
+
+def embed_texts(texts, model_name=EMBEDDING_MODEL):
+    """
+    Embeds texts with a sentence-transformers model through the shared embedding cache.
+    The model is only loaded when some texts are not cached yet.
+    """
+    def encode(missing):
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name).encode(missing, batch_size=64, show_progress_bar=True)
+
+    return EmbeddingStore(model_name).get_or_compute(texts, encode)
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def law_texts(laws_df):
+    """
+    Text embedded for each law: its title followed by its summary when one is available.
+    """
+    titles = laws_df['title'].fillna('').astype(str)
+    if 'summary' in laws_df.columns:
+        summaries = laws_df['summary'].fillna('').astype(str)
+        return [f"{title}. {summary}" if summary else title for title, summary in zip(titles, summaries)]
+    return titles.tolist()
+
+
+class SemanticLegislationIndex:
+    """
+    Persisted matrix of L2-normalized law embeddings searched by cosine similarity.
+    """
+
+    def __init__(self, vectors, laws_df, model_name=EMBEDDING_MODEL):
+        self.vectors = vectors
+        self.laws = laws_df.reset_index(drop=True)
+        self.model_name = model_name
+
+    @classmethod
+    def build(cls, laws_df, model_name=EMBEDDING_MODEL):
+        vectors = normalize_rows(embed_texts(law_texts(laws_df), model_name))
+        return cls(vectors, laws_df, model_name)
+
+    @staticmethod
+    def content_hash(laws_df, model_name=EMBEDDING_MODEL):
+        digest = hashlib.sha1(model_name.encode('utf-8'))
+        for text in law_texts(laws_df):
+            digest.update(b'\0' + text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def save(self, index_dir=VECTOR_INDEX_DIR):
+        os.makedirs(index_dir, exist_ok=True)
+        np.save(os.path.join(index_dir, 'vectors.npy'), self.vectors)
+        self.laws.to_csv(os.path.join(index_dir, 'laws.csv'), index=False)
+        with open(os.path.join(index_dir, 'meta.json'), 'w') as f:
+            json.dump({'model_name': self.model_name, 'content_hash': self.content_hash(self.laws, self.model_name)}, f)
+
+    @classmethod
+    def load(cls, index_dir=VECTOR_INDEX_DIR):
+        with open(os.path.join(index_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        vectors = np.load(os.path.join(index_dir, 'vectors.npy'), mmap_mode='r')
+        laws_df = pd.read_csv(os.path.join(index_dir, 'laws.csv'))
+        return cls(vectors, laws_df, meta['model_name'])
+
+    @classmethod
+    def build_or_load(cls, laws_df, index_dir=VECTOR_INDEX_DIR, model_name=EMBEDDING_MODEL):
+        """
+        Loads the persisted index if it was built from the same laws and model, otherwise rebuilds and saves it.
+        """
+        meta_path = os.path.join(index_dir, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta['model_name'] == model_name and meta['content_hash'] == cls.content_hash(laws_df, model_name):
+                return cls.load(index_dir)
+        index = cls.build(laws_df, model_name)
+        index.save(index_dir)
+        return index
+
+    def search(self, query_vectors, top_k=5, batch_size=DEFAULT_QUERY_BATCH_SIZE):
+        """
+        Returns (positions, similarities), each of shape (n_queries, top_k), holding the
+        most similar laws for every query vector in descending order of cosine similarity.
+        """
+        queries = normalize_rows(query_vectors)
+        top_k = min(top_k, len(self.laws))
+        positions = np.zeros((len(queries), top_k), dtype=np.int64)
+        similarities = np.zeros((len(queries), top_k), dtype=np.float32)
+        if top_k == 0:
+            return positions, similarities
+
+        for start in range(0, len(queries), batch_size):
+            scores = queries[start:start + batch_size] @ self.vectors.T
+            if top_k < scores.shape[1]:
+                top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+            else:
+                top = np.tile(np.arange(scores.shape[1]), (len(scores), 1))
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            positions[start:start + batch_size] = np.take_along_axis(top, order, axis=1)
+            similarities[start:start + batch_size] = np.take_along_axis(top_scores, order, axis=1)
+        return positions, similarities
+
+    def links(self, query_ids, query_vectors, top_k=5, min_similarity=0.0, id_column='query'):
+        """
+        Returns a long DataFrame with one row per (query, law) pair above min_similarity.
+        """
+        positions, similarities = self.search(query_vectors, top_k=top_k)
+        rows = np.repeat(np.arange(len(positions)), positions.shape[1])
+        flat_positions = positions.ravel()
+        flat_similarities = similarities.ravel()
+        keep = flat_similarities >= min_similarity
+
+        laws = self.laws.iloc[flat_positions[keep]].reset_index(drop=True)
+        result = pd.DataFrame({
+            id_column: np.asarray(query_ids)[rows[keep]],
+            'rank': np.tile(np.arange(1, positions.shape[1] + 1), len(positions))[keep],
+            'similarity': flat_similarities[keep].round(4),
+        })
+        return pd.concat([result, laws], axis=1)
@@ -0,0 +1,211 @@
+import argparse
+import ast
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# --- Configuration ---
+COMPRESSION = 'zstd'
+ROW_GROUP_SIZE = 100000  # Rows per Parquet row group, the unit iter_table can read without loading the file
+
+# Low-cardinality label columns held as pandas categoricals in memory
+CATEGORICAL_COLUMNS = [
+    'subreddit', 'topic_name', 'Custom_Topic_Label', 'Custom_Topic_Label_Refined',
+    'Final_Topic_Label', 'emotion_label'
+]
+
+# Arrow types of the known pipeline columns, used when the data allows it
+# (e.g. created_utc is sometimes an ISO date string); other object columns are stored as string
+COLUMN_TYPES = {
+    'created_utc': pa.float64(),
+    'score': pa.int64(),
+    'num_comments': pa.int64(),
+    'topic_id': pa.int64(),
+    'Topic': pa.int64(),
+    'cluster_size': pa.int64(),
+    'emotion_mask': pa.int32(),
+    'keyword_matched': pa.list_(pa.string()),
+}
+
+
+def is_parquet(path):
+    return str(path).endswith('.parquet')
+
+
+def _parse_list(value):
+    # CSVs store keyword_matched as the repr of a Python list
+    if isinstance(value, str):
+        try:
+            return [str(v) for v in ast.literal_eval(value)]
+        except (ValueError, SyntaxError):
+            return [value]
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    return [str(v) for v in value]
+
+
+def arrow_schema(df):
+    """
+    Arrow schema for a pipeline DataFrame, using COLUMN_TYPES where known.
+    """
+    fields = []
+    for column in df.columns:
+        known = COLUMN_TYPES.get(column)
+        if known is not None and (pa.types.is_list(known) or pd.api.types.is_numeric_dtype(df[column])):
+            arrow_type = known
+        elif known is None and pd.api.types.is_float_dtype(df[column]) and len(df) and df[column].isna().all():
+            # read_csv gives a text column that is empty throughout a chunk (e.g. selftext
+            # or author) as float NaN; storing it as string lets later chunks hold text
+            arrow_type = pa.string()
+        elif pd.api.types.is_bool_dtype(df[column]):
+            arrow_type = pa.bool_()
+        elif pd.api.types.is_integer_dtype(df[column]):
+            arrow_type = pa.int64()
+        elif pd.api.types.is_float_dtype(df[column]):
+            arrow_type = pa.float32() if df[column].dtype == 'float32' else pa.float64()
+        elif pd.api.types.is_datetime64_any_dtype(df[column]):
+            arrow_type = pa.timestamp('ns', tz=getattr(df[column].dt, 'tz', None))
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(str(column), arrow_type))
+    return pa.schema(fields)
+
+
+def to_arrow(df, schema=None):
+    """
+    Converts a DataFrame to an Arrow table with the given (or inferred) schema.
+    """
+    df = df.copy()
+    schema = schema or arrow_schema(df)
+    for field in schema:
+        column = df[field.name]
+        if pa.types.is_list(field.type):
+            df[field.name] = column.map(_parse_list)
+        elif pa.types.is_string(field.type):
+            values = column.astype(object).where(column.notna(), None)
+            # Columns that already hold only strings (the usual case) need no per-value conversion
+            if pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'empty'):
+                values = values.map(lambda v: v if v is None else str(v))
+            df[field.name] = values
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def _apply_categories(df):
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    return df
+
+
+def read_table(path, columns=None):
+    """
+    Reads a pipeline table from Parquet or CSV, loading only the requested columns.
+    Label columns are returned as categoricals.
+    """
+    if is_parquet(path):
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        df = pd.read_csv(path, usecols=columns)
+    return _apply_categories(df)
+
+
+def iter_table(path, columns=None, chunk_size=ROW_GROUP_SIZE):
+    """
+    Yields a Parquet or CSV table as DataFrames of at most chunk_size rows, like read_table.
+    """
+    if is_parquet(path):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield _apply_categories(batch.to_pandas())
+    else:
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=chunk_size):
+            yield _apply_categories(chunk)
+
+
+def table_rows(path):
+    """
+    Number of rows of a Parquet (from its footer) or CSV table.
+    """
+    if is_parquet(path):
+        return pq.ParquetFile(path).metadata.num_rows
+    return sum(len(chunk) for chunk in pd.read_csv(path, usecols=[0], chunksize=ROW_GROUP_SIZE))
+
+
+def table_columns(path):
+    """
+    Column names of a Parquet or CSV table, without reading its rows.
+    """
+    if is_parquet(path):
+        return pq.read_schema(path).names
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def write_table(df, path):
+    """
+    Writes a pipeline table as zstd-compressed Parquet, or as CSV for .csv paths.
+    """
+    if is_parquet(path):
+        pq.write_table(to_arrow(df), path, compression=COMPRESSION, row_group_size=ROW_GROUP_SIZE)
+    else:
+        df.to_csv(path, index=False)
+
+
+class TableWriter:
+    """
+    Appends DataFrame chunks to one Parquet or CSV file.
+    The schema of the first chunk is used for the whole file unless one is given
+    (columns that are all null in it are stored as string, see arrow_schema).
+    """
+
+    def __init__(self, path, schema=None):
+        self.path = path
+        self.rows = 0
+        self._writer = None
+        self._schema = schema
+
+    def write(self, df):
+        if is_parquet(self.path):
+            if self._writer is None:
+                self._schema = self._schema or arrow_schema(df)
+                self._writer = pq.ParquetWriter(self.path, self._schema, compression=COMPRESSION)
+            self._writer.write_table(to_arrow(df, self._schema), row_group_size=ROW_GROUP_SIZE)
+        else:
+            df.to_csv(self.path, index=False, mode='a' if self.rows else 'w', header=not self.rows)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert_csv_to_parquet(csv_path, parquet_path=None):
+    """
+    One-time conversion of an existing pipeline CSV to Parquet next to it.
+    """
+    parquet_path = parquet_path or os.path.splitext(csv_path)[0] + '.parquet'
+    df = pd.read_csv(csv_path)
+    write_table(df, parquet_path)
+    return parquet_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert pipeline CSVs to Parquet.")
+    parser.add_argument('paths', nargs='*', default=['final_datasets'],
+                        help="CSV files or directories of CSV files (default: final_datasets)")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        csv_paths = [path] if os.path.isfile(path) else [
+            os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.csv')
+        ]
+        for csv_path in csv_paths:
+            parquet_path = convert_csv_to_parquet(csv_path)
+            print(f"{csv_path} ({os.path.getsize(csv_path) / 1e6:.2f} MB) -> "
+                  f"{parquet_path} ({os.path.getsize(parquet_path) / 1e6:.2f} MB)")
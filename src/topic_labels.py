@@ -0,0 +1,82 @@
+import re
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from keyword_matcher import KeywordMatcher
+
+# --- Configuration ---
+LABEL_RULES_PATH = 'config/topic_label_rules.yaml'
+AUTOMATON_MIN_KEYWORDS = 50  # Rule tables with more keywords are matched with KeywordMatcher
+
+
+def load_label_rules(rules_path=LABEL_RULES_PATH):
+    """
+    Loads the topic labeling rule table from a YAML file.
+    """
+    with open(rules_path) as f:
+        rules = yaml.safe_load(f)
+    for stage in ('topic_rules', 'refinement_rules'):
+        rules[stage] = [
+            {'label': rule['label'], 'keywords': [str(kw) for kw in rule['keywords']]}
+            for rule in rules.get(stage) or []
+        ]
+    return rules
+
+
+def _keyword_pattern(keywords):
+    return '|'.join(re.escape(kw) for kw in keywords)
+
+
+def match_first_rule(texts, rules, default, case_sensitive=True):
+    """
+    Returns, for each text, the label of the first rule with a keyword contained in it.
+    Texts matching no rule get default.
+    """
+    texts = pd.Series(texts, dtype=object).fillna('')
+    if not rules:
+        return np.full(len(texts), default, dtype=object)
+
+    keywords = [kw for rule in rules for kw in rule['keywords']]
+    if len(keywords) < AUTOMATON_MIN_KEYWORDS:
+        # Small tables: one vectorized alternation regex per rule
+        flags = 0 if case_sensitive else re.IGNORECASE
+        conditions = [
+            texts.str.contains(_keyword_pattern(rule['keywords']), flags=flags, regex=True).to_numpy()
+            for rule in rules
+        ]
+        return np.select(conditions, [rule['label'] for rule in rules], default=default)
+
+    # Large tables: a single Aho-Corasick pass per text. Keywords are listed in rule order,
+    # so the earliest-listed keyword found in a text belongs to the first rule that matches it
+    keyword_rules = [i for i, rule in enumerate(rules) for _ in rule['keywords']]
+    matcher = KeywordMatcher(keywords, case_sensitive=case_sensitive)
+    labels = np.full(len(texts), default, dtype=object)
+    for row, text in enumerate(texts):
+        index = matcher.first_index(text)
+        if index is not None:
+            labels[row] = rules[keyword_rules[index]]['label']
+    return labels
+
+
+def label_topics(df, rules):
+    """
+    Returns the Final_Topic_Label for every row of a topic model output.
+
+    Topic rules are evaluated once per unique topic_name and broadcast to the rows;
+    refinement rules are then matched case-insensitively against full_text, only on
+    rows left with the default label.
+    """
+    default = rules['default_label']
+
+    topic_names = pd.Series(df['topic_name'].unique())
+    topic_labels = pd.Series(match_first_rule(topic_names, rules['topic_rules'], default), index=topic_names)
+    labels = df['topic_name'].map(topic_labels).to_numpy(dtype=object)
+
+    general = labels == default
+    if general.any() and rules['refinement_rules']:
+        texts = df.loc[general, 'full_text']
+        labels[general] = match_first_rule(texts, rules['refinement_rules'], default, case_sensitive=False)
+
+    return labels
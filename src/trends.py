@@ -0,0 +1,281 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from storage import read_table, table_columns, write_table
+
+# --- Configuration ---
+DASHBOARD_DATA_PATH = 'data/processed/reddit_dashboard_data.parquet'
+LEGISLATION_MAPPING_PATH = 'data/processed/topic_legislation_mapping.csv'
+TREND_DIR = 'data/processed/trends'
+LEGISLATION_SPIKES_PATH = 'data/processed/legislation_spikes.csv'
+DEFAULT_FREQ = 'W'         # pandas period alias: 'D', 'W', 'M', ...
+SPIKE_Z = 3.0              # Standard deviations above the trailing mean
+SPIKE_BASELINE = 8         # Trailing windows the mean and deviation are taken over
+MIN_SPIKE_COUNT = 5        # Ignore "spikes" of a handful of posts
+EVENT_WINDOW_DAYS = 14     # How close to a legislation date a spike has to be
+
+
+def post_timestamps(values):
+    """
+    UTC timestamps from created_utc, which is epoch seconds in the raw data and an ISO string in older exports.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values):
+        return pd.to_datetime(values, unit='s', utc=True)
+    return pd.to_datetime(values, utc=True, errors='coerce')
+
+
+def window_periods(timestamps, freq=DEFAULT_FREQ):
+    return timestamps.dt.tz_convert(None).dt.to_period(freq)
+
+
+def _as_list(value):
+    if value is None:
+        return None
+    return [value] if isinstance(value, str) else list(value)
+
+
+def label_fingerprint(df):
+    """
+    Order-independent hash of the (id, created_utc, Final_Topic_Label, emotion_label) rows of df.
+    Sums of row hashes, so the fingerprint of two sets of posts is the sum of theirs.
+    """
+    columns = ['id', 'created_utc', 'Final_Topic_Label', 'emotion_label']
+    rows = df[columns].astype(str)
+    return int(pd.util.hash_pandas_object(rows, index=False).to_numpy().sum(dtype=np.uint64))
+
+
+class TrendCube:
+    """
+    Post counts per time window x topic x emotion, held as a dense array.
+
+    Windows form a contiguous period range, so series come out with explicit zeros and
+    rolling statistics line up. add() only counts post ids it has not seen, so the cube
+    can be kept up to date as new posts arrive and persisted between runs. The cube keeps
+    an order-independent fingerprint of the posts it counted, so is_current() can tell
+    when their labels changed or posts were removed and the cube has to be rebuilt.
+    """
+
+    def __init__(self, freq=DEFAULT_FREQ):
+        self.freq = freq
+        self.windows = pd.period_range(start='2000-01-01', periods=0, freq=freq)
+        self.topics = []
+        self.emotions = []
+        self.counts = np.zeros((0, 0, 0), dtype=np.int64)
+        self.ids = set()
+        self.fingerprint = 0
+
+    def _expand(self, windows, topics, emotions):
+        if len(windows):
+            start = min(windows.min(), self.windows.min()) if len(self.windows) else windows.min()
+            end = max(windows.max(), self.windows.max()) if len(self.windows) else windows.max()
+            new_windows = pd.period_range(start=start, end=end, freq=self.freq)
+        else:
+            new_windows = self.windows
+        new_topics = self.topics + sorted(set(topics) - set(self.topics))
+        new_emotions = self.emotions + sorted(set(emotions) - set(self.emotions))
+
+        counts = np.zeros((len(new_windows), len(new_topics), len(new_emotions)), dtype=np.int64)
+        if self.counts.size:
+            offset = self.windows[0].ordinal - new_windows[0].ordinal if len(self.windows) else 0
+            counts[offset:offset + len(self.windows), :len(self.topics), :len(self.emotions)] = self.counts
+        self.windows, self.topics, self.emotions, self.counts = new_windows, new_topics, new_emotions, counts
+
+    def add(self, df):
+        """
+        Counts the posts of df (id, created_utc, Final_Topic_Label, emotion_label) not seen before.
+        Returns the number of posts added.
+        """
+        ids = df['id'].astype(str)
+        df = df[~ids.isin(self.ids)]
+        periods = window_periods(post_timestamps(df['created_utc']), self.freq)
+        valid = periods.notna().to_numpy()
+        df, periods = df[valid], periods[valid]
+        if df.empty:
+            return 0
+
+        topics = df['Final_Topic_Label'].astype(str).to_numpy()
+        emotions = df['emotion_label'].astype(str).to_numpy()
+        self._expand(pd.PeriodIndex(periods.unique(), freq=self.freq), np.unique(topics), np.unique(emotions))
+
+        window_pos = pd.PeriodIndex(periods, freq=self.freq).asi8 - self.windows[0].ordinal
+        topic_pos = pd.Index(self.topics).get_indexer(topics)
+        emotion_pos = pd.Index(self.emotions).get_indexer(emotions)
+        np.add.at(self.counts, (window_pos, topic_pos, emotion_pos), 1)
+        self.ids.update(df['id'].astype(str))
+        self.fingerprint = (self.fingerprint + label_fingerprint(df)) % 2 ** 64
+        return len(df)
+
+    def is_current(self, df):
+        """
+        True if every counted post is still in df with the same time, topic and emotion.
+        """
+        counted = df[df['id'].astype(str).isin(self.ids)]
+        return (len(counted) == len(self.ids) and counted['id'].astype(str).nunique() == len(self.ids)
+                and label_fingerprint(counted) == self.fingerprint)
+
+    def _positions(self, labels, selected):
+        if selected is None:
+            return np.arange(len(labels))
+        index = pd.Index(labels).get_indexer(selected)
+        return index[index >= 0]
+
+    def query(self, topic=None, emotion=None, start=None, end=None, by=None):
+        """
+        Post counts per window for the given topic(s) and emotion(s) (all when None),
+        between start and end inclusive. Returns a Series indexed by window start, or a
+        DataFrame with one column per topic or emotion when by is 'topic' or 'emotion'.
+        """
+        topic_pos = self._positions(self.topics, _as_list(topic))
+        emotion_pos = self._positions(self.emotions, _as_list(emotion))
+        window_mask = np.ones(len(self.windows), dtype=bool)
+        if start is not None:
+            window_mask &= self.windows.end_time >= pd.Timestamp(start)
+        if end is not None:
+            window_mask &= self.windows.start_time <= pd.Timestamp(end)
+
+        cells = self.counts[window_mask][:, topic_pos][:, :, emotion_pos]
+        index = self.windows[window_mask].start_time
+        if by == 'topic':
+            return pd.DataFrame(cells.sum(axis=2), index=index, columns=[self.topics[i] for i in topic_pos])
+        if by == 'emotion':
+            return pd.DataFrame(cells.sum(axis=1), index=index, columns=[self.emotions[i] for i in emotion_pos])
+        return pd.Series(cells.sum(axis=(1, 2)), index=index, name='count')
+
+    def rolling(self, periods, **filters):
+        """
+        Rolling sum of query(**filters) over the last `periods` windows.
+        """
+        return self.query(**filters).rolling(periods, min_periods=1).sum()
+
+    def spikes(self, z=SPIKE_Z, baseline=SPIKE_BASELINE, min_count=MIN_SPIKE_COUNT, **filters):
+        """
+        Windows whose count exceeds the mean of the previous `baseline` windows by z standard deviations.
+        """
+        counts = self.query(**filters)
+        history = counts.shift(1).rolling(baseline, min_periods=baseline)
+        mean, std = history.mean(), history.std(ddof=0)
+        # A flat history has no deviation; measure against a floor of one post
+        z_score = (counts - mean) / std.clip(lower=1.0)
+        spikes = pd.DataFrame({'count': counts, 'baseline_mean': mean, 'z_score': z_score})
+        return spikes[(spikes['z_score'] >= z) & (spikes['count'] >= min_count)].rename_axis('window')
+
+    def save(self, trend_dir=TREND_DIR):
+        os.makedirs(trend_dir, exist_ok=True)
+        window, topic, emotion = np.nonzero(self.counts)
+        cells = pd.DataFrame({
+            'window': self.windows[window].start_time,
+            'topic': [self.topics[i] for i in topic],
+            'emotion': [self.emotions[i] for i in emotion],
+            'count': self.counts[window, topic, emotion],
+        })
+        write_table(cells, os.path.join(trend_dir, 'counts.parquet'))
+        write_table(pd.DataFrame({'id': sorted(self.ids)}), os.path.join(trend_dir, 'ids.parquet'))
+        with open(os.path.join(trend_dir, 'meta.json'), 'w') as f:
+            json.dump({'freq': self.freq, 'fingerprint': str(self.fingerprint)}, f)
+
+    @classmethod
+    def load(cls, trend_dir=TREND_DIR):
+        with open(os.path.join(trend_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        cube = cls(meta['freq'])
+        # Cubes saved before fingerprints existed never match, so they are recounted once
+        cube.fingerprint = int(meta.get('fingerprint', -1))
+        cells = read_table(os.path.join(trend_dir, 'counts.parquet'))
+        if not cells.empty:
+            windows = pd.DatetimeIndex(cells['window']).to_period(cube.freq)
+            topics, emotions = cells['topic'].astype(str).to_numpy(), cells['emotion'].astype(str).to_numpy()
+            cube._expand(pd.PeriodIndex(windows.unique(), freq=cube.freq), np.unique(topics), np.unique(emotions))
+            window_pos = windows.asi8 - cube.windows[0].ordinal
+            cube.counts[window_pos, pd.Index(cube.topics).get_indexer(topics),
+                        pd.Index(cube.emotions).get_indexer(emotions)] = cells['count'].to_numpy()
+        cube.ids = set(read_table(os.path.join(trend_dir, 'ids.parquet'))['id'].astype(str))
+        return cube
+
+    @classmethod
+    def load_or_create(cls, trend_dir=TREND_DIR, freq=DEFAULT_FREQ):
+        if os.path.exists(os.path.join(trend_dir, 'meta.json')):
+            cube = cls.load(trend_dir)
+            if cube.freq == freq:
+                return cube
+            print(f"Warning: Trend window changed from {cube.freq} to {freq}. Recounting all posts.")
+        return cls(freq)
+
+
+def legislation_events(df_laws):
+    """
+    (topic, law_title, law_date) rows from either the topic-legislation mapping or the reference laws table.
+    """
+    columns = {'Topic': 'topic', 'Legislation_Title': 'law_title', 'Date': 'law_date',
+               'law_title': 'law_title', 'date': 'law_date', 'topic': 'topic'}
+    events = df_laws.rename(columns=columns)[['topic', 'law_title', 'law_date']].copy()
+    events['law_date'] = pd.to_datetime(events['law_date'], errors='coerce')
+    return events.dropna(subset=['law_date'])
+
+
+def spikes_near_legislation(cube, df_laws, days=EVENT_WINDOW_DAYS, z=SPIKE_Z, baseline=SPIKE_BASELINE,
+                            min_count=MIN_SPIKE_COUNT):
+    """
+    Volume spikes in a topic within `days` of the date of a law linked to that topic.
+    """
+    events = legislation_events(df_laws)
+    rows = []
+    for topic, topic_events in events.groupby('topic'):
+        if topic not in cube.topics:
+            continue
+        spikes = cube.spikes(z=z, baseline=baseline, min_count=min_count, topic=topic)
+        if spikes.empty:
+            continue
+        for window, spike in spikes.iterrows():
+            offsets = (window - topic_events['law_date']).dt.days
+            near = topic_events[offsets.abs() <= days]
+            for _, event in near.iterrows():
+                rows.append({
+                    'topic': topic, 'law_title': event['law_title'], 'law_date': event['law_date'].date(),
+                    'window': window.date(), 'count': int(spike['count']), 'baseline_mean': spike['baseline_mean'],
+                    'z_score': spike['z_score'], 'days_from_law': (window - event['law_date']).days,
+                })
+    columns = ['topic', 'law_title', 'law_date', 'window', 'count', 'baseline_mean', 'z_score', 'days_from_law']
+    return pd.DataFrame(rows, columns=columns)
+
+
+def update_trends(
+    input_path=DASHBOARD_DATA_PATH,
+    trend_dir=TREND_DIR,
+    legislation_path=LEGISLATION_MAPPING_PATH,
+    spikes_path=LEGISLATION_SPIKES_PATH,
+    freq=DEFAULT_FREQ
+):
+    """
+    Adds new dashboard posts to the persisted trend cube and writes the spikes near linked legislation dates.
+    The cube is recounted from scratch when posts it counted were relabeled or removed.
+    """
+    print("--- Updating topic and emotion trends ---")
+    available = table_columns(input_path)
+    columns = ['id', 'created_utc', 'Final_Topic_Label', 'emotion_label']
+    df = read_table(input_path, columns=columns + [c for c in ['duplicate_of'] if c in available])
+    if 'duplicate_of' in df.columns:
+        # Count each cluster of near-duplicate posts once
+        df = df[df['duplicate_of'].isna()]
+
+    cube = TrendCube.load_or_create(trend_dir, freq)
+    if not cube.is_current(df):
+        print("Labels of counted posts changed or posts were removed. Recounting all posts.")
+        cube = TrendCube(freq)
+    added = cube.add(df)
+    cube.save(trend_dir)
+
+    spikes = pd.DataFrame()
+    if os.path.exists(legislation_path):
+        spikes = spikes_near_legislation(cube, pd.read_csv(legislation_path))
+        spikes.to_csv(spikes_path, index=False)
+    print(f"--- Added {added} posts to {len(cube.windows)} {freq} windows; "
+          f"{len(spikes)} spikes near legislation dates. Saved to {trend_dir} ---")
+    return cube
+
+
+if __name__ == '__main__':
+    update_trends()